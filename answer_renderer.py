@@ -0,0 +1,213 @@
+import re
+from typing import Any, List, Optional
+
+from query_result import QueryResult
+
+FORMAT_POLICIES = ("auto", "llm", "local")
+
+_AGGREGATE = re.compile(r"^\s*(count|sum|total|avg|min|max)\s*\(\s*(distinct\s+)?(.*?)\s*\)\s*$", re.IGNORECASE)
+_HOW_MANY = re.compile(r"^\s*how\s+many\s+([a-z][a-z\s]*?)\s+(?:are|is|were|was|do|does|did|have|has|work|exist)\b",
+                       re.IGNORECASE)
+# "How many jobs are there?" - a count with nothing narrowing it down
+_UNQUALIFIED_COUNT = re.compile(
+    r"^\s*how\s+many\s+([a-z][a-z\s]*?)\s+(?:are\s+there|exist|do\s+we\s+have|are\s+in\s+the\s+(?:database|system))"
+    r"\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+# "What is the total revenue for Central Glass DC?" - the subject keeps every qualifier of the question
+_WHAT_IS = re.compile(r"^\s*what\s*(?:'s|\s(is|was|are|were))\s+(?:the\s+)?(.+?)\s*[?.!]*\s*$", re.IGNORECASE)
+
+AGGREGATE_LABELS = {
+    "count": "number of",
+    "sum": "total",
+    "total": "total",
+    "avg": "average",
+    "min": "minimum",
+    "max": "maximum",
+}
+
+# Column name words marking identifiers and codes (no thousands separators) and money (two decimals)
+_IDENTIFIER_WORDS = {"id", "year", "code", "zip"}
+_MONEY_WORDS = {"amount", "total", "revenue", "income", "expense", "expenses", "cost", "costs", "price", "pay",
+                "payroll", "profit", "salary", "taxes", "tax", "balance", "paid", "spent", "spend", "earned"}
+_NAME_WORDS = {"name", "title", "description", "label"}
+
+
+def _column_words(column: str) -> List[str]:
+    return re.findall(r"[a-z]+", column.split(".")[-1].lower())
+
+
+def format_value(value: Any, column: str = "") -> str:
+    """
+    Formats a cell for a sentence, NULL as 'no value'
+
+    Integers get thousands separators unless the column holds identifiers, years or
+    codes ("job_id", "year"); floats are rounded to cents only in money columns
+    ("SUM(amount)", "total_revenue"), other floats keep their precision.
+    """
+    if value is None:
+        return "no value"
+    if isinstance(value, bool):
+        return str(value)
+    words = _column_words(column)
+    if isinstance(value, int):
+        aggregate = _AGGREGATE.match(column)
+        is_count = aggregate is not None and aggregate.group(1).lower() == "count"
+        return str(value) if not is_count and _IDENTIFIER_WORDS.intersection(words) else f"{value:,}"
+    if isinstance(value, float):
+        if _MONEY_WORDS.intersection(words):
+            return f"{value:,.2f}"
+        return f"{round(value, 10):,}"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    return str(value)
+
+
+def column_label(column: str, question: str = "") -> str:
+    """
+    Turns a result column name into words
+
+    "SUM(e.amount)" -> "total amount", "COUNT(*)" -> "number of jobs" (noun taken
+    from a "how many ..." question), "total_expenses" -> "total expenses".
+    """
+    match = _AGGREGATE.match(column)
+    if match:
+        function, _, argument = match.groups()
+        argument = argument.split(".")[-1].replace("_", " ").strip()
+        if function.lower() == "count" and argument in ("*", "1", ""):
+            noun = _HOW_MANY.match(question)
+            argument = noun.group(1).strip().lower() if noun else "matching records"
+        prefix = AGGREGATE_LABELS[function.lower()]
+        return argument if argument.startswith(prefix) else f"{prefix} {argument}"
+
+    return column.split(".")[-1].replace("_", " ").strip()
+
+
+def _lead_column(columns: List[str]) -> int:
+    """Index of the column that best names a row: a name or description, else the first non-identifier"""
+    words = [_column_words(column) for column in columns]
+    for index, column_words in enumerate(words):
+        if _NAME_WORDS.intersection(column_words):
+            return index
+    for index, column_words in enumerate(words):
+        if "id" not in column_words:
+            return index
+    return 0
+
+
+class AnswerRenderer:
+    """
+    Deterministic answer templates for small results
+
+    Scalar, single-row and small-table results are turned into sentences locally,
+    which skips the second LLM round trip. Larger or wider results are escalated to
+    the model, depending on the policy:
+
+        auto   render small results locally, send the rest to the model
+        llm    always use the model (original behavior)
+        local  never use the model; large results are shown as a table
+    """
+
+    def __init__(self, policy: str = "auto", max_rows: int = 10, max_columns: int = 4):
+        """
+        Initialize the renderer
+
+        Args:
+            policy: One of FORMAT_POLICIES
+            max_rows: Largest number of rows rendered locally under the auto policy
+            max_columns: Largest number of columns rendered locally under the auto policy
+        """
+        if policy not in FORMAT_POLICIES:
+            raise ValueError(f"Unknown format policy {policy!r} (expected one of {', '.join(FORMAT_POLICIES)})")
+
+        self.policy = policy
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+
+    def render(self, question: str, result: QueryResult) -> Optional[str]:
+        """
+        Renders an answer locally if the policy and result shape allow it
+
+        Args:
+            question: Original natural language question
+            result: Structured query result
+
+        Returns:
+            Answer text, or None if the result should be formatted by the model
+        """
+        if self.policy == "llm":
+            return None
+
+        if not result.has_result_set:
+            return "The statement ran successfully and returned no rows."
+
+        if result.total_count == 0:
+            return "No matching records were found."
+
+        is_small = (
+            not result.truncated
+            and result.total_count <= self.max_rows
+            and len(result.columns) <= self.max_columns
+        )
+
+        if result.total_count == 1 and len(result.columns) == 1:
+            return self._render_scalar(question, result.columns[0], result.rows[0][0])
+
+        if result.total_count == 1 and (is_small or self.policy == "local"):
+            return self._render_row(question, result.columns, result.rows[0])
+
+        if is_small:
+            return self._render_list(question, result.columns, result.rows)
+
+        if self.policy == "local":
+            shown = len(result.rows)
+            header = f"Found {result.total_count} rows" + (f"; showing the first {shown}:" if result.truncated else ":")
+            return f"{header}\n\n{result.to_table()}"
+
+        return None
+
+    def _render_scalar(self, question: str, column: str, value: Any) -> Optional[str]:
+        """
+        A single value, in a sentence built from the question so its qualifiers are kept
+
+        "What is the total revenue for Central Glass DC?" -> "The total revenue for Central
+        Glass DC is 22,729.00."; "How many jobs are there?" -> "The number of jobs is 8.".
+        Other questions ("How many jobs are in progress?") go to the model under the auto
+        policy, since a label built from the column alone would drop the question's filters.
+        """
+        shown = format_value(value, column)
+        subject = _WHAT_IS.match(question)
+        if subject:
+            verb, phrase = subject.groups()
+            if value is None:
+                return f"No value was found for the {phrase}."
+            return f"The {phrase} {(verb or 'is').lower()} {shown}."
+
+        count = _UNQUALIFIED_COUNT.match(question)
+        if count:
+            return f"The number of {count.group(1).strip()} is {shown}."
+
+        if self.policy == "auto":
+            return None
+        return f"The answer to \"{question.strip()}\" is {shown}."
+
+    def _render_row(self, question: str, columns: List[str], row: tuple) -> str:
+        """A single record: one 'label: value' pair per column"""
+        pairs = ", ".join(f"{column_label(column, question)}: {format_value(value, column)}"
+                          for column, value in zip(columns, row))
+        return f"Found 1 result ({pairs})."
+
+    def _render_list(self, question: str, columns: List[str], rows: List[tuple]) -> str:
+        """A handful of records: a bulleted list led by each row's name or description"""
+        lead = _lead_column(columns)
+        lines = [f"Found {len(rows)} results:", ""]
+        for row in rows:
+            line = f"- {format_value(row[lead], columns[lead])}"
+            if len(columns) > 1:
+                details = ", ".join(
+                    f"{column_label(column, question)}: {format_value(value, column)}"
+                    for index, (column, value) in enumerate(zip(columns, row)) if index != lead
+                )
+                line += f" ({details})"
+            lines.append(line)
+        return "\n".join(lines)
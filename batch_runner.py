@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, Optional, TextIO, Tuple
+
+from query_processor import QueryProcessor
+from query_result import QueryResult
+from sqlite_manager import SQLiteManager
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Reads questions from a JSONL file
+
+    Each line is either a JSON string or an object with a "question" field
+    (a "title" field is accepted too, so requests.jsonl-style files work as input).
+    An "id" or "request_id" field is carried through to the output.
+
+    Yields:
+        (question_id, question) tuples
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise RuntimeError(f"Invalid JSON on line {line_number} of {path}: {e}")
+
+            if isinstance(item, str):
+                yield str(line_number), item
+                continue
+
+            question = item.get("question") or item.get("title")
+            if not question:
+                raise RuntimeError(f"Line {line_number} of {path} has no 'question' field")
+
+            question_id = item.get("id") or item.get("request_id") or str(line_number)
+            yield str(question_id), question
+
+
+class BatchRunner:
+    """
+    Processes a file of questions concurrently
+
+    LLM stages (SQL generation and answer formatting) run on a pool of worker
+    threads while SQL execution runs on a separate database pool, so questions
+    waiting on the model never hold up questions that are ready to execute.
+    The API request rate is bounded by the OpenAIClient's RateLimiter.
+    """
+
+    def __init__(self, processor: QueryProcessor, workers: int = 4, db_workers: int = 1):
+        """
+        Initialize the batch runner
+
+        Args:
+            processor: QueryProcessor whose database is open
+            workers: Number of questions processed concurrently (LLM stage threads)
+            db_workers: Number of threads executing SQL, each with its own connection
+                (only useful above 1 with a pooled or otherwise thread-safe SQLiteManager)
+        """
+        self.processor = processor
+        self.workers = workers
+        self.db_workers = db_workers
+        self._local = threading.local()
+        self._managers = []
+        self._managers_lock = threading.Lock()
+
+    def _thread_db_manager(self) -> SQLiteManager:
+        """Returns the calling database thread's own SQLiteManager, opening it on first use"""
+        if self.processor.db_manager.pooled:
+            # A pooled manager already hands each thread its own connection
+            return self.processor.db_manager
+
+        manager = getattr(self._local, "db_manager", None)
+        if manager is None:
+            manager = self.processor.db_manager.clone()
+            self._local.db_manager = manager
+            with self._managers_lock:
+                self._managers.append(manager)
+        return manager
+
+    def run(self, input_path: str, output: TextIO) -> dict:
+        """
+        Processes every question in input_path and writes one JSON result per line
+
+        Args:
+            input_path: JSONL file of questions
+            output: Writable text stream for JSONL results (written in completion order)
+
+        Returns:
+            Summary with question, success and error counts and the wall-clock time
+        """
+        started = time.perf_counter()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix="batch-db") as db_pool:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-llm") as llm_pool:
+                    futures = [
+                        llm_pool.submit(self._process_one, index, question_id, question, db_pool)
+                        for index, (question_id, question) in enumerate(read_questions(input_path))
+                    ]
+
+                    succeeded = 0
+                    for future in as_completed(futures):
+                        record = future.result()
+                        if "error" not in record:
+                            succeeded += 1
+                        output.write(json.dumps(record) + "\n")
+                        output.flush()
+        finally:
+            # Both pools have shut down, so no thread is still using a clone; every clone is closed,
+            # including those of threads that went idle or failed after opening one
+            self._close_db_managers()
+
+        return {
+            "questions": len(futures),
+            "succeeded": succeeded,
+            "failed": len(futures) - succeeded,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _prompt_schema(self, question: str) -> Tuple[str, Optional[str]]:
+        """Runs on a database thread: gets the (cached, possibly pruned) prompt schema"""
+        return self.processor.prompt_schema(question, db_manager=self._thread_db_manager())
+
+    def _validate(self, sql_query: str) -> str:
+        """Runs on a database thread: compiles generated SQL without executing it"""
+        return self._thread_db_manager().validate_sql(sql_query)
+
+    def _close_db_managers(self):
+        """Closes every per-thread SQLiteManager opened during a run"""
+        with self._managers_lock:
+            managers, self._managers = self._managers, []
+            self._local = threading.local()
+        for manager in managers:
+            manager.close_database()
+
+    def _execute(self, question: str, sql_query: str, schema_hash: Optional[str],
+                 params: Optional[dict] = None) -> Tuple[QueryResult, float]:
+        """Runs on a database thread: executes SQL and times the execution itself"""
+        started = time.perf_counter()
+        result = self.processor.execute_sql(question, sql_query, schema_hash, db_manager=self._thread_db_manager(),
+                                            params=params)
+        return result, time.perf_counter() - started
+
+    def _process_one(self, index: int, question_id: str, question: str, db_pool: ThreadPoolExecutor) -> dict:
+        """Runs the full pipeline for one question, recording per-stage timings"""
+        record = {"index": index, "id": question_id, "question": question}
+        timings = {}
+        started = time.perf_counter()
+
+        try:
+            stage_started = time.perf_counter()
+            schema, schema_hash = db_pool.submit(self._prompt_schema, question).result()
+            timings["schema"] = time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            match = self.processor.match_intent(question)
+            if match is not None:
+                sql_query, cached = match.display_sql, False
+                executed_sql, params = match.sql, match.params
+                record["intent"] = match.template.pattern
+            else:
+                sql_query, cached = self.processor.generate_sql(
+                    question, schema, schema_hash,
+                    validate=lambda candidate: db_pool.submit(self._validate, candidate).result()
+                )
+                executed_sql, params = sql_query, None
+            timings["generate_sql"] = time.perf_counter() - stage_started
+            record["sql"] = sql_query
+            record["sql_cached"] = cached
+
+            stage_started = time.perf_counter()
+            result, execute_seconds = db_pool.submit(
+                self._execute, question, executed_sql, schema_hash, params
+            ).result()
+            timings["execute_sql"] = execute_seconds
+            timings["execute_queue"] = time.perf_counter() - stage_started - execute_seconds
+            record.update({
+                "columns": result.columns,
+                "rows": result.to_dict()["rows"],
+                "total_count": result.total_count,
+                "truncated": result.truncated,
+            })
+
+            stage_started = time.perf_counter()
+            record["answer"] = self.processor.format_answer(question, sql_query, result)
+            timings["format_response"] = time.perf_counter() - stage_started
+        except Exception as e:
+            record["error"] = str(e)
+
+        timings["total"] = time.perf_counter() - started
+        record["timings"] = {stage: round(seconds, 6) for stage, seconds in timings.items()}
+        return record
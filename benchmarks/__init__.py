@@ -0,0 +1,8 @@
+"""
+Offline benchmark suite: a mock OpenAI-compatible server, a synthetic data
+generator for the centralglass_recon schema and an end-to-end workload runner.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmark --jobs 100000
+"""
@@ -0,0 +1,144 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# The question follows this line in both SQL generation prompts (see OpenAIClient.build_sql_messages)
+_SQL_QUESTION = re.compile(r"into a SQLite SQL query:\n(.*?)\n", re.DOTALL)
+
+DEFAULT_SQL = "SELECT COUNT(*) FROM job;"
+DEFAULT_ANSWER = "Here is a summary of the results based on the data returned by the query."
+
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible /chat/completions endpoint with canned responses
+
+    SQL generation prompts get the SQL registered for their question (or
+    DEFAULT_SQL); every other prompt gets DEFAULT_ANSWER, streamed word by word
+    when the request asks for a stream. Each response waits latency seconds plus
+    up to jitter seconds, drawn from a seeded generator so runs are repeatable.
+    Responses carry usage token counts estimated from the prompt and reply length.
+    """
+
+    def __init__(self, responses: Optional[Dict[str, str]] = None, latency: float = 0.05,
+                 jitter: float = 0.0, seed: int = 42, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the server (call start() to begin serving)
+
+        Args:
+            responses: Question -> SQL mapping for SQL generation prompts
+            latency: Base delay in seconds before each response
+            jitter: Maximum extra random delay in seconds
+            seed: Seed for the jitter
+            host: Interface to listen on
+            port: TCP port (0 picks a free one)
+        """
+        self.responses = {question.strip(): sql for question, sql in (responses or {}).items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        """Starts serving on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server and closes its socket"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reply_for(self, prompt: str) -> str:
+        """Chooses the canned reply for a prompt"""
+        match = _SQL_QUESTION.search(prompt)
+        if match:
+            return self.responses.get(match.group(1).strip(), DEFAULT_SQL)
+        return DEFAULT_ANSWER
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; with Nagle's algorithm the body waits for the
+            # client's delayed ACK, adding ~40 ms to every keep-alive request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+                    prompt = "\n\n".join(message["content"] for message in body["messages"])
+                except (ValueError, KeyError, IndexError, TypeError):
+                    self._send_json(400, {"error": {"message": "Malformed request"}})
+                    return
+
+                time.sleep(mock._delay())
+                reply = mock.reply_for(prompt)
+                usage = {
+                    "prompt_tokens": max(1, len(prompt) // 4),
+                    "completion_tokens": max(1, len(reply) // 4),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+                if body.get("stream"):
+                    self._stream(reply, usage, body.get("stream_options", {}).get("include_usage", False))
+                else:
+                    self._send_json(200, {
+                        "object": "chat.completion",
+                        "model": body.get("model", "mock"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                     "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+            def _send_json(self, status: int, payload: dict):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, reply: str, usage: dict, include_usage: bool):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                events = [{"choices": [{"index": 0, "delta": {"content": token}}]}
+                          for token in re.findall(r"\S+\s*", reply)]
+                if include_usage:
+                    events.append({"choices": [], "usage": usage})
+
+                for event in events:
+                    self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        return Handler
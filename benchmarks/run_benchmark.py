@@ -0,0 +1,227 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from answer_renderer import AnswerRenderer, FORMAT_POLICIES
+from batch_runner import BatchRunner
+from few_shot_examples import FEW_SHOT_EXAMPLES
+from metrics import MetricsRegistry
+from openai_client import OpenAIClient
+from query_processor import QueryProcessor
+from result_cache import ResultCache
+from sqlite_manager import SQLiteManager
+
+from benchmarks.mock_llm import MockLLMServer
+from benchmarks.synthetic_data import generate_database
+
+DEFAULT_DATA_DIR = os.path.join("benchmarks", ".data")
+
+STAGES = ("schema", "generate_sql", "execute_queue", "execute_sql", "format_response", "total")
+
+# Regressions smaller than this many seconds are treated as noise
+NOISE_FLOOR_SECONDS = 0.002
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Exact percentile with linear interpolation between closest ranks"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+def write_workload(path: str, iterations: int):
+    """Writes the few-shot questions, repeated iterations times, as batch input"""
+    with open(path, "w", encoding="utf-8") as f:
+        for iteration in range(iterations):
+            for index, (question, _) in enumerate(FEW_SHOT_EXAMPLES):
+                f.write(json.dumps({"id": f"{iteration}-{index}", "question": question}) + "\n")
+
+
+def run_workload(processor: QueryProcessor, iterations: int, workers: int, db_workers: int) -> dict:
+    """Runs the workload through BatchRunner and collects per-stage timings"""
+    with tempfile.TemporaryDirectory() as directory:
+        questions_path = os.path.join(directory, "questions.jsonl")
+        write_workload(questions_path, iterations)
+
+        output = io.StringIO()
+        summary = BatchRunner(processor, workers=workers, db_workers=db_workers).run(questions_path, output)
+
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors = []
+    for line in output.getvalue().splitlines():
+        record = json.loads(line)
+        if "error" in record:
+            errors.append(f"{record['question']}: {record['error']}")
+            continue
+        for stage, seconds in record["timings"].items():
+            timings.setdefault(stage, []).append(seconds)
+
+    return {
+        "questions": summary["questions"],
+        "failed": summary["failed"],
+        "errors": errors[:10],
+        "elapsed_seconds": summary["elapsed_seconds"],
+        "throughput_qps": summary["questions"] / summary["elapsed_seconds"] if summary["elapsed_seconds"] else None,
+        "stages": {stage: summarize(values) for stage, values in timings.items() if values},
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Lists stages whose p95 grew by more than max_regression (a fraction) over the baseline"""
+    regressions = []
+    for stage, stats in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        limit = previous["p95"] * (1 + max_regression)
+        if stats["p95"] > limit and stats["p95"] - previous["p95"] > NOISE_FLOOR_SECONDS:
+            regressions.append(
+                f"{stage}: p95 {stats['p95'] * 1000:.1f}ms vs baseline {previous['p95'] * 1000:.1f}ms "
+                f"(+{(stats['p95'] / previous['p95'] - 1) * 100:.0f}%)"
+            )
+
+    if report.get("throughput_qps") and baseline.get("throughput_qps"):
+        if report["throughput_qps"] < baseline["throughput_qps"] / (1 + max_regression):
+            regressions.append(
+                f"throughput: {report['throughput_qps']:.2f} q/s vs baseline {baseline['throughput_qps']:.2f} q/s"
+            )
+    return regressions
+
+
+def print_report(report: dict):
+    """Prints the per-stage latency table and throughput"""
+    config = report["config"]
+    print(f"\nDatabase: {config['database']} ({config['job_rows']:,} jobs), mock latency {config['latency'] * 1000:.0f}ms, "
+          f"{config['workers']} workers, {report['questions']} questions")
+    print(f"{'stage':<16} {'count':>6} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage in STAGES:
+        stats = report["stages"].get(stage)
+        if stats:
+            print(f"{stage:<16} {stats['count']:>6} " + " ".join(
+                f"{stats[key] * 1000:>10.2f}" for key in ("mean", "p50", "p95", "p99", "max")
+            ))
+    print(f"\nThroughput: {report['throughput_qps']:.2f} questions/s ({report['elapsed_seconds']}s wall clock, "
+          f"{report['failed']} failed)")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="End-to-end benchmark: few-shot workload against a mock LLM and synthetic data"
+    )
+    parser.add_argument("--jobs", type=int, default=10000, help="Rows in the synthetic job table (default: 10000)")
+    parser.add_argument("--database", help="Use this database instead of generating one")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the synthetic database even if it exists")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for data generation and mock jitter (default: 42)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM latency in seconds (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random mock latency in seconds (default: 0)")
+    parser.add_argument("--iterations", type=int, default=5, help="Times the workload is repeated (default: 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured iterations run first (default: 1)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent questions (default: 4)")
+    parser.add_argument("--pool", action="store_true", help="Use pooled read-only connections (one per DB worker)")
+    parser.add_argument("--db-workers", type=int, default=None, help="SQL execution threads (default: --workers with --pool, otherwise 1)")
+    parser.add_argument("--result-cache", action="store_true", help="Enable the in-memory result cache")
+    parser.add_argument("--format-policy", choices=FORMAT_POLICIES, default="auto", help="Answer formatting policy (default: auto)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report and fail on regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 growth over the baseline as a fraction (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    database = args.database or os.path.join(DEFAULT_DATA_DIR, f"bench_{args.jobs}_{args.seed}.sqlite")
+    if not args.database and (args.regenerate or not os.path.exists(database)):
+        os.makedirs(os.path.dirname(database), exist_ok=True)
+        print(f"Generating synthetic database with {args.jobs:,} jobs...", file=sys.stderr)
+        generate_database(database, jobs=args.jobs, seed=args.seed)
+
+    mock = MockLLMServer(dict(FEW_SHOT_EXAMPLES), latency=args.latency, jitter=args.jitter, seed=args.seed).start()
+    os.environ["OPENAI_BASE_URL"] = mock.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    metrics = MetricsRegistry()
+    db_manager = SQLiteManager(
+        result_cache=ResultCache() if args.result_cache else None,
+        pooled=args.pool,
+        metrics=metrics
+    )
+    ai_client = OpenAIClient(base_url=mock.base_url, pool_size=max(10, args.workers), metrics=metrics)
+    processor = QueryProcessor(db_manager, ai_client, use_few_shot=True, examples=FEW_SHOT_EXAMPLES,
+                               answer_renderer=AnswerRenderer(args.format_policy), metrics=metrics)
+    db_workers = args.db_workers or (args.workers if args.pool else 1)
+
+    try:
+        if not db_manager.open_database(database):
+            print(f"Error: Failed to open database at {database}", file=sys.stderr)
+            return 1
+
+        if args.warmup:
+            run_workload(processor, args.warmup, args.workers, db_workers)
+        metrics.reset()
+
+        report = run_workload(processor, args.iterations, args.workers, db_workers)
+        job_rows = db_manager.db.execute("SELECT COUNT(*) FROM job").fetchone()[0]
+    finally:
+        db_manager.close_database()
+        ai_client.close()
+        mock.stop()
+
+    report["config"] = {
+        "database": database,
+        "job_rows": job_rows,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "iterations": args.iterations,
+        "workers": args.workers,
+        "db_workers": db_workers,
+        "pool": args.pool,
+        "result_cache": args.result_cache,
+        "format_policy": args.format_policy,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.time(),
+    }
+    report["metrics"] = metrics.snapshot()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterator, Optional
+
+TEMPLATE_DB_PATH = "centralglass_recon.sqlite"
+
+# Tables in foreign-key order
+TABLES = (
+    "company", "customer", "employee", "employee_company", "pay_period",
+    "job", "invoice", "payment", "expense", "payroll",
+)
+
+# Named companies the few-shot workload asks about
+COMPANY_NAMES = ("Central Glass DC", "Recon Pest Control")
+
+JOB_TYPES = ("glass_install", "service_call", "pest_treatment", "inspection", "other")
+JOB_STATUSES = ("scheduled", "in_progress", "completed", "canceled")
+INVOICE_STATUSES = ("draft", "sent", "paid", "void")
+PAYMENT_METHODS = ("ACH", "card", "check", "cash")
+EXPENSE_CATEGORIES = ("materials", "tools", "fuel", "chemicals", "vehicle", "office")
+JOB_TITLES = ("Glazier", "Technician", "Installer", "Inspector", "Office Manager")
+START_DATE = date(2024, 1, 1)
+
+BATCH_SIZE = 50000
+
+
+def table_sizes(jobs: int) -> Dict[str, int]:
+    """
+    Derives every table's row count from the number of jobs
+
+    The ratios follow the template database (about one invoice per job and a
+    payment for most invoices); supporting tables grow more slowly.
+    """
+    employees = max(10, jobs // 200)
+    return {
+        "company": max(2, jobs // 100000),
+        "customer": max(8, jobs // 10),
+        "employee": employees,
+        "employee_company": int(employees * 1.2),
+        "pay_period": 52,
+        "job": jobs,
+        "invoice": int(jobs * 0.9),
+        "payment": int(jobs * 0.75),
+        "expense": int(jobs * 0.7),
+        "payroll": employees * 52,
+    }
+
+
+def _day(rng: random.Random, days: int = 730) -> str:
+    return (START_DATE + timedelta(days=rng.randrange(days))).isoformat()
+
+
+def _rows(table: str, sizes: Dict[str, int], rng: random.Random) -> Iterator[tuple]:
+    """Yields the rows of one table, with ids starting at 1 and valid foreign keys"""
+    companies, customers, employees = sizes["company"], sizes["customer"], sizes["employee"]
+    jobs, invoices = sizes["job"], sizes["invoice"]
+
+    if table == "company":
+        for company_id in range(1, companies + 1):
+            name = COMPANY_NAMES[company_id - 1] if company_id <= len(COMPANY_NAMES) else f"Company {company_id}"
+            yield company_id, name
+    elif table == "customer":
+        for customer_id in range(1, sizes["customer"] + 1):
+            yield customer_id, f"Customer {customer_id}", f"555-{customer_id % 10000:04d}", f"billing{customer_id}@example.com"
+    elif table == "employee":
+        for employee_id in range(1, employees + 1):
+            pay_type = "salary" if rng.random() < 0.2 else "hourly"
+            base_rate = round(rng.uniform(1800, 3200), 2) if pay_type == "salary" else round(rng.uniform(18, 45), 2)
+            yield employee_id, f"First{employee_id}", f"Last{employee_id}", pay_type, base_rate, int(rng.random() < 0.9)
+    elif table == "employee_company":
+        # Every employee works for one company; the rest of the rows add second companies
+        pairs = [(employee_id, rng.randint(1, companies)) for employee_id in range(1, employees + 1)]
+        seen = set(pairs)
+        while len(pairs) < sizes["employee_company"] and companies > 1:
+            pair = (rng.randint(1, employees), rng.randint(1, companies))
+            if pair not in seen:
+                seen.add(pair)
+                pairs.append(pair)
+        for row_id, (employee_id, company_id) in enumerate(pairs, 1):
+            override = round(rng.uniform(20, 50), 2) if rng.random() < 0.3 else None
+            yield row_id, employee_id, company_id, rng.choice(JOB_TITLES), override
+    elif table == "pay_period":
+        for period_id in range(1, sizes["pay_period"] + 1):
+            start = START_DATE + timedelta(days=14 * (period_id - 1))
+            yield period_id, start.isoformat(), (start + timedelta(days=13)).isoformat()
+    elif table == "job":
+        for job_id in range(1, jobs + 1):
+            start = _day(rng)
+            yield (job_id, rng.randint(1, companies), rng.randint(1, customers), rng.choice(JOB_TYPES),
+                   start, start if rng.random() < 0.8 else None, rng.choice(JOB_STATUSES))
+    elif table == "invoice":
+        for invoice_id in range(1, invoices + 1):
+            yield (invoice_id, rng.randint(1, companies), rng.randint(1, jobs), _day(rng),
+                   round(rng.uniform(50, 10000), 2), rng.choice(INVOICE_STATUSES))
+    elif table == "payment":
+        for payment_id in range(1, sizes["payment"] + 1):
+            yield (payment_id, rng.randint(1, companies), rng.randint(1, invoices), _day(rng),
+                   round(rng.uniform(50, 10000), 2), rng.choice(PAYMENT_METHODS))
+    elif table == "expense":
+        for expense_id in range(1, sizes["expense"] + 1):
+            yield (expense_id, rng.randint(1, companies), f"Vendor {rng.randint(1, 500)}",
+                   rng.choice(EXPENSE_CATEGORIES), round(rng.uniform(10, 5000), 2), _day(rng), rng.randint(1, jobs))
+    elif table == "payroll":
+        row_id = 0
+        for period_id in range(1, sizes["pay_period"] + 1):
+            for employee_id in range(1, employees + 1):
+                row_id += 1
+                gross = round(rng.uniform(800, 4000), 2)
+                taxes = round(gross * 0.2, 2)
+                yield row_id, rng.randint(1, companies), employee_id, period_id, gross, taxes, round(gross - taxes, 2)
+    else:
+        raise ValueError(f"Unknown table: {table}")
+
+
+def generate_database(path: str, jobs: int = 10000, seed: int = 42,
+                      template_path: str = TEMPLATE_DB_PATH, verbose: bool = True) -> Dict[str, int]:
+    """
+    Creates a database with the template's schema filled with deterministic synthetic rows
+
+    Args:
+        path: Output database path (replaced if it exists)
+        jobs: Number of rows in the job table; every other table scales with it
+        seed: Random seed, so the same arguments always produce the same data
+        template_path: Database whose schema (tables and indexes) is copied
+        verbose: Print progress to stderr
+
+    Returns:
+        Row count per table
+    """
+    try:
+        template = sqlite3.connect(f"file:{template_path}?mode=ro", uri=True)
+        schema = [row[0] for row in template.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END, rowid"
+        )]
+        template.close()
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Failed to read schema from {template_path}: {e}")
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    sizes = table_sizes(jobs)
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+
+    started = time.perf_counter()
+    for statement in schema:
+        db.execute(statement)
+
+    for table in TABLES:
+        columns = len(db.execute(f"PRAGMA table_info({table})").fetchall())
+        insert = f"INSERT INTO {table} VALUES ({', '.join('?' * columns)})"
+        rows = _rows(table, sizes, rng)
+        while True:
+            batch = [row for _, row in zip(range(BATCH_SIZE), rows)]
+            if not batch:
+                break
+            db.executemany(insert, batch)
+        db.commit()
+        if verbose:
+            print(f"  {table:<17} {sizes[table]:>12,} rows", file=sys.stderr)
+
+    db.execute("ANALYZE")
+    db.commit()
+    db.close()
+
+    if verbose:
+        print(f"Generated {sum(sizes.values()):,} rows in {time.perf_counter() - started:.1f}s: {path}", file=sys.stderr)
+    return sizes
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic centralglass_recon database")
+    parser.add_argument("output", help="Path of the database to create")
+    parser.add_argument("--jobs", type=int, default=10000, help="Rows in the job table; other tables scale with it (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--template", default=TEMPLATE_DB_PATH, help=f"Database whose schema is copied (default: {TEMPLATE_DB_PATH})")
+    args = parser.parse_args(argv)
+
+    generate_database(args.output, jobs=args.jobs, seed=args.seed, template_path=args.template)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import difflib
+import json
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from example_store import STOPWORDS, referenced_tables
+from intent_templates import LITERAL_COMPARISON, comparison_table
+from query_guard import table_aliases
+
+# Columns with more distinct values than this are identifiers or free text, not entities
+DEFAULT_MAX_DISTINCT = 1000
+
+# Similarity a question mention needs to be grounded to a stored value
+DEFAULT_MIN_SIMILARITY = 0.8
+
+# Most stored values added to a prompt
+DEFAULT_MAX_HINTS = 8
+
+# Longest value indexed; longer text is free text rather than a name
+MAX_VALUE_LENGTH = 100
+
+# Candidates fetched from the trigram index before scoring
+_CANDIDATES = 50
+
+_TEXT_TYPE = re.compile(r"CHAR|TEXT|CLOB|^$", re.IGNORECASE)
+_DATE_LIKE = re.compile(r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}(:\d{2})?)?$")
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+_SIDECAR_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entity USING fts5(
+    value, table_name UNINDEXED, column_name UNINDEXED, tokenize = 'trigram'
+);
+CREATE TABLE IF NOT EXISTS entity_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _normalize(text: str) -> str:
+    """Lowercase words separated by single spaces ('In_Progress' -> 'in progress')"""
+    return " ".join(_WORD.findall(text.lower().replace("_", " ")))
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _trigram_query(text: str) -> Optional[str]:
+    """FTS5 query matching any trigram of the text, or None if the text is too short"""
+    trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+    trigrams = [trigram for trigram in trigrams if trigram.strip()]
+    if not trigrams:
+        return None
+    return " OR ".join('"' + trigram.replace('"', '""') + '"' for trigram in sorted(trigrams))
+
+
+def similarity(mention: str, value: str) -> float:
+    """
+    Scores how well a (normalized) mention names a (normalized) stored value
+
+    Mentions that are a whole-word part of the value ('central glass' in
+    'central glass dc') score at least 0.8, rising with the share of the value covered.
+    """
+    score = difflib.SequenceMatcher(None, mention, value).ratio()
+    mention_words, value_words = mention.split(), value.split()
+    if _contains_words(value_words, mention_words):
+        score = max(score, 0.8 + 0.2 * len(mention_words) / len(value_words))
+    return score
+
+
+def _contains_words(value_words: List[str], words: List[str]) -> bool:
+    """Whether words appear as a contiguous run of whole words in value_words"""
+    return any(value_words[start:start + len(words)] == words for start in range(len(value_words) - len(words) + 1))
+
+
+@dataclass
+class EntityMatch:
+    """A stored value a question or query literal refers to"""
+    table: str
+    column: str
+    value: str
+    mention: str
+    score: float
+
+    def __str__(self) -> str:
+        return f"{self.table}.{self.column} = {_quote(self.value)}"
+
+
+class EntityIndex:
+    """
+    Trigram index of the values stored in low-cardinality text columns
+
+    Company and customer names, statuses, job types and similar columns are copied
+    into an FTS5 table with the trigram tokenizer, kept in a sidecar database so the
+    main database is never written to. The index is built on first use and rebuilt
+    when the data changes (PRAGMA data_version, the file stamps and the schema hash).
+
+    It grounds literal values in two places: ground() finds the stored values a
+    question mentions, even misspelled or partially, so the prompt can give the
+    model the exact spelling; rewrite_sql() replaces literals in generated SQL that
+    are compared to an indexed column but match no stored value with the closest
+    stored one ('Central Glass' -> 'Central Glass DC', 'in progress' -> 'in_progress').
+    """
+
+    def __init__(self, index_path: str = ":memory:", max_distinct: int = DEFAULT_MAX_DISTINCT,
+                 min_similarity: float = DEFAULT_MIN_SIMILARITY, max_hints: int = DEFAULT_MAX_HINTS):
+        """
+        Initialize the index
+
+        Args:
+            index_path: Sidecar SQLite file holding the index (default: in memory); a file
+                is reused across sessions while the database is unchanged
+            max_distinct: Largest number of distinct values an indexed column may have
+            min_similarity: Score (0-1) a question mention needs to be grounded to a stored value
+            max_hints: Most stored values returned by ground()
+        """
+        self.index_path = index_path
+        self.max_distinct = max_distinct
+        self.min_similarity = min_similarity
+        self.max_hints = max_hints
+        self._lock = threading.Lock()
+        self._stamp: Optional[str] = None
+        self._tables: Dict[str, List[Tuple[str, str]]] = {}
+        self._values: Dict[Tuple[str, str], Set[str]] = {}
+        try:
+            self._sidecar = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+            self._sidecar.executescript(_SIDECAR_SCHEMA)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to open entity index at {index_path}: {e}")
+
+    @property
+    def columns(self) -> List[Tuple[str, str]]:
+        """Indexed (table, column) pairs"""
+        return sorted(self._values)
+
+    def refresh(self, db_manager) -> bool:
+        """
+        Builds or rebuilds the index if the database changed since the last build
+
+        Must be called from the thread that owns db_manager's connection.
+
+        Args:
+            db_manager: Open SQLiteManager to index
+
+        Returns:
+            True if the index was rebuilt
+        """
+        data_stamp, file_stamp = db_manager.get_data_stamps()
+        schema_hash = db_manager.get_schema_hash()
+        stamp = json.dumps([data_stamp, schema_hash])
+        if stamp == self._stamp:
+            return False
+
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+
+            tables = db_manager.get_catalog()["tables"]
+            # A file index from an earlier session is still valid if the file is unchanged
+            persisted = json.dumps([db_manager.db_path, file_stamp, schema_hash])
+            if self._stamp is None and self._meta("source") == persisted:
+                self._tables = tables
+                self._values = self._load_values()
+                self._stamp = stamp
+                return False
+
+            try:
+                values = self._read_values(db_manager, tables)
+                self._sidecar.execute("BEGIN")
+                self._sidecar.execute("DELETE FROM entity")
+                self._sidecar.executemany(
+                    "INSERT INTO entity (value, table_name, column_name) VALUES (?, ?, ?)",
+                    ((value, table, column) for (table, column), stored in values.items() for value in stored)
+                )
+                self._sidecar.execute("INSERT OR REPLACE INTO entity_meta (key, value) VALUES ('source', ?)",
+                                      (persisted,))
+                self._sidecar.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._sidecar.in_transaction:
+                    self._sidecar.execute("ROLLBACK")
+                raise RuntimeError(f"Failed to build entity index: {e}")
+
+            self._tables = tables
+            self._values = values
+            self._stamp = stamp
+        return True
+
+    def ground(self, question: str) -> List[EntityMatch]:
+        """
+        Finds the stored values a question mentions
+
+        Every run of question words is compared with the candidates the trigram
+        index returns for the question's content words.
+
+        Returns:
+            Best-scoring matches first, at most max_hints, one per stored value
+        """
+        words = _normalize(question).split()
+        content = [word for word in words if word not in STOPWORDS and len(word) >= 3]
+        query = _trigram_query(" ".join(content))
+        if query is None:
+            return []
+
+        matches: Dict[Tuple[str, str, str], EntityMatch] = {}
+        for value, table, column in self._search(query):
+            target = _normalize(value)
+            size = len(target.split())
+            for length in range(max(1, size - 1), size + 2):
+                for start in range(len(words) - length + 1):
+                    window = words[start:start + length]
+                    if not any(word in content for word in window):
+                        continue
+                    mention = " ".join(window)
+                    score = similarity(mention, target)
+                    key = (table, column, value)
+                    if score >= self.min_similarity and (key not in matches or score > matches[key].score):
+                        matches[key] = EntityMatch(table, column, value, mention, score)
+
+        # Rank by how much of the question a match explains, so 'centrl glass' -> 'Central Glass DC'
+        # beats the closer but shorter 'glass' -> 'glass_install'
+        ranked = sorted(matches.values(), key=lambda match: (-match.score * len(match.mention), -match.score,
+                                                             match.table, match.column, match.value))
+        return ranked[:self.max_hints]
+
+    def rewrite_sql(self, sql_query: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        Replaces literals compared to indexed columns with the stored value they most likely mean
+
+        Only literals that match no stored value are changed, and only to the one
+        stored value of that column they equal once case, spacing and underscores
+        are ignored ('in progress' -> 'in_progress'), or else to the one stored value
+        containing them as whole words ('Central Glass' -> 'Central Glass DC').
+        Misspellings are left alone: spelling similarity cannot tell 'unpaid' from
+        'paid', and no rows is a better answer than the opposite rows.
+
+        Returns:
+            (rewritten SQL, [(old literal, new literal), ...])
+        """
+        if not self._values:
+            return sql_query, []
+
+        known = {table.lower(): table for table in self._tables}
+        aliases = table_aliases(sql_query, set(known))
+        from_tables = [known[name] for name in referenced_tables(sql_query) if name in known]
+        replacements = []
+
+        def replace(match: re.Match) -> str:
+            qualifier, column, literal = match.groups()
+            value = literal.replace("''", "'")
+            table = comparison_table(qualifier or "", column, aliases, known, from_tables, self._tables)
+            stored = self._values.get((table, column)) if table else None
+            if not stored or value in stored:
+                return match.group(0)
+
+            best = self._closest(value, stored)
+            if best is None:
+                return match.group(0)
+            replacements.append((value, best))
+            return match.group(0)[:match.start(3) - match.start(0) - 1] + _quote(best)
+
+        return LITERAL_COMPARISON.sub(replace, sql_query), replacements
+
+    def close(self):
+        """Closes the sidecar database"""
+        self._sidecar.close()
+
+    @staticmethod
+    def _closest(value: str, stored: Set[str]) -> Optional[str]:
+        """The single stored value a literal equals after normalization, or else contains as whole words"""
+        target = _normalize(value)
+        if not target:
+            return None
+        exact = [candidate for candidate in stored if _normalize(candidate) == target]
+        if exact:
+            return exact[0] if len(exact) == 1 else None
+
+        words = target.split()
+        if all(word in STOPWORDS for word in words):
+            return None
+        containing = [candidate for candidate in stored if _contains_words(_normalize(candidate).split(), words)]
+        return containing[0] if len(containing) == 1 else None
+
+    def _search(self, query: str) -> List[Tuple[str, str, str]]:
+        """Stored values sharing the most trigrams with the query, as (value, table, column)"""
+        with self._lock:
+            return self._sidecar.execute(
+                "SELECT value, table_name, column_name FROM entity WHERE entity MATCH ? ORDER BY rank LIMIT ?",
+                (query, _CANDIDATES)
+            ).fetchall()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._sidecar.execute("SELECT value FROM entity_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _load_values(self) -> Dict[Tuple[str, str], Set[str]]:
+        values: Dict[Tuple[str, str], Set[str]] = {}
+        for value, table, column in self._sidecar.execute("SELECT value, table_name, column_name FROM entity"):
+            values.setdefault((table, column), set()).add(value)
+        return values
+
+    def _read_values(self, db_manager,
+                     tables: Dict[str, List[Tuple[str, str]]]) -> Dict[Tuple[str, str], Set[str]]:
+        """Distinct values of every text column that looks like it holds names or categories"""
+        values = {}
+        for table, columns in tables.items():
+            for column, column_type in columns:
+                if not _TEXT_TYPE.search(column_type or "") or column.lower().endswith("_id"):
+                    continue
+                rows = db_manager.read_values(
+                    f'SELECT DISTINCT "{column}" FROM "{table}" '
+                    f'WHERE typeof("{column}") = \'text\' AND length("{column}") <= ? LIMIT ?',
+                    (MAX_VALUE_LENGTH, self.max_distinct + 1)
+                )
+                stored = {row[0] for row in rows if row[0].strip()}
+                if not stored or len(rows) > self.max_distinct:
+                    continue
+                # Dates and timestamps stored as text are not entities
+                if sum(1 for value in stored if _DATE_LIKE.match(value)) > len(stored) / 2:
+                    continue
+                values[(table, column)] = stored
+        return values
@@ -0,0 +1,238 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_TABLE_REFERENCE = re.compile(r"\b(?:from|join)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+STOPWORDS = {
+    "a", "all", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from",
+    "has", "have", "how", "i", "in", "is", "it", "me", "of", "on", "or", "show", "that", "the",
+    "their", "there", "to", "was", "were", "what", "which", "who", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases, splits on non-word characters, drops stopwords and strips plural endings"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """Returns the table names a query reads from (FROM/JOIN targets), lowercased"""
+    return sorted({name.lower() for name in _TABLE_REFERENCE.findall(sql)})
+
+
+class ExampleStore:
+    """
+    Library of (question, SQL) examples with an incremental BM25 index
+
+    Each example is indexed by its question tokens plus the tables its SQL reads,
+    so a question mentioning "invoices" also pulls in examples over the invoice
+    table. The index can be saved to and loaded from a JSON file so startup does
+    not re-tokenize a large library.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty store
+
+        Args:
+            k1: BM25 term-frequency saturation
+            b: BM25 document-length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.examples: List[Tuple[str, str]] = []
+        self.example_tables: List[List[str]] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._seen: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    @classmethod
+    def from_examples(cls, examples: Iterable[Tuple[str, str]]) -> "ExampleStore":
+        """Builds a store from (question, sql_query) tuples"""
+        store = cls()
+        store.add_examples(examples)
+        return store
+
+    def add_examples(self, examples: Iterable[Tuple[str, str]]) -> int:
+        """Adds several examples, returning how many were new"""
+        return sum(1 for question, sql_query in examples if self.add_example(question, sql_query))
+
+    def sync(self, examples: Iterable[Tuple[str, str]]) -> bool:
+        """
+        Makes the store hold exactly the given examples
+
+        New examples are indexed incrementally. If the store holds any example that is
+        no longer among them (edited or removed from its source), the index is rebuilt
+        from scratch, since BM25 document ids cannot simply be deleted.
+
+        Returns:
+            True if the store changed
+        """
+        wanted = list(dict.fromkeys(examples))
+        with self._lock:
+            stale = bool(self._seen - set(wanted))
+            if stale:
+                self.examples, self.example_tables, self.doc_lengths = [], [], []
+                self.postings, self._seen = {}, set()
+        return self.add_examples(wanted) > 0 or stale
+
+    def add_example(self, question: str, sql_query: str) -> bool:
+        """
+        Adds one example to the library and the index
+
+        Args:
+            question: Natural language question
+            sql_query: SQL query answering it
+
+        Returns:
+            True if the example was added, False if it was already present
+        """
+        with self._lock:
+            if (question, sql_query) in self._seen:
+                return False
+
+            doc_id = len(self.examples)
+            tables = referenced_tables(sql_query)
+            terms = Counter(tokenize(question))
+            for table in tables:
+                terms[f"table:{table}"] += 1
+
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = count
+
+            self.examples.append((question, sql_query))
+            self.example_tables.append(tables)
+            self.doc_lengths.append(sum(terms.values()))
+            self._seen.add((question, sql_query))
+            return True
+
+    def top_k(self, question: str, k: int = 5, available_tables: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Returns the k examples most relevant to a question
+
+        Args:
+            question: Natural language question
+            k: Maximum number of examples to return
+            available_tables: If given, only examples whose tables all exist are considered
+
+        Returns:
+            List of (question, sql_query) tuples, most relevant first
+        """
+        with self._lock:
+            total = len(self.examples)
+            if not total or k <= 0:
+                return []
+
+            average_length = sum(self.doc_lengths) / total
+            query_terms = tokenize(question)
+            # Question words that name a table also match examples reading that table
+            query_terms += [f"table:{term}" for term in query_terms]
+
+            scores: Dict[int, float] = {}
+            for term in set(query_terms):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if available_tables is not None:
+                available = {table.lower() for table in available_tables}
+                scores = {
+                    doc_id: score for doc_id, score in scores.items()
+                    if set(self.example_tables[doc_id]) <= available
+                }
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+            return [self.examples[doc_id] for doc_id, _ in ranked]
+
+    def save(self, path: str):
+        """Writes the examples and the precomputed index to a JSON file"""
+        with self._lock:
+            data = {
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "examples": [
+                    {"question": question, "sql": sql_query, "tables": tables}
+                    for (question, sql_query), tables in zip(self.examples, self.example_tables)
+                ],
+                "doc_lengths": self.doc_lengths,
+                "postings": {term: list(postings.items()) for term, postings in self.postings.items()},
+            }
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ExampleStore":
+        """
+        Loads a store saved with save()
+
+        Raises:
+            RuntimeError: If the file cannot be read or was written by an incompatible version
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Failed to load example index from {path}: {e}")
+
+        if data.get("version") != INDEX_VERSION:
+            raise RuntimeError(f"Example index {path} has unsupported version {data.get('version')}")
+
+        store = cls(k1=data["k1"], b=data["b"])
+        for example in data["examples"]:
+            store.examples.append((example["question"], example["sql"]))
+            store.example_tables.append(example["tables"])
+            store._seen.add((example["question"], example["sql"]))
+        store.doc_lengths = data["doc_lengths"]
+        store.postings = {term: dict(postings) for term, postings in data["postings"].items()}
+        return store
+
+
+def read_examples(path: str) -> List[Tuple[str, str]]:
+    """
+    Reads an example library from a JSONL file of {"question": ..., "sql": ...} objects
+
+    Raises:
+        RuntimeError: If a line is not valid JSON or lacks either field
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+                examples.append((item["question"], item["sql"]))
+            except (ValueError, KeyError, TypeError) as e:
+                raise RuntimeError(f"Invalid example on line {line_number} of {path}: {e}")
+    return examples
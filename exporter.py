@@ -0,0 +1,248 @@
+import base64
+import csv
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: only needed for Parquet exports
+    pyarrow = None
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+# File extensions recognized when no format is given
+_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".pq": "parquet"}
+
+# Rows fetched from the cursor and written per batch
+DEFAULT_BATCH_SIZE = 10000
+
+# Batches buffered before the Parquet schema is fixed, so columns that start out NULL get a type
+PARQUET_SCHEMA_BATCHES = 10
+
+
+@dataclass
+class ExportSummary:
+    """Outcome of an export"""
+    path: str
+    format: str
+    columns: List[str]
+    rows: int
+    bytes: int
+    seconds: float
+
+    def __str__(self) -> str:
+        rate = f", {self.rows / self.seconds:,.0f} rows/s" if self.seconds else ""
+        return (f"Exported {self.rows:,} rows x {len(self.columns)} columns to {self.path} "
+                f"({self.format}, {self.bytes / 1048576:.1f} MB, {self.seconds:.2f}s{rate})")
+
+
+def format_for_path(path: str, export_format: Optional[str] = None) -> str:
+    """
+    Picks the export format: the explicit one if given, otherwise from the file extension
+
+    Raises:
+        ValueError: If the format is unknown or cannot be derived from the path
+    """
+    if export_format is None:
+        export_format = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if export_format is None:
+            raise ValueError(f"Cannot tell the export format from {path}; use a .csv, .jsonl or .parquet file")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format} (expected one of {', '.join(EXPORT_FORMATS)})")
+    return export_format
+
+
+def _text_cell(value):
+    """CSV cell for a SQLite value (BLOBs as hex)"""
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _json_default(value):
+    """JSON encoding for SQLite values json cannot serialize (BLOBs as base64)"""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def unique_columns(columns: List[str]) -> List[str]:
+    """
+    Renames repeated column names so each is unique ("id", "id" -> "id", "id_2")
+
+    Joins such as SELECT a.*, b.* often return the same name twice; JSON objects and
+    Parquet schemas would otherwise lose or mix up those columns.
+    """
+    # Generated names skip any name the result already has, so "id", "id", "id_2" -> "id", "id_3", "id_2"
+    reserved = set(columns)
+    used = set()
+    unique = []
+    for column in columns:
+        name = column
+        suffix = 2
+        while name in used or (name != column and name in reserved):
+            name = f"{column}_{suffix}"
+            suffix += 1
+        used.add(name)
+        unique.append(name)
+    return unique
+
+
+def export_cursor(cursor: sqlite3.Cursor, path: str, export_format: Optional[str] = None,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress: Optional[Callable[[int], None]] = None) -> ExportSummary:
+    """
+    Streams every row of an executed cursor to a file
+
+    Rows are fetched and written batch_size at a time, so memory use does not grow
+    with the result. Output goes to PATH.part and is renamed to path once complete,
+    so an interrupted export never leaves a truncated file under the final name.
+
+    Args:
+        cursor: Cursor on which a query has been executed
+        path: Output file
+        export_format: "csv", "jsonl" or "parquet" (default: from the file extension)
+        batch_size: Rows per fetchmany call and write
+        progress: Called with the running row count after each batch
+
+    Returns:
+        ExportSummary
+
+    Raises:
+        ValueError: If the format is unknown
+        RuntimeError: If the query has no result set, or Parquet is requested without pyarrow
+    """
+    export_format = format_for_path(path, export_format)
+    if cursor.description is None:
+        raise RuntimeError("The query does not return rows to export")
+    if export_format == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    columns = [description[0] for description in cursor.description]
+    batches = iter(lambda: cursor.fetchmany(batch_size), [])
+    partial_path = f"{path}.part"
+    started = time.perf_counter()
+
+    try:
+        if export_format == "csv":
+            rows = _write_csv(partial_path, columns, batches, progress)
+        elif export_format == "jsonl":
+            rows = _write_jsonl(partial_path, unique_columns(columns), batches, progress)
+        else:
+            rows = _write_parquet(partial_path, unique_columns(columns), batches, progress)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return ExportSummary(
+        path=path,
+        format=export_format,
+        columns=columns,
+        rows=rows,
+        bytes=os.path.getsize(path),
+        seconds=time.perf_counter() - started
+    )
+
+
+def _write_csv(path: str, columns: List[str], batches, progress) -> int:
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows([_text_cell(cell) for cell in row] for row in batch)
+            rows += len(batch)
+            if progress:
+                progress(rows)
+    return rows
+
+
+def _write_jsonl(path: str, columns: List[str], batches, progress) -> int:
+    rows = 0
+    encoder = json.JSONEncoder(default=_json_default, ensure_ascii=False)
+    with open(path, "w", encoding="utf-8") as f:
+        for batch in batches:
+            f.write("".join(encoder.encode(dict(zip(columns, row))) + "\n" for row in batch))
+            rows += len(batch)
+            if progress:
+                progress(rows)
+    return rows
+
+
+def _write_parquet(path: str, columns: List[str], batches, progress) -> int:
+    """
+    Writes one row group per batch
+
+    SQLite columns have no fixed type, so the schema is inferred from the first
+    batches (up to PARQUET_SCHEMA_BATCHES, until every column has a non-NULL value).
+    Columns holding several types are written as strings.
+    """
+    rows = 0
+    writer = None
+    schema = None
+    pending: List[list] = []
+
+    def to_table(batch: list):
+        arrays = []
+        for index, field in enumerate(schema):
+            values = [row[index] for row in batch]
+            if pyarrow.types.is_string(field.type):
+                values = [None if value is None else _text_cell(value) if isinstance(value, bytes) else str(value)
+                          for value in values]
+            try:
+                arrays.append(pyarrow.array(values, type=field.type))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as e:
+                raise RuntimeError(f"Column {field.name} changes type mid-result ({e}); export to CSV or JSONL instead")
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def infer_schema(sample: list):
+        fields = []
+        for index, name in enumerate(columns):
+            values = [row[index] for row in sample]
+            try:
+                data_type = pyarrow.array(values).type
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                data_type = pyarrow.string()
+            if pyarrow.types.is_null(data_type):
+                data_type = pyarrow.string()
+            fields.append(pyarrow.field(name, data_type))
+        return pyarrow.schema(fields)
+
+    def flush(batch: list):
+        nonlocal rows
+        writer.write_table(to_table(batch))
+        rows += len(batch)
+        if progress:
+            progress(rows)
+
+    try:
+        for batch in batches:
+            if writer is None:
+                pending.append(batch)
+                sample = [row for buffered in pending for row in buffered]
+                all_typed = all(any(row[index] is not None for row in sample) for index in range(len(columns)))
+                if not all_typed and len(pending) < PARQUET_SCHEMA_BATCHES:
+                    continue
+                schema = infer_schema(sample)
+                writer = pyarrow.parquet.ParquetWriter(path, schema)
+                for buffered in pending:
+                    flush(buffered)
+                pending = []
+            else:
+                flush(batch)
+
+        if writer is None:
+            # Fewer rows than the schema buffer (possibly none at all)
+            schema = infer_schema([row for buffered in pending for row in buffered])
+            writer = pyarrow.parquet.ParquetWriter(path, schema)
+            for buffered in pending:
+                flush(buffered)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
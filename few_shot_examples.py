@@ -25,7 +25,7 @@ FEW_SHOT_EXAMPLES = [
     ),
     (
         "Show me all customers who have jobs with Central Glass.",
-        "SELECT DISTINCT c.* FROM customer c JOIN job j ON c.customer_id = j.customer_id JOIN company co ON j.company_id = co.company_id WHERE co.name = 'Central Glass';"
+        "SELECT DISTINCT c.* FROM customer c JOIN job j ON c.customer_id = j.customer_id JOIN company co ON j.company_id = co.company_id WHERE co.name = 'Central Glass DC';"
     ),
     (
         "What are the total expenses for each company?",
@@ -0,0 +1,404 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+from example_store import referenced_tables
+from query_guard import QueryGuard, QueryTimeoutError, estimate_table_rows, explain_plan, table_aliases
+from result_cache import ResultCache
+
+DEFAULT_WORKLOAD_LOG_PATH = ".workload.jsonl"
+
+_COMPARISON = r"(?:==|=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bGLOB\b|\bBETWEEN\b)"
+_QUALIFIED_PREDICATE = re.compile(rf"\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)\s*{_COMPARISON}", re.IGNORECASE)
+_QUALIFIED_OPERAND = re.compile(r"(?:==|=|<>|!=|<=|>=|<|>)\s*([A-Za-z_]\w*)\.([A-Za-z_]\w*)")
+_UNQUALIFIED_PREDICATE = re.compile(rf"(?<![.\w])([A-Za-z_]\w*)\s*{_COMPARISON}", re.IGNORECASE)
+# SQLite before 3.36 wrote "SCAN TABLE job AS j" where newer versions write "SCAN j"
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+_AUTOMATIC_INDEX = re.compile(r"^SEARCH (?:TABLE )?(\S+)(?: AS \S+)? USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \((\w+)")
+
+
+class WorkloadLog:
+    """
+    Append-only JSONL log of executed SQL statements and their query plans
+
+    One line per statement: {"sql", "plan", "elapsed_ms", "logged_at"}, plus "params"
+    for statements with bound parameters. The index
+    advisor reads the log back to find which tables the workload scans and on
+    which columns it filters and joins.
+    """
+
+    def __init__(self, path: str = DEFAULT_WORKLOAD_LOG_PATH):
+        """
+        Initialize the log, creating the file if needed
+
+        Args:
+            path: Path to the JSONL log file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, connection: sqlite3.Connection, sql: str, elapsed_seconds: float,
+               plan: Optional[List[str]] = None, params: Optional[dict] = None):
+        """
+        Appends one executed statement to the log
+
+        Args:
+            connection: Connection the statement ran on (used to explain it if plan is not given)
+            sql: SQL statement text
+            elapsed_seconds: Execution time including fetching
+            plan: Plan details, if already known
+            params: Bound parameters of the statement
+        """
+        if plan is None:
+            try:
+                plan = [detail for _, _, detail in explain_plan(connection, sql, params)]
+            except sqlite3.Error:
+                plan = []
+
+        entry = {
+            "sql": sql,
+            "plan": plan,
+            "elapsed_ms": round(elapsed_seconds * 1000, 3),
+            "logged_at": time.time(),
+        }
+        if params:
+            entry["params"] = params
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """Closes the log file"""
+        with self._lock:
+            self._file.close()
+
+
+def read_workload(path: str) -> List[Dict]:
+    """
+    Reads a workload log, merging repeated statements
+
+    Returns:
+        One entry per distinct (canonicalized) statement with its SQL, latest plan,
+        number of executions and total logged time in milliseconds. Statements with
+        bound parameters keep the parameters of their first execution.
+    """
+    statements: Dict[str, Dict] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+                key = ResultCache.canonicalize(item["sql"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise RuntimeError(f"Invalid workload entry on line {line_number} of {path}: {e}")
+
+            entry = statements.setdefault(key, {"sql": item["sql"], "params": item.get("params"), "plan": [],
+                                                "executions": 0, "elapsed_ms": 0.0})
+            entry["plan"] = item.get("plan", [])
+            entry["executions"] += 1
+            entry["elapsed_ms"] += item.get("elapsed_ms", 0.0)
+
+    return list(statements.values())
+
+
+@dataclass
+class IndexRecommendation:
+    """A single-column index the workload would use, with the evidence for it"""
+
+    table: str
+    column: str
+    statements: int = 0
+    executions: int = 0
+    table_rows: Optional[int] = None
+    reasons: Set[str] = field(default_factory=set)
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_{self.column}"
+
+    @property
+    def sql(self) -> str:
+        return f'CREATE INDEX IF NOT EXISTS "{self.name}" ON "{self.table}"("{self.column}")'
+
+
+@dataclass
+class StatementTiming:
+    """Best-of-N timing of one workload statement before and after indexing"""
+
+    sql: str
+    before_ms: Optional[float]
+    after_ms: Optional[float]
+
+    @property
+    def speedup(self) -> Optional[float]:
+        if not self.before_ms or not self.after_ms:
+            return None
+        return self.before_ms / self.after_ms
+
+
+@dataclass
+class RecommendationTiming:
+    """Best-of-N timings of the statements reading a recommendation's table, with only that index applied"""
+
+    recommendation: IndexRecommendation
+    timings: List[StatementTiming]
+
+    @property
+    def before_ms(self) -> Optional[float]:
+        return self._total("before_ms")
+
+    @property
+    def after_ms(self) -> Optional[float]:
+        return self._total("after_ms")
+
+    @property
+    def speedup(self) -> Optional[float]:
+        if not self.before_ms or not self.after_ms:
+            return None
+        return self.before_ms / self.after_ms
+
+    def _total(self, attribute: str) -> Optional[float]:
+        """Sum over the statements that completed both before and after"""
+        completed = [t for t in self.timings if t.before_ms is not None and t.after_ms is not None]
+        return sum(getattr(t, attribute) for t in completed) if completed else None
+
+
+@dataclass
+class IndexEvaluation:
+    """Per-recommendation timings plus per-statement timings with every recommendation applied"""
+
+    recommendations: List[RecommendationTiming]
+    combined: List[StatementTiming]
+
+
+class IndexAdvisor:
+    """
+    Recommends indexes for a recorded query workload
+
+    For every logged statement, the plan's full scans are matched with the columns
+    the SQL filters or joins on in the scanned table, and SQLite's own automatic
+    indexes (built on the fly when no index exists) are counted too. Columns that
+    already lead an index, or are the rowid, are skipped. Recommendations can be
+    applied to a writable copy of the database and timed against the workload.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the advisor
+
+        Args:
+            db_path: Path of the database the workload ran against
+        """
+        self.db_path = db_path
+
+    def recommend(self, workload: List[Dict]) -> List[IndexRecommendation]:
+        """
+        Finds the indexes that would replace the workload's scans
+
+        Args:
+            workload: Statements as returned by read_workload()
+
+        Returns:
+            Recommendations, most widely useful first
+        """
+        connection = self._connect_read_only()
+        try:
+            columns = self._table_columns(connection)
+            indexed = self._indexed_columns(connection, columns)
+            recommendations: Dict[Tuple[str, str], IndexRecommendation] = {}
+
+            for entry in workload:
+                reasons: Dict[Tuple[str, str], Set[str]] = {}
+                for table, column, reason in self._candidates(entry["sql"], entry["plan"], columns):
+                    if (table, column) not in indexed:
+                        reasons.setdefault((table, column), set()).add(reason)
+
+                for (table, column), found in reasons.items():
+                    recommendation = recommendations.get((table, column))
+                    if recommendation is None:
+                        recommendation = IndexRecommendation(
+                            table, column, table_rows=estimate_table_rows(connection, table)
+                        )
+                        recommendations[(table, column)] = recommendation
+                    recommendation.statements += 1
+                    recommendation.executions += entry["executions"]
+                    recommendation.reasons |= found
+        finally:
+            connection.close()
+
+        return sorted(
+            recommendations.values(),
+            key=lambda r: (-r.executions, -r.statements, -(r.table_rows or 0), r.table, r.column)
+        )
+
+    def evaluate(self, recommendations: List[IndexRecommendation], workload: List[Dict], copy_path: str,
+                 repeat: int = 3, timeout_seconds: float = 30.0) -> IndexEvaluation:
+        """
+        Applies recommendations to a writable copy of the database and times the workload
+
+        Each recommendation is first judged on its own: its index is created alone, the
+        statements reading its table are timed against the unindexed baseline, and the
+        index is dropped again. Finally every recommendation is created together and the
+        whole workload is timed once more; the copy keeps those indexes.
+
+        Args:
+            recommendations: Indexes to create on the copy
+            workload: Statements to time, as returned by read_workload()
+            copy_path: Where to write the copy (overwritten if it exists)
+            repeat: Runs per statement; the fastest one is reported
+            timeout_seconds: Per-run time limit; statements that exceed it have no timing
+
+        Returns:
+            IndexEvaluation with one entry per recommendation and one combined timing per
+            statement, in workload order
+        """
+        if os.path.abspath(copy_path) == os.path.abspath(self.db_path):
+            raise RuntimeError("The index copy must not overwrite the original database")
+
+        source = self._connect_read_only()
+        copy = sqlite3.connect(copy_path)
+        try:
+            source.backup(copy)
+            guard = QueryGuard(timeout_seconds=timeout_seconds, check_plans=False)
+
+            def time_all(entries: List[Dict]) -> List[Optional[float]]:
+                return [self._time_statement(copy, entry["sql"], repeat, guard, entry.get("params")) for entry in entries]
+
+            before = time_all(workload)
+
+            individual = []
+            for recommendation in recommendations:
+                affected = [index for index, entry in enumerate(workload)
+                            if recommendation.table.lower() in referenced_tables(entry["sql"])]
+                with copy:
+                    copy.execute(recommendation.sql)
+                after = time_all([workload[index] for index in affected])
+                with copy:
+                    copy.execute(f'DROP INDEX IF EXISTS "{recommendation.name}"')
+                individual.append(RecommendationTiming(recommendation, [
+                    StatementTiming(workload[index]["sql"], before[index], timing)
+                    for index, timing in zip(affected, after)
+                ]))
+
+            with copy:
+                for recommendation in recommendations:
+                    copy.execute(recommendation.sql)
+            after = time_all(workload)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to evaluate indexes on {copy_path}: {e}")
+        finally:
+            source.close()
+            copy.close()
+
+        combined = [StatementTiming(entry["sql"], b, a) for entry, b, a in zip(workload, before, after)]
+        return IndexEvaluation(individual, combined)
+
+    def _candidates(self, sql: str, plan: List[str], columns: Dict[str, List[str]]) -> Set[Tuple[str, str, str]]:
+        """Finds (table, column, reason) triples for one statement"""
+        known = {table.lower(): table for table in columns}
+        aliases = table_aliases(sql, set(known))
+        # SQL identifiers are case-insensitive: "Job.Status" is the catalog's job.status
+        column_names = {table: {column.lower(): column for column in names} for table, names in columns.items()}
+
+        def resolve(name: str) -> Optional[str]:
+            return known.get(aliases.get(name.lower(), name).lower())
+
+        def column_of(table: str, name: str) -> Optional[str]:
+            return column_names[table].get(name.lower())
+
+        candidates = set()
+        scanned = set()
+        for detail in plan:
+            automatic = _AUTOMATIC_INDEX.match(detail)
+            if automatic:
+                table = resolve(automatic.group(1))
+                column = column_of(table, automatic.group(2)) if table else None
+                if column:
+                    candidates.add((table, column, "automatic index"))
+                continue
+
+            scan = _SCAN.match(detail)
+            if scan and resolve(scan.group(1)):
+                scanned.add(resolve(scan.group(1)))
+
+        if not scanned:
+            return candidates
+
+        predicate_columns: Set[Tuple[str, str]] = set()
+        for pattern in (_QUALIFIED_PREDICATE, _QUALIFIED_OPERAND):
+            for qualifier, column in pattern.findall(sql):
+                table = resolve(qualifier)
+                if table and column_of(table, column):
+                    predicate_columns.add((table, column_of(table, column)))
+
+        # Unqualified columns only count when exactly one scanned table has them
+        for column in _UNQUALIFIED_PREDICATE.findall(sql):
+            owners = [table for table in scanned if column_of(table, column)]
+            if len(owners) == 1:
+                predicate_columns.add((owners[0], column_of(owners[0], column)))
+
+        for table, column in predicate_columns:
+            if table in scanned:
+                candidates.add((table, column, "full scan"))
+
+        return candidates
+
+    def _time_statement(self, connection: sqlite3.Connection, sql: str, repeat: int,
+                        guard: QueryGuard, params: Optional[dict] = None) -> Optional[float]:
+        """Runs a statement repeat times and returns the fastest run in milliseconds"""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                with guard.limit(connection):
+                    connection.execute(sql, params or ()).fetchall()
+            except (sqlite3.Error, QueryTimeoutError):
+                return None
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _connect_read_only(self) -> sqlite3.Connection:
+        """Opens the original database without write access"""
+        try:
+            return sqlite3.connect(f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to open database at {self.db_path}: {e}")
+
+    @staticmethod
+    def _table_columns(connection: sqlite3.Connection) -> Dict[str, List[str]]:
+        """Maps each table to its column names"""
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        return {
+            table: [row[1] for row in connection.execute(f"PRAGMA table_info(\"{table}\")")]
+            for table in tables
+        }
+
+    @staticmethod
+    def _indexed_columns(connection: sqlite3.Connection, columns: Dict[str, List[str]]) -> Set[Tuple[str, str]]:
+        """Collects (table, column) pairs that lead an existing index or alias the rowid"""
+        indexed = set()
+        for table in columns:
+            primary_key = [row for row in connection.execute(f"PRAGMA table_info(\"{table}\")") if row[5]]
+            # A lone INTEGER PRIMARY KEY column is the rowid itself
+            if len(primary_key) == 1 and (primary_key[0][2] or "").upper() == "INTEGER":
+                indexed.add((table, primary_key[0][1]))
+
+            for index in connection.execute(f"PRAGMA index_list(\"{table}\")"):
+                index_name = index[1].replace('"', '""')
+                first = connection.execute(f"PRAGMA index_info(\"{index_name}\")").fetchone()
+                if first and first[2]:
+                    indexed.add((table, first[2]))
+        return indexed
@@ -0,0 +1,268 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from example_store import referenced_tables
+from query_guard import table_aliases
+
+# column = 'literal' comparisons, optionally qualified (c.name = 'X')
+LITERAL_COMPARISON = re.compile(r"(?:\b([A-Za-z_]\w*)\.)?\b([A-Za-z_]\w*)\s*=\s*'((?:[^']|'')*)'")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+# Columns with more distinct values than this are not used as slots
+DEFAULT_MAX_SLOT_VALUES = 1000
+
+# Slot values are reloaded after this many seconds (and whenever the schema changes)
+DEFAULT_REFRESH_SECONDS = 300.0
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def comparison_table(qualifier: str, column: str, aliases: Dict[str, str], known: Dict[str, str],
+                     from_tables: List[str], tables: Dict[str, List[Tuple[str, str]]]) -> Optional[str]:
+    """
+    Finds the table a column compared in a query belongs to
+
+    Args:
+        qualifier: Alias or table name before the column ("" if unqualified)
+        column: Column name
+        aliases: {lowercase alias: table} from table_aliases()
+        known: {lowercase table name: table name}
+        from_tables: Tables the query reads, used for unqualified columns
+        tables: Catalog {table: [(column, type), ...]}
+
+    Returns:
+        The owning table, or None if it is unknown or ambiguous
+    """
+    if qualifier:
+        table = known.get(aliases.get(qualifier.lower(), qualifier).lower())
+        candidates = [table] if table else []
+    else:
+        candidates = from_tables
+    owners = [table for table in candidates if column in (name for name, _ in tables[table])]
+    return owners[0] if len(owners) == 1 else None
+
+
+def _value_variants(value: str) -> Set[str]:
+    """Spellings of a database value that may appear in a question ('in_progress' -> 'in progress')"""
+    lowered = " ".join(value.lower().split())
+    return {lowered, lowered.replace("_", " ")}
+
+
+def _quote(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@dataclass
+class IntentTemplate:
+    """A question shape with typed slots and the parameterized SQL that answers it"""
+
+    pattern: str
+    sql: str
+    slots: Dict[str, Tuple[str, str]]
+    example: str
+
+    def render_sql(self, params: Dict[str, str]) -> str:
+        """The SQL with its parameters inlined as literals (for display and answer prompts)"""
+        return re.sub(r":(\w+)\b", lambda match: _quote(params[match.group(1)])
+                      if match.group(1) in params else match.group(0), self.sql)
+
+
+@dataclass
+class IntentMatch:
+    """A question matched to a template, with the slot values to bind"""
+
+    template: IntentTemplate
+    params: Dict[str, str]
+
+    @property
+    def sql(self) -> str:
+        return self.template.sql
+
+    @property
+    def display_sql(self) -> str:
+        return self.template.render_sql(self.params)
+
+
+class IntentTemplates:
+    """
+    Answers recurring question shapes with bound-parameter SQL, without the model
+
+    Templates are derived from known (question, SQL) pairs: every string literal the
+    SQL compares a column against (c.name = 'Recon Pest Control') that also appears
+    in the question becomes a typed slot. A slot accepts any value currently stored
+    in that column, looked up from the database, so "What jobs are related to
+    Central Glass DC?" matches the template learned from the Recon Pest Control
+    example and compiles to the same SQL with a different :company parameter.
+
+    Questions must match a template in full (ignoring case, spacing and trailing
+    punctuation); anything else falls through to the model.
+    """
+
+    def __init__(self, examples: Iterable[Tuple[str, str]], max_slot_values: int = DEFAULT_MAX_SLOT_VALUES,
+                 refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        """
+        Initialize the engine (templates are built by the first refresh())
+
+        Args:
+            examples: (question, sql_query) pairs to learn templates from
+            max_slot_values: Largest number of distinct values a slot column may have
+            refresh_seconds: How long looked-up slot values are reused
+        """
+        self.examples = list(examples)
+        self.max_slot_values = max_slot_values
+        self.refresh_seconds = refresh_seconds
+        self.templates: List[IntentTemplate] = []
+        self._compiled: List[Tuple[IntentTemplate, Pattern, Dict[str, Dict[str, str]]]] = []
+        self._schema_hash: Optional[str] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def refresh(self, db_manager, force: bool = False) -> bool:
+        """
+        Rebuilds templates and slot values if the schema changed or the values expired
+
+        Must be called from the thread that owns db_manager's connection.
+
+        Args:
+            db_manager: Open SQLiteManager to read the catalog and slot values from
+            force: Rebuild even if nothing changed
+
+        Returns:
+            True if the templates were rebuilt
+        """
+        schema_hash = db_manager.get_schema_hash()
+        if (not force and schema_hash == self._schema_hash
+                and time.monotonic() - self._loaded_at < self.refresh_seconds):
+            return False
+
+        with self._lock:
+            if (not force and schema_hash == self._schema_hash
+                    and time.monotonic() - self._loaded_at < self.refresh_seconds):
+                return False
+
+            tables = db_manager.get_catalog()["tables"]
+            values: Dict[Tuple[str, str], Optional[List[str]]] = {}
+
+            def slot_values(table: str, column: str) -> Optional[List[str]]:
+                if (table, column) not in values:
+                    values[(table, column)] = self._load_values(db_manager, table, column)
+                return values[(table, column)]
+
+            templates = []
+            for question, sql_query in self.examples:
+                template = self._derive(question, sql_query, tables, slot_values)
+                if template is not None:
+                    templates.append(template)
+
+            compiled = []
+            for template in templates:
+                choices = {slot: {variant: value for value in slot_values(*source) for variant in _value_variants(value)}
+                           for slot, source in template.slots.items()}
+                compiled.append((template, self._compile(template.pattern, choices), choices))
+
+            self.templates = templates
+            self._compiled = compiled
+            self._schema_hash = schema_hash
+            self._loaded_at = time.monotonic()
+        return True
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        """
+        Matches a question against the templates
+
+        Returns:
+            The first matching template with its parameter values, or None
+        """
+        normalized = normalize_question(question)
+        for template, pattern, choices in self._compiled:
+            found = pattern.fullmatch(normalized)
+            if found:
+                params = {slot: choices[slot][found.group(slot)] for slot in template.slots}
+                return IntentMatch(template, params)
+        return None
+
+    def _derive(self, question: str, sql_query: str, tables: Dict[str, List[Tuple[str, str]]],
+                slot_values) -> Optional[IntentTemplate]:
+        """Turns one example into a template, or returns None if it has no usable slot"""
+        known = {table.lower(): table for table in tables}
+        aliases = table_aliases(sql_query, set(known))
+        from_tables = [known[name] for name in referenced_tables(sql_query) if name in known]
+
+        pattern = question.strip()
+        sql = sql_query.strip()
+        slots: Dict[str, Tuple[str, str]] = {}
+        bound: Dict[str, str] = {}
+
+        for qualifier, column, literal in LITERAL_COMPARISON.findall(sql_query):
+            value = literal.replace("''", "'")
+            table = comparison_table(qualifier, column, aliases, known, from_tables, tables)
+            if table is None:
+                continue
+
+            values = slot_values(table, column)
+            if not values or value not in values:
+                continue
+
+            if value in bound:
+                slot = bound[value]
+            else:
+                position = self._find_value(pattern, value)
+                if position is None:
+                    continue
+                slot = table if column.lower() == "name" else f"{table}_{column}"
+                while slot in slots:
+                    slot += "_2"
+                slots[slot] = (table, column)
+                bound[value] = slot
+                pattern = pattern[:position[0]] + "{" + slot + "}" + pattern[position[1]:]
+
+            sql = sql.replace(f"'{literal}'", f":{slot}")
+
+        if not slots:
+            return None
+        return IntentTemplate(pattern=pattern, sql=sql, slots=slots, example=question)
+
+    @staticmethod
+    def _find_value(question: str, value: str) -> Optional[Tuple[int, int]]:
+        """Locates a value (or its spaced variant) in a question, as a whole word"""
+        for variant in sorted(_value_variants(value), key=len, reverse=True):
+            words = r"\s+".join(re.escape(word) for word in variant.split())
+            found = re.search(rf"(?<!\w){words}(?!\w)", question, re.IGNORECASE)
+            if found:
+                return found.span()
+        return None
+
+    def _load_values(self, db_manager, table: str, column: str) -> Optional[List[str]]:
+        """Distinct text values of a column (across every shard), or None if there are too many to be a slot"""
+        rows = db_manager.read_values(
+            f'SELECT DISTINCT "{column}" FROM "{table}" WHERE typeof("{column}") = \'text\' LIMIT ?',
+            (self.max_slot_values + 1,)
+        )
+        if len(rows) > self.max_slot_values:
+            return None
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _compile(pattern: str, choices: Dict[str, Dict[str, str]]) -> Pattern:
+        """Builds the full-match regex for a template over normalized questions"""
+        parts = []
+        position = 0
+        normalized = normalize_question(pattern)
+        for placeholder in _PLACEHOLDER.finditer(normalized):
+            literal = normalized[position:placeholder.start()]
+            parts.append(r"\s+".join(re.escape(word) for word in literal.split(" ")))
+            slot = placeholder.group(1)
+            alternatives = sorted(choices[slot], key=len, reverse=True)
+            parts.append(f"(?P<{slot}>" + "|".join(re.escape(variant) for variant in alternatives) + ")")
+            position = placeholder.end()
+        parts.append(r"\s+".join(re.escape(word) for word in normalized[position:].split(" ")))
+        return re.compile("".join(parts))
@@ -6,12 +6,29 @@ AI-SQLite-Chatbot - Interactive natural language query tool for SQLite databases
 import argparse
 import sys
 import os
-from openai_client import OpenAIClient
+from openai_client import OpenAIClient, RateLimiter
 from sqlite_manager import SQLiteManager
+from shard_manager import ShardedSQLiteManager, DEFAULT_SHARD_WORKERS, expand_shard_paths
 from query_processor import QueryProcessor
+from sql_cache import SQLCache, DEFAULT_SQL_CACHE_PATH
+from result_cache import ResultCache
+from batch_runner import BatchRunner
+from server import ChatServer
 from few_shot_examples import FEW_SHOT_EXAMPLES
+from entity_index import EntityIndex
+from example_store import ExampleStore, read_examples
+from intent_templates import IntentTemplates
+from schema_linker import SchemaLinker
+from answer_renderer import AnswerRenderer, FORMAT_POLICIES
+from query_guard import QueryGuard
+from index_advisor import DEFAULT_WORKLOAD_LOG_PATH, IndexAdvisor, WorkloadLog, read_workload
+from metrics import MetricsRegistry
+from exporter import EXPORT_FORMATS
+from rollups import ROLLUP_TABLE, RollupManager
+from prompt_budget import PromptBudget
 
 DEFAULT_DB_PATH = "centralglass_recon.sqlite"
+DEFAULT_EXAMPLES_INDEX_PATH = ".examples_index.json"
 
 def print_welcome(db_path: str, strategy_info: str = ""):
     """Print welcome message"""
@@ -31,6 +48,10 @@ def print_help():
     """Print help message"""
     print("\nCommands:")
     print("  help, ?          - Show this help message")
+    print("  debug            - Toggle SQL and raw result output")
+    print("  stats            - Show stage latencies, token usage and cache counters")
+    print("  export FILE QUESTION")
+    print("                   - Save the full result of QUESTION to FILE (.csv, .jsonl or .parquet)")
     print("  exit, quit, q    - Exit the program")
     print("\nYou can ask questions like:")
     print("  - How many records are in the users table?")
@@ -39,6 +60,215 @@ def print_help():
     print()
 
 
+def print_streamed_response(chunks):
+    """Print response chunks as they arrive"""
+    started = False
+    try:
+        for chunk in chunks:
+            if not started:
+                print("\nAssistant: ", end="", flush=True)
+                started = True
+            print(chunk, end="", flush=True)
+    finally:
+        print("\n" if started else "\nAssistant:\n")
+
+
+def load_example_store(index_path: str, library_path: str = None) -> ExampleStore:
+    """Load the precomputed example index, bringing it in line with the built-in and library examples"""
+    store = ExampleStore.load(index_path) if os.path.exists(index_path) else ExampleStore()
+
+    examples = list(FEW_SHOT_EXAMPLES)
+    if library_path:
+        examples += read_examples(library_path)
+
+    # Examples edited or removed from their source are dropped, not kept alongside the new version
+    if store.sync(examples):
+        store.save(index_path)
+
+    return store
+
+
+def run_interactive(processor: QueryProcessor, show_debug: bool = True, stream: bool = True):
+    """Run the interactive question loop until the user exits"""
+    while True:
+        try:
+            question = input("You: ").strip()
+
+            if not question:
+                continue
+
+            if question.lower() in ['exit', 'quit', 'q']:
+                print("\nGoodbye!\n")
+                break
+
+            if question.lower() in ['help', '?']:
+                print_help()
+                continue
+
+            if question.lower() == 'stats':
+                print(f"\n{processor.metrics.format_summary()}\n")
+                continue
+
+            if question.lower() == 'export' or question.lower().startswith('export '):
+                parts = question.split(None, 2)
+                if len(parts) < 3:
+                    print("\nUsage: export FILE QUESTION (FILE ending in .csv, .jsonl or .parquet)\n")
+                    continue
+                print()
+                try:
+                    print(processor.export_query(parts[2], parts[1], show_debug=show_debug))
+                except Exception as e:
+                    print(f"\nError: {e}")
+                print("\n" + "-"*60 + "\n")
+                continue
+
+            if question.lower() == 'debug':
+                show_debug = not show_debug
+                print(f"\nDebug mode: {'ON' if show_debug else 'OFF'}\n")
+                continue
+
+            print()
+            try:
+                if stream:
+                    print_streamed_response(processor.process_query_stream(question, show_debug=show_debug))
+                else:
+                    response = processor.process_query(question, show_debug=show_debug)
+                    print(f"\nAssistant: {response}\n")
+                print("-"*60 + "\n")
+            except Exception as e:
+                print(f"\nError: {e}\n")
+                print("-"*60 + "\n")
+
+        except KeyboardInterrupt:
+            print("\n\nGoodbye!\n")
+            break
+        except EOFError:
+            print("\n\nGoodbye!\n")
+            break
+
+
+def run_export(processor: QueryProcessor, args) -> int:
+    """Export the full result of one question to a file, skipping answer formatting"""
+    path, question = args.export
+    try:
+        summary = processor.export_query(question, path, args.export_format, show_debug=not args.no_debug)
+    except (RuntimeError, ValueError, OSError) as e:
+        # OSError: the output file cannot be written (missing directory, disk full, ...)
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(summary)
+    return 0
+
+
+def run_batch(processor: QueryProcessor, args) -> int:
+    """Process a JSONL file of questions concurrently and write JSONL results"""
+    output_path = args.batch_output or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+    db_workers = args.db_workers or (args.workers if args.pool else 1)
+    runner = BatchRunner(processor, workers=args.workers, db_workers=db_workers)
+
+    print(f"Processing {args.batch} with {args.workers} workers...", file=sys.stderr)
+    with open(output_path, "w", encoding="utf-8") as output:
+        summary = runner.run(args.batch, output)
+
+    print(
+        f"Processed {summary['questions']} questions in {summary['elapsed_seconds']}s "
+        f"({summary['succeeded']} succeeded, {summary['failed']} failed). Results: {output_path}",
+        file=sys.stderr
+    )
+    return 0 if summary["failed"] == 0 else 1
+
+
+def run_rollups(args) -> int:
+    """Create, refresh, verify or drop the precomputed financial rollups"""
+    if not os.path.exists(args.database):
+        print(f"Error: Database not found at {args.database}", file=sys.stderr)
+        return 1
+
+    rollups = RollupManager(args.database)
+    if args.drop_rollups:
+        rollups.drop()
+        print(f"Dropped {ROLLUP_TABLE} and its triggers")
+        return 0
+
+    if args.create_rollups:
+        stats = rollups.create(triggers=not args.no_rollup_triggers)
+        maintenance = "refreshed with --refresh-rollups" if args.no_rollup_triggers else "kept current by triggers"
+        print(f"Created {ROLLUP_TABLE} with {stats['rows']} rows in {stats['seconds']}s ({maintenance})")
+    elif args.refresh_rollups:
+        stats = rollups.refresh()
+        print(f"Rebuilt {ROLLUP_TABLE}: {stats['rows']} rows in {stats['seconds']}s")
+
+    if args.verify_rollups:
+        differences = rollups.verify()
+        if differences:
+            print(f"{ROLLUP_TABLE} differs from the source tables:")
+            for difference in differences[:20]:
+                print(f"  {difference}")
+            return 1
+        print(f"{ROLLUP_TABLE} matches the source tables")
+    return 0
+
+
+def run_index_advisor(args) -> int:
+    """Recommend indexes for the logged workload, optionally timing them on a writable copy"""
+    log_path = args.workload_log or DEFAULT_WORKLOAD_LOG_PATH
+    if not os.path.exists(log_path):
+        print(f"Error: No workload log at {log_path} (record one with --workload-log)", file=sys.stderr)
+        return 1
+
+    workload = read_workload(log_path)
+    advisor = IndexAdvisor(args.database)
+    recommendations = advisor.recommend(workload)
+
+    executions = sum(entry["executions"] for entry in workload)
+    print(f"Analyzed {executions} logged executions of {len(workload)} distinct statements")
+    if not recommendations:
+        print("No index recommendations: the workload does not scan tables on unindexed columns")
+        return 0
+
+    print("\nRecommended indexes:")
+    for recommendation in recommendations:
+        rows = f"~{recommendation.table_rows:,} rows" if recommendation.table_rows is not None else "unknown size"
+        print(f"  {recommendation.sql};")
+        statements = f"{recommendation.statements} statement{'s' if recommendation.statements != 1 else ''}"
+        executions = f"{recommendation.executions} execution{'s' if recommendation.executions != 1 else ''}"
+        print(f"    -- {statements}, {executions}, {rows}, {' + '.join(sorted(recommendation.reasons))}")
+
+    if not args.apply_indexes:
+        return 0
+
+    evaluation = advisor.evaluate(recommendations, workload, args.apply_indexes)
+    print("\nEach index on its own, best-of-3 timings of the statements reading its table:")
+    print(f"  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}  index")
+    for timing in evaluation.recommendations:
+        statements = f"{len(timing.timings)} statement{'s' if len(timing.timings) != 1 else ''}"
+        print(f"  {format_timing(timing.before_ms):>10}  {format_timing(timing.after_ms):>10}  "
+              f"{format_speedup(timing.speedup):>8}  {timing.recommendation.name} ({statements})")
+
+    print(f"\nApplied to {args.apply_indexes}. Best-of-3 timings on the recorded workload with every index:")
+    print(f"  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}  statement")
+    for timing in evaluation.combined:
+        statement = " ".join(timing.sql.split())
+        print(f"  {format_timing(timing.before_ms):>10}  {format_timing(timing.after_ms):>10}  "
+              f"{format_speedup(timing.speedup):>8}  {statement[:80]}")
+
+    completed = [t for t in evaluation.combined if t.before_ms is not None and t.after_ms is not None]
+    if completed:
+        before_total = sum(t.before_ms for t in completed)
+        after_total = sum(t.after_ms for t in completed)
+        print(f"  {before_total:>10.3f}  {after_total:>10.3f}  {before_total / after_total:>7.1f}x  total")
+    return 0
+
+
+def format_timing(milliseconds) -> str:
+    """A timing in milliseconds, or 'timeout' for statements that did not finish"""
+    return f"{milliseconds:.3f}" if milliseconds is not None else "timeout"
+
+
+def format_speedup(speedup) -> str:
+    return f"{speedup:.1f}x" if speedup is not None else "-"
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Interactive natural language query tool for SQLite databases",
@@ -47,10 +277,16 @@ def main():
 Environment Variables:
   OPENAI_API_KEY        Your OpenAI API key (required)
   OPENAI_ORG_ID          Your OpenAI organization ID (optional)
+  OPENAI_BASE_URL        Override the API base URL (optional)
 
 Examples:
   %(prog)s                    # Start interactive session with default database
   %(prog)s -d mydb.db         # Start interactive session with specific database
+  %(prog)s --batch questions.jsonl --workers 8 --rps 5
+                              # Answer a file of questions concurrently
+  %(prog)s --serve --port 8080 # Serve POST /query over HTTP
+  %(prog)s --advise-indexes --apply-indexes indexed.sqlite
+                              # Recommend and time indexes for the logged workload
         """
     )
 
@@ -66,68 +302,535 @@ Examples:
         help="Hide SQL query and raw results debugging information"
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds to wait when connecting to the OpenAI API (default: 5)"
+    )
 
-    try:
-        db_manager = SQLiteManager()
-        ai_client = OpenAIClient()
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=60.0,
+        help="Seconds to wait for an OpenAI API response (default: 60)"
+    )
 
-        # Determine if we should use few-shot prompting (only for default database)
-        is_default_db = os.path.basename(args.database) == DEFAULT_DB_PATH or args.database == DEFAULT_DB_PATH
-        use_few_shot = is_default_db
-        examples = FEW_SHOT_EXAMPLES if use_few_shot else None
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="Retries for rate-limited or failed OpenAI API requests (default: 3)"
+    )
 
-        processor = QueryProcessor(db_manager, ai_client, use_few_shot=use_few_shot, examples=examples)
+    parser.add_argument(
+        "--retry-read-timeouts",
+        action="store_true",
+        help="Also retry OpenAI API requests whose response timed out or whose connection dropped "
+             "after sending (the first attempt may still be billed)"
+    )
 
-        if not db_manager.open_database(args.database):
-            print(f"Error: Failed to open database at {args.database}", file=sys.stderr)
+    parser.add_argument(
+        "--sql-cache-path",
+        default=DEFAULT_SQL_CACHE_PATH,
+        help=f"Path to the question-to-SQL cache file (default: {DEFAULT_SQL_CACHE_PATH})"
+    )
+
+    parser.add_argument(
+        "--no-sql-cache",
+        action="store_true",
+        help="Bypass the question-to-SQL cache and always call the model"
+    )
+
+    parser.add_argument(
+        "--clear-sql-cache",
+        action="store_true",
+        help="Remove all entries from the question-to-SQL cache before starting"
+    )
+
+    parser.add_argument(
+        "--no-result-cache",
+        action="store_true",
+        help="Always re-run SQL instead of reusing results while the database is unchanged"
+    )
+
+    parser.add_argument(
+        "--result-cache-size",
+        type=int,
+        default=256,
+        help="Maximum number of query results cached in memory (default: 256)"
+    )
+
+    parser.add_argument(
+        "--result-cache-path",
+        default=None,
+        help="Optional SQLite side file for an on-disk result cache tier"
+    )
+
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for the complete response instead of printing it as it is generated"
+    )
+
+    parser.add_argument(
+        "--max-rows",
+        type=int,
+        default=1000,
+        help="Maximum number of result rows kept in memory per query (default: 1000)"
+    )
+
+    parser.add_argument(
+        "--prompt-rows",
+        type=int,
+        default=100,
+        help="Results with more rows are summarized instead of sent in full to the model (default: 100)"
+    )
+
+    parser.add_argument(
+        "--batch",
+        metavar="QUESTIONS_JSONL",
+        help="Process a JSONL file of questions concurrently instead of starting an interactive session"
+    )
+
+    parser.add_argument(
+        "--export",
+        nargs=2,
+        metavar=("FILE", "QUESTION"),
+        help="Answer QUESTION by streaming its full result to FILE (.csv, .jsonl or .parquet) and exit"
+    )
+
+    parser.add_argument(
+        "--export-format",
+        choices=EXPORT_FORMATS,
+        help="Export format when FILE has another extension"
+    )
+
+    parser.add_argument(
+        "--batch-output",
+        metavar="RESULTS_JSONL",
+        help="Where to write batch results (default: <input>.results.jsonl)"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of questions processed concurrently in batch mode (default: 4)"
+    )
+
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=None,
+        help="Maximum OpenAI API requests per second across all workers (default: unlimited)"
+    )
+
+    parser.add_argument(
+        "--pool",
+        action="store_true",
+        help="Open the database read-only with one tuned connection per worker thread"
+    )
+
+    parser.add_argument(
+        "--shards",
+        nargs="+",
+        metavar="PATH_OR_GLOB",
+        default=None,
+        help="Query several databases with the same schema (e.g. 'data/company_*.sqlite') as one, "
+             "fanning each query out and recombining the results; implies --pool"
+    )
+
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=DEFAULT_SHARD_WORKERS,
+        help=f"Threads querying shards in parallel (default: {DEFAULT_SHARD_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--replicated-tables",
+        nargs="+",
+        metavar="TABLE",
+        default=[],
+        help="Tables holding the same rows in every shard (e.g. customer employee pay_period); "
+             "they are read from one shard instead of being counted once per shard"
+    )
+
+    parser.add_argument(
+        "--db-workers",
+        type=int,
+        default=None,
+        help="Threads executing SQL in batch mode (default: --workers with --pool, otherwise 1)"
+    )
+
+    parser.add_argument(
+        "--mmap-size",
+        type=int,
+        default=256 * 1024 * 1024,
+        help="PRAGMA mmap_size in bytes for pooled connections (default: 268435456)"
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=-64 * 1024,
+        help="PRAGMA cache_size for pooled connections, negative values are KiB (default: -65536)"
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run an HTTP/JSON server (POST /query) instead of an interactive session; implies --pool"
+    )
+
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interface for --serve to listen on (default: 127.0.0.1)"
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port for --serve to listen on (default: 8080)"
+    )
+
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="Questions --serve processes at the same time (default: 8)"
+    )
+
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="Distinct questions --serve admits before answering 503 (default: 64)"
+    )
+
+    parser.add_argument(
+        "--examples",
+        metavar="EXAMPLES_JSONL",
+        help="JSONL library of {\"question\", \"sql\"} examples to add to the example index; "
+             "enables few-shot prompting for any database"
+    )
+
+    parser.add_argument(
+        "--examples-index",
+        default=DEFAULT_EXAMPLES_INDEX_PATH,
+        help=f"Path to the precomputed example index (default: {DEFAULT_EXAMPLES_INDEX_PATH})"
+    )
+
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=5,
+        help="Number of most relevant examples included in each few-shot prompt (default: 5)"
+    )
+
+    parser.add_argument(
+        "--schema-linking",
+        action="store_true",
+        help="Send only the tables relevant to each question (plus join paths) instead of the full schema"
+    )
+
+    parser.add_argument(
+        "--compact-schema",
+        action="store_true",
+        help="Send the schema as one condensed line per table with PK/FK markers"
+    )
+
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        default=None,
+        help="Trim examples, schema tables and results so each prompt stays under this many tokens (default: no limit)"
+    )
+
+    parser.add_argument(
+        "--no-sql-validation",
+        action="store_true",
+        help="Run generated SQL without compiling and checking it first"
+    )
+
+    parser.add_argument(
+        "--repair-attempts",
+        type=int,
+        default=2,
+        help="Times invalid SQL is sent back to the model with the error before giving up (default: 2)"
+    )
+
+    parser.add_argument(
+        "--sql-candidates",
+        type=int,
+        default=1,
+        help="SQL candidates requested per generation call; the first valid one is used (default: 1)"
+    )
+
+    parser.add_argument(
+        "--intent-templates",
+        action="store_true",
+        help="Answer questions that match the shape of a known example (with a different company, status, ...) "
+             "using parameterized SQL instead of a model call"
+    )
+
+    parser.add_argument(
+        "--entity-index",
+        action="store_true",
+        help="Index stored names and categories so prompts include their exact spelling and misspelled "
+             "literals in generated SQL are corrected"
+    )
+
+    parser.add_argument(
+        "--entity-index-path",
+        metavar="PATH",
+        default=None,
+        help="Keep the entity index in this sidecar SQLite file so it is reused across sessions (default: in memory)"
+    )
+
+    parser.add_argument(
+        "--format-policy",
+        choices=FORMAT_POLICIES,
+        default="auto",
+        help="How answers are written: 'auto' templates small results locally and sends the rest to the model, "
+             "'llm' always uses the model, 'local' never does (default: auto)"
+    )
+
+    parser.add_argument(
+        "--local-max-rows",
+        type=int,
+        default=10,
+        help="Largest result the 'auto' format policy answers locally (default: 10)"
+    )
+
+    parser.add_argument(
+        "--query-timeout",
+        type=float,
+        default=30.0,
+        help="Interrupt SQL queries running longer than this many seconds, 0 disables (default: 30)"
+    )
+
+    parser.add_argument(
+        "--max-vm-steps",
+        type=int,
+        default=None,
+        help="Interrupt SQL queries executing more SQLite VM instructions than this (default: no limit)"
+    )
+
+    parser.add_argument(
+        "--max-scan-rows",
+        type=int,
+        default=5000000,
+        help="Reject queries that fully scan a table larger than this (default: 5000000)"
+    )
+
+    parser.add_argument(
+        "--max-join-rows",
+        type=int,
+        default=10000000,
+        help="Reject queries whose nested loops visit more row combinations than this (default: 10000000)"
+    )
+
+    parser.add_argument(
+        "--no-plan-check",
+        action="store_true",
+        help="Skip the EXPLAIN QUERY PLAN cost check before running generated SQL"
+    )
+
+    parser.add_argument(
+        "--workload-log",
+        nargs="?",
+        const=DEFAULT_WORKLOAD_LOG_PATH,
+        default=None,
+        metavar="PATH",
+        help=f"Log every executed query and its plan for the index advisor (default path: {DEFAULT_WORKLOAD_LOG_PATH})"
+    )
+
+    parser.add_argument(
+        "--advise-indexes",
+        action="store_true",
+        help="Print index recommendations for the logged workload and exit"
+    )
+
+    parser.add_argument(
+        "--apply-indexes",
+        metavar="COPY_PATH",
+        help="With --advise-indexes, create the indexes on a writable copy of the database and time the workload"
+    )
+
+    parser.add_argument(
+        "--create-rollups",
+        action="store_true",
+        help=f"Create and fill {ROLLUP_TABLE} (monthly revenue, expenses, payroll and profit per company) and exit"
+    )
+
+    parser.add_argument(
+        "--no-rollup-triggers",
+        action="store_true",
+        help="With --create-rollups, skip the triggers that keep the rollups current (refresh them manually)"
+    )
+
+    parser.add_argument(
+        "--refresh-rollups",
+        action="store_true",
+        help="Rebuild the rollups from the source tables and exit"
+    )
+
+    parser.add_argument(
+        "--verify-rollups",
+        action="store_true",
+        help="Check the rollups against a fresh aggregation of the source tables and exit"
+    )
+
+    parser.add_argument(
+        "--drop-rollups",
+        action="store_true",
+        help="Remove the rollup table and its triggers and exit"
+    )
+
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        help="Append a snapshot of all metrics to this JSONL file on exit"
+    )
+
+    args = parser.parse_args()
+
+    if args.create_rollups or args.refresh_rollups or args.verify_rollups or args.drop_rollups:
+        try:
+            return run_rollups(args)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
             return 1
 
-        # Show which prompting strategy is being used
-        strategy_info = "Using few-shot prompting" if use_few_shot else "Using zero-shot prompting"
-        print_welcome(args.database, strategy_info)
+    if args.advise_indexes or args.apply_indexes:
+        try:
+            return run_index_advisor(args)
+        except (OSError, RuntimeError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
 
-        # Track debug mode (can be toggled)
-        show_debug = not args.no_debug
+    try:
+        result_cache = None
+        if not args.no_result_cache:
+            result_cache = ResultCache(max_entries=args.result_cache_size, disk_path=args.result_cache_path)
 
-        while True:
-            try:
-                question = input("You: ").strip()
+        query_guard = QueryGuard(
+            max_scan_rows=args.max_scan_rows,
+            max_join_rows=args.max_join_rows,
+            timeout_seconds=args.query_timeout or None,
+            max_vm_steps=args.max_vm_steps,
+            check_plans=not args.no_plan_check
+        )
+        metrics = MetricsRegistry()
+        workload_log = WorkloadLog(args.workload_log) if args.workload_log else None
+        manager_options = dict(
+            result_cache=result_cache,
+            max_rows=args.max_rows,
+            prompt_rows=args.prompt_rows,
+            mmap_size=args.mmap_size,
+            cache_size=args.cache_size,
+            query_guard=query_guard,
+            workload_log=workload_log,
+            metrics=metrics
+        )
+        shard_paths = expand_shard_paths(args.shards) if args.shards else None
+        if shard_paths:
+            db_manager = ShardedSQLiteManager(workers=args.shard_workers, replicated_tables=args.replicated_tables,
+                                              **manager_options)
+        else:
+            db_manager = SQLiteManager(pooled=args.pool or args.serve, **manager_options)
+        ai_client = OpenAIClient(
+            pool_size=max(10, args.workers, args.max_concurrency),
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            max_retries=args.max_retries,
+            retry_read_timeouts=args.retry_read_timeouts,
+            rate_limiter=RateLimiter(args.rps) if args.rps else None,
+            metrics=metrics
+        )
 
-                if not question:
-                    continue
+        # Determine if we should use few-shot prompting (default database, or any database
+        # for which an example library was supplied)
+        is_default_db = os.path.basename(args.database) == DEFAULT_DB_PATH or args.database == DEFAULT_DB_PATH
+        use_few_shot = is_default_db or bool(args.examples)
+        examples = FEW_SHOT_EXAMPLES if use_few_shot else None
+        example_store = load_example_store(args.examples_index, args.examples) if use_few_shot else None
 
-                if question.lower() in ['exit', 'quit', 'q']:
-                    print("\nGoodbye!\n")
-                    break
+        intent_templates = None
+        if args.intent_templates:
+            intent_templates = IntentTemplates(example_store.examples if example_store is not None else examples or [])
 
-                if question.lower() in ['help', '?']:
-                    print_help()
-                    continue
+        entity_index = None
+        if args.entity_index or args.entity_index_path:
+            entity_index = EntityIndex(args.entity_index_path or ":memory:")
 
-                if question.lower() == 'debug':
-                    show_debug = not show_debug
-                    print(f"\nDebug mode: {'ON' if show_debug else 'OFF'}\n")
-                    continue
+        sql_cache = None
+        if args.clear_sql_cache or not args.no_sql_cache:
+            sql_cache = SQLCache(args.sql_cache_path)
+            if args.clear_sql_cache:
+                sql_cache.clear()
+                print("Cleared question-to-SQL cache")
+            if args.no_sql_cache:
+                sql_cache.close()
+                sql_cache = None
 
-                print()
-                try:
-                    response = processor.process_query(question, show_debug=show_debug)
-                    print(f"\nAssistant: {response}\n")
-                    print("-"*60 + "\n")
-                except Exception as e:
-                    print(f"\nError: {e}\n")
-                    print("-"*60 + "\n")
+        processor = QueryProcessor(db_manager, ai_client, use_few_shot=use_few_shot, examples=examples,
+                                   sql_cache=sql_cache, example_store=example_store, top_k=args.top_k,
+                                   schema_linker=SchemaLinker() if args.schema_linking else None,
+                                   answer_renderer=AnswerRenderer(args.format_policy, max_rows=args.local_max_rows),
+                                   metrics=metrics, compact_schema=args.compact_schema,
+                                   prompt_budget=PromptBudget(args.max_prompt_tokens) if args.max_prompt_tokens else None,
+                                   validate_sql=not args.no_sql_validation, repair_attempts=args.repair_attempts,
+                                   sql_candidates=args.sql_candidates, intent_templates=intent_templates,
+                                   entity_index=entity_index)
 
+        if shard_paths:
+            if not db_manager.open_shards(shard_paths):
+                print(f"Error: Failed to open shards {', '.join(shard_paths)}", file=sys.stderr)
+                return 1
+        elif not db_manager.open_database(args.database):
+            print(f"Error: Failed to open database at {args.database}", file=sys.stderr)
+            return 1
+
+        if args.export:
+            exit_code = run_export(processor, args)
+        elif args.batch:
+            exit_code = run_batch(processor, args)
+        elif args.serve:
+            server = ChatServer(processor, host=args.host, port=args.port,
+                                max_concurrency=args.max_concurrency, max_pending=args.max_pending)
+            try:
+                server.serve_forever()
             except KeyboardInterrupt:
-                print("\n\nGoodbye!\n")
-                break
-            except EOFError:
-                print("\n\nGoodbye!\n")
-                break
+                print("\nServer stopped", file=sys.stderr)
+            exit_code = 0
+        else:
+            # Show which prompting strategy is being used
+            strategy_info = "Using zero-shot prompting"
+            if example_store is not None:
+                strategy_info = f"Using few-shot prompting (top {args.top_k} of {len(example_store)} examples)"
+            database = f"{len(shard_paths)} shards ({shard_paths[0]}, ...)" if shard_paths else args.database
+            print_welcome(database, strategy_info)
+
+            run_interactive(processor, show_debug=not args.no_debug, stream=not args.no_stream)
+            exit_code = 0
 
         db_manager.close_database()
-        return 0
+        if sql_cache:
+            sql_cache.close()
+        if result_cache:
+            result_cache.close()
+        if workload_log:
+            workload_log.close()
+        if entity_index:
+            entity_index.close()
+        if args.metrics_jsonl:
+            metrics.export_jsonl(args.metrics_jsonl)
+        return exit_code
 
     except KeyboardInterrupt:
         print("\n\nInterrupted by user", file=sys.stderr)
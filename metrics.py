@@ -0,0 +1,255 @@
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) for latency histograms: 1ms .. 60s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Upper bounds for row-count histograms
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# HELP text for the metrics recorded by the chatbot
+METRIC_DESCRIPTIONS = {
+    "stage_seconds": "Time spent in each pipeline stage (schema, generate_sql, execute_sql, format_response, export)",
+    "result_rows": "Rows returned by executed queries",
+    "exported_rows_total": "Rows written by result exports, by format",
+    "query_errors_total": "Queries that failed, rejected by the guard or timed out",
+    "answers_total": "Answers produced, by formatter (local template or LLM)",
+    "sql_validation_total": "Generated SQL validation outcomes (valid, repaired or invalid after all attempts)",
+    "sql_repairs_total": "Repair prompts sent after generated SQL failed validation",
+    "sql_cache_requests_total": "Question-to-SQL cache lookups by result",
+    "entity_hints_total": "Stored values added to SQL prompts by the entity index",
+    "entity_rewrites_total": "Literals in generated SQL replaced with the closest stored value",
+    "shard_queries_total": "Queries run on shards, by merge plan (single_shard, aggregate or concatenate)",
+    "intent_template_requests_total": "Intent template lookups by result (a hit skips SQL generation)",
+    "result_cache_requests_total": "Query result cache lookups by result",
+    "openai_request_seconds": "Latency of each OpenAI API request attempt (time to headers when streaming)",
+    "openai_requests_total": "OpenAI API request attempts by HTTP status",
+    "openai_retries_total": "OpenAI API retries by reason",
+    "openai_tokens_total": "Tokens reported in OpenAI API usage, by model and kind",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    """Normalizes keyword labels into a hashable, sorted tuple"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    """Renders labels in Prometheus syntax: {a="1",b="2"}"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    """Formats a bucket bound or sample value the way Prometheus expects"""
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count, sum, min and max"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        """Records one sample"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates a quantile by linear interpolation within its bucket
+
+        The estimate is clamped to the observed min/max, so it is exact when all
+        samples in the bucket are equal and never outside the seen range.
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else self.min
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {_format_number(bound): count for bound, count in
+                        zip(list(self.buckets) + [math.inf], self._cumulative())},
+        }
+
+    def _cumulative(self) -> List[int]:
+        """Bucket counts as Prometheus reports them (each includes all smaller buckets)"""
+        totals, running = [], 0
+        for bucket_count in self.counts:
+            running += bucket_count
+            totals.append(running)
+        return totals
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters and histograms
+
+    Series are identified by a metric name plus keyword labels, e.g.
+    observe("stage_seconds", 0.12, stage="execute_sql"). Everything is thread-safe,
+    so the batch runner and the HTTP server can share one registry. Snapshots can
+    be exported as JSONL or in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = dict(METRIC_DESCRIPTIONS)
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        """Sets the HELP text exported for a metric"""
+        with self._lock:
+            self._help[name] = help_text
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Adds to a counter"""
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels):
+        """Records a sample in a histogram (buckets apply when the series is first created)"""
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observes the wall-clock duration of the block in seconds, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Returns a counter's current value (0 if it was never incremented)"""
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def reset(self):
+        """Drops every recorded value"""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self) -> List[dict]:
+        """Returns every series as a JSON-serializable dict"""
+        with self._lock:
+            series = [
+                {"name": name, "type": "counter", "labels": dict(labels), "value": value}
+                for name, values in sorted(self._counters.items())
+                for labels, value in sorted(values.items())
+            ]
+            series += [
+                dict({"name": name, "type": "histogram", "labels": dict(labels)}, **histogram.to_dict())
+                for name, values in sorted(self._histograms.items())
+                for labels, histogram in sorted(values.items())
+            ]
+        return series
+
+    def export_jsonl(self, path: str):
+        """Appends the current snapshot to a JSONL file, one series per line"""
+        timestamp = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for series in self.snapshot():
+                f.write(json.dumps(dict({"timestamp": timestamp}, **series)) + "\n")
+
+    def to_prometheus(self) -> str:
+        """Renders all series in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, values in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(values.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+
+            for name, values in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(values.items()):
+                    bounds = list(histogram.buckets) + [math.inf]
+                    for bound, count in zip(bounds, histogram._cumulative()):
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_number(bound)))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {repr(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self) -> str:
+        """Human-readable table of histograms (count, mean, p50, p95, max) and counters"""
+        snapshot = self.snapshot()
+        histograms = [series for series in snapshot if series["type"] == "histogram"]
+        counters = [series for series in snapshot if series["type"] == "counter"]
+
+        def series_name(series: dict) -> str:
+            labels = ",".join(f"{key}={value}" for key, value in series["labels"].items())
+            return f"{series['name']}{{{labels}}}" if labels else series["name"]
+
+        if not snapshot:
+            return "No metrics recorded yet."
+
+        lines = []
+        if histograms:
+            width = max(len(series_name(series)) for series in histograms)
+            lines.append(f"{'histogram':<{width}}  {'count':>7}  {'mean':>10}  {'p50':>10}  {'p95':>10}  {'max':>10}")
+            for series in histograms:
+                mean = series["sum"] / series["count"]
+                lines.append(
+                    f"{series_name(series):<{width}}  {series['count']:>7}  {mean:>10.4f}  "
+                    f"{series['p50']:>10.4f}  {series['p95']:>10.4f}  {series['max']:>10.4f}"
+                )
+        if counters:
+            if lines:
+                lines.append("")
+            width = max(len(series_name(series)) for series in counters)
+            lines.append(f"{'counter':<{width}}  {'value':>10}")
+            for series in counters:
+                lines.append(f"{series_name(series):<{width}}  {_format_number(series['value']):>10}")
+        return "\n".join(lines)
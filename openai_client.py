@@ -1,18 +1,121 @@
+import json
 import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Iterator, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+
+from metrics import MetricsRegistry
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# Status codes worth retrying: rate limiting and transient server-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class OpenAIError(RuntimeError):
+    """Raised when the OpenAI API cannot be reached or its response cannot be used"""
+
+
+def _never_sent(error: requests.exceptions.RequestException) -> bool:
+    """
+    Checks whether a request failed while its connection was being established
+
+    Only then is it certain that the server never saw the request. requests also raises
+    ConnectionError for a connection aborted after the body was sent, which may have been
+    processed (and billed) already.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+
+    # NewConnectionError (refused, unreachable, DNS failure) is a ConnectTimeoutError subclass
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class RateLimiter:
+    """Thread-safe token bucket that caps the request rate shared by all callers"""
+
+    def __init__(self, requests_per_second: float, burst: Optional[int] = None):
+        """
+        Initialize the rate limiter
+
+        Args:
+            requests_per_second: Sustained request rate
+            burst: Maximum number of requests allowed back to back (default: max(1, rate))
+        """
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+
+        self.rate = requests_per_second
+        self.capacity = float(burst if burst is not None else max(1, int(requests_per_second)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
 
 
 class OpenAIClient:
     """Client for interacting with OpenAI API"""
 
-    def __init__(self):
-        """Initialize OpenAI client and load credentials from environment or .env file"""
+    def __init__(self, base_url: Optional[str] = None, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 rate_limiter: Optional[RateLimiter] = None, metrics: Optional[MetricsRegistry] = None,
+                 retry_read_timeouts: bool = False):
+        """
+        Initialize OpenAI client and load credentials from environment or .env file
+
+        Args:
+            base_url: API base URL (default: OPENAI_BASE_URL env var or the public OpenAI endpoint)
+            pool_size: Maximum number of keep-alive connections held by the HTTP session
+            connect_timeout: Seconds to wait for a TCP/TLS connection to be established
+            read_timeout: Seconds to wait for the server to send response data
+            max_retries: Number of retries for rate-limited, 5xx or connection failures
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound in seconds for a single backoff delay
+            rate_limiter: Optional RateLimiter applied to every request attempt, including retries
+            metrics: Registry receiving request latency, retry and token usage metrics
+            retry_read_timeouts: Also retry requests whose response timed out or whose connection was
+                aborted after sending; off by default because the server may still be processing
+                (and billing) the first attempt
+        """
         load_dotenv()
 
-        self.base_url = "https://api.openai.com/v1"
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
         self.api_key = None
         self.org_id = None
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.retry_read_timeouts = retry_read_timeouts
+        self.metrics = metrics or MetricsRegistry()
 
         if not self._load_credentials():
             raise RuntimeError(
@@ -20,6 +123,8 @@ class OpenAIClient:
                 "Please set OPENAI_API_KEY environment variable or create a .env file."
             )
 
+        self.session = self._create_session(pool_size)
+
     def _load_credentials(self) -> bool:
         """Load API key and organization ID from environment variables or .env file"""
         self.api_key = os.getenv("OPENAI_API_KEY")
@@ -30,24 +135,120 @@ class OpenAIClient:
 
         return True
 
-    def _make_request(self, endpoint: str, payload: dict) -> dict:
-        """Make HTTP POST request to OpenAI API"""
-        url = f"{self.base_url}{endpoint}"
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """Creates a keep-alive HTTP session so requests reuse pooled TCP/TLS connections"""
+        session = requests.Session()
+
+        # Retries are handled in _make_request so that Retry-After and jitter are honored
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
 
-        headers = {
+        session.headers.update({
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
-        }
+        })
 
         if self.org_id:
-            headers["OpenAI-Organization"] = self.org_id
+            session.headers["OpenAI-Organization"] = self.org_id
+
+        return session
+
+    def close(self):
+        """Closes the HTTP session and its pooled connections"""
+        self.session.close()
+
+    def _make_request(self, endpoint: str, payload: dict) -> dict:
+        """Make HTTP POST request to OpenAI API and return the decoded JSON body"""
+        response = self._post(endpoint, payload)
 
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"OpenAI API request failed: {e}")
+        except ValueError as e:
+            raise OpenAIError(f"Failed to parse OpenAI response: {e}")
+
+    def _post(self, endpoint: str, payload: dict, stream: bool = False) -> requests.Response:
+        """
+        Make HTTP POST request to OpenAI API, retrying transient failures with backoff
+
+        Retries only happen before a successful response is returned, so a streamed
+        body is never replayed once the caller has started consuming it.
+        """
+        url = f"{self.base_url}{endpoint}"
+
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # A connection that was never established is safe to retry; a timed out or aborted
+                # response may belong to a request the server is still processing
+                if _never_sent(e):
+                    failure, safe = "connection_error", True
+                elif isinstance(e, requests.exceptions.Timeout):
+                    failure, safe = "read_timeout", False
+                else:
+                    failure, safe = "connection_aborted", False
+                self.metrics.increment("openai_requests_total", status=failure)
+                if attempt >= self.max_retries or (not safe and not self.retry_read_timeouts):
+                    raise OpenAIError(f"OpenAI API request failed: {e}")
+                self.metrics.increment("openai_retries_total", reason=failure)
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+            except requests.exceptions.RequestException as e:
+                raise OpenAIError(f"OpenAI API request failed: {e}")
+
+            # For streamed requests this is the time to the response headers, not to the last token
+            self.metrics.observe("openai_request_seconds", time.perf_counter() - started)
+            self.metrics.increment("openai_requests_total", status=response.status_code)
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                self.metrics.increment("openai_retries_total", reason=response.status_code)
+                retry_after = self._parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                time.sleep(retry_after if retry_after is not None else self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+                return response
+            except requests.exceptions.RequestException as e:
+                response.close()
+                raise OpenAIError(f"OpenAI API request failed: {e}")
+
+    def _record_usage(self, usage: Optional[dict], model: str):
+        """Adds a response's token usage to the metrics registry"""
+        if not isinstance(usage, dict):
+            return
+
+        for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if isinstance(usage.get(kind), int):
+                self.metrics.increment("openai_tokens_total", usage[kind], model=model, kind=kind[:-len("_tokens")])
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter for the given (zero-based) retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _parse_retry_after(self, value: Optional[str]) -> Optional[float]:
+        """Parses a Retry-After header given either as seconds or as an HTTP date"""
+        if not value:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+
+        return min(max(delay, 0.0), self.backoff_max)
 
     def send_prompt(self, prompt: str, model: str = "gpt-4.1", temperature: float = 0.3) -> str:
         """
@@ -61,24 +262,126 @@ class OpenAIClient:
         Returns:
             The response text from OpenAI
         """
+        return self.send_messages([{"role": "user", "content": prompt}], model, temperature)
+
+    def send_messages(self, messages: List[dict], model: str = "gpt-4.1", temperature: float = 0.3) -> str:
+        """
+        Sends a chat conversation to OpenAI API and returns the response
+
+        Args:
+            messages: Chat messages ({"role": ..., "content": ...})
+            model: The model to use (default: gpt-4.1)
+            temperature: Temperature for response randomness
+
+        Returns:
+            The response text from OpenAI
+        """
+        return self.complete_messages(messages, model, temperature)[0]
+
+    def complete_messages(self, messages: List[dict], model: str = "gpt-4.1", temperature: float = 0.3,
+                          n: int = 1) -> List[str]:
+        """
+        Sends a chat conversation and returns n alternative responses from a single request
+
+        Args:
+            messages: Chat messages ({"role": ..., "content": ...})
+            model: The model to use (default: gpt-4.1)
+            temperature: Temperature for response randomness
+            n: Number of completions to generate
+
+        Returns:
+            The response texts, in choice order
+        """
         payload = {
             "model": model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
+            "messages": messages,
             "temperature": temperature
         }
+        if n > 1:
+            payload["n"] = n
 
         response = self._make_request("/chat/completions", payload)
+        self._record_usage(response.get("usage"), model)
 
         # Extract message content from response
         try:
-            content = response["choices"][0]["message"]["content"]
-            return content.strip()
-        except (KeyError, IndexError) as e:
-            raise RuntimeError(f"Failed to parse OpenAI response: {e}")
+            choices = sorted(response["choices"], key=lambda choice: choice.get("index", 0))
+            contents = [choice["message"]["content"].strip() for choice in choices]
+            if not contents:
+                raise IndexError("no choices returned")
+            return contents
+        except (KeyError, IndexError, AttributeError) as e:
+            raise OpenAIError(f"Failed to parse OpenAI response: {e}")
+
+    def stream_prompt(self, prompt: str, model: str = "gpt-4.1", temperature: float = 0.3) -> Iterator[str]:
+        """
+        Sends a prompt to OpenAI API and yields response text as it is generated
 
-    def convert_to_sql(self, question: str, schema: str, use_few_shot: bool = False, examples: list = None) -> str:
+        Args:
+            prompt: The prompt to send
+            model: The model to use (default: gpt-4.1)
+            temperature: Temperature for response randomness
+
+        Yields:
+            Chunks of response text in arrival order
+        """
+        return self.stream_messages([{"role": "user", "content": prompt}], model, temperature)
+
+    def stream_messages(self, messages: List[dict], model: str = "gpt-4.1",
+                        temperature: float = 0.3) -> Iterator[str]:
+        """
+        Sends a chat conversation to OpenAI API and yields response text as it is generated
+
+        Args:
+            messages: Chat messages ({"role": ..., "content": ...})
+            model: The model to use (default: gpt-4.1)
+            temperature: Temperature for response randomness
+
+        Yields:
+            Chunks of response text in arrival order
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+            # Ask for a final chunk carrying token usage (it has an empty choices list)
+            "stream_options": {"include_usage": True}
+        }
+
+        response = self._post("/chat/completions", payload, stream=True)
+
+        try:
+            for raw_line in response.iter_lines():
+                # Server-sent events: payload lines start with "data:", blank lines separate events
+                line = raw_line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                try:
+                    chunk = json.loads(data)
+                    if chunk.get("usage"):
+                        self._record_usage(chunk["usage"], model)
+                    if not chunk.get("choices"):
+                        continue
+                    delta = chunk["choices"][0].get("delta") or {}
+                except (ValueError, KeyError, IndexError, AttributeError) as e:
+                    raise OpenAIError(f"Failed to parse OpenAI stream event: {e}")
+
+                content = delta.get("content")
+                if content:
+                    yield content
+        except requests.exceptions.RequestException as e:
+            raise OpenAIError(f"OpenAI API stream failed: {e}")
+        finally:
+            response.close()
+
+    def convert_to_sql(self, question: str, schema: str, use_few_shot: bool = False, examples: list = None,
+                       values: Optional[List[str]] = None) -> str:
         """
         Converts natural language question to SQL query using either zero-shot or few-shot prompting
 
@@ -87,55 +390,123 @@ class OpenAIClient:
             schema: Schema information about the database
             use_few_shot: Whether to use few-shot prompting (default: False for zero-shot)
             examples: List of (question, sql_query) tuples for few-shot examples
+            values: Optional stored values the question refers to, e.g. "company.name = 'X'"
 
         Returns:
             SQL query string
         """
-        if use_few_shot and examples:
+        messages = self.build_sql_messages(question, schema, examples if use_few_shot else None, values)
+        return self.clean_sql(self.send_messages(messages))
+
+    def generate_sql_candidates(self, messages: List[dict], n: int = 1) -> List[str]:
+        """
+        Requests n SQL candidates for a SQL generation conversation in one API call
+
+        Args:
+            messages: Conversation from build_sql_messages() (or build_repair_messages())
+            n: Number of candidates
+
+        Returns:
+            Candidate SQL strings with markdown removed, duplicates dropped
+        """
+        candidates = []
+        for content in self.complete_messages(messages, n=n):
+            sql_query = self.clean_sql(content)
+            if sql_query not in candidates:
+                candidates.append(sql_query)
+        return candidates
+
+    @staticmethod
+    def clean_sql(sql_query: str) -> str:
+        """Cleans up a SQL response (removes markdown code blocks if present)"""
+        sql_query = sql_query.strip()
+
+        # Remove markdown code blocks
+        if sql_query.startswith("```sql"):
+            sql_query = sql_query[6:]
+        elif sql_query.startswith("```"):
+            sql_query = sql_query[3:]
+
+        if sql_query.endswith("```"):
+            sql_query = sql_query[:-3]
+
+        return sql_query.strip()
+
+    def build_sql_messages(self, question: str, schema: str, examples: Optional[list] = None,
+                           values: Optional[List[str]] = None) -> List[dict]:
+        """
+        Builds the SQL generation conversation
+
+        Everything that is the same from one question to the next (instructions and
+        schema) goes first, in the system message, so providers that cache prompt
+        prefixes can reuse it. Per-question content (examples and the question) follows.
+
+        Args:
+            question: Natural language question about the database
+            schema: Schema information about the database
+            examples: Optional list of (question, sql_query) tuples for few-shot prompting
+            values: Optional stored values the question refers to, e.g. "company.name = 'X'"
+
+        Returns:
+            Chat messages
+        """
+        system = f"""You are a SQL expert. Convert natural language questions into SQLite SQL queries.
+Return ONLY the SQL query, nothing else. Do not include explanations or markdown formatting.
+
+Given the following database schema:
+
+{schema}"""
+
+        if examples:
             # Few-shot prompting: include example question-SQL pairs
             examples_text = "\n\n".join([
                 f"Question: {ex_question}\nSQL: {ex_sql}"
                 for ex_question, ex_sql in examples
             ])
-
-            prompt = f"""You are a SQL expert. Given the following database schema:
-
-{schema}
-
-Here are some example questions and their corresponding SQL queries for this database:
+            user = f"""Here are some example questions and their corresponding SQL queries for this database:
 
 {examples_text}
 
 Now convert the following natural language question into a SQLite SQL query:
 {question}
-
-Return ONLY the SQL query, nothing else. Do not include explanations or markdown formatting."""
+"""
         else:
             # Zero-shot prompting: no examples, just schema and question
-            prompt = f"""You are a SQL expert. Given the following database schema:
+            user = f"""Convert the following natural language question into a SQLite SQL query:
+{question}
+"""
 
-{schema}
+        if values:
+            # Exact spellings of the names and categories the question mentions
+            values_text = "\n".join(f"- {value}" for value in values)
+            user = f"""Values stored in the database that the question refers to (use these exact literals):
+{values_text}
 
-Convert the following natural language question into a SQLite SQL query:
-{question}
+{user}"""
 
-Return ONLY the SQL query, nothing else. Do not include explanations or markdown formatting."""
+        return [{"role": "system", "content": system}, {"role": "user", "content": user}]
 
-        sql_query = self.send_prompt(prompt)
+    def build_repair_messages(self, messages: List[dict], sql_query: str, error: str) -> List[dict]:
+        """
+        Extends a SQL generation conversation with a rejected query and the reason
 
-        # Clean up the SQL query (remove markdown code blocks if present)
-        sql_query = sql_query.strip()
+        The original messages are kept unchanged so the cached prompt prefix still applies.
 
-        # Remove markdown code blocks
-        if sql_query.startswith("```sql"):
-            sql_query = sql_query[6:]
-        elif sql_query.startswith("```"):
-            sql_query = sql_query[3:]
+        Args:
+            messages: The conversation that produced sql_query
+            sql_query: The SQL that failed validation
+            error: Why it failed (SQLite's error message plus any hints)
 
-        if sql_query.endswith("```"):
-            sql_query = sql_query[:-3]
+        Returns:
+            Chat messages asking for a corrected query
+        """
+        return list(messages) + [
+            {"role": "assistant", "content": sql_query},
+            {"role": "user", "content": f"""That query is not valid for this database:
+{error}
 
-        return sql_query.strip()
+Return ONLY the corrected SQLite SQL query, nothing else."""},
+        ]
 
     def format_response(self, question: str, sql_query: str, results: str) -> str:
         """
@@ -149,16 +520,36 @@ Return ONLY the SQL query, nothing else. Do not include explanations or markdown
         Returns:
             Natural language response
         """
-        prompt = f"""A user asked: "{question}"
+        return self.send_messages(self.build_format_messages(question, sql_query, results))
 
-The following SQL query was executed:
-{sql_query}
+    def format_response_stream(self, question: str, sql_query: str, results: str) -> Iterator[str]:
+        """
+        Streams the natural language response for SQL query results
 
-The EXACT results from the database are:
-{results}
+        Args:
+            question: Original natural language question
+            sql_query: The SQL query that was executed
+            results: The query results in a formatted string
 
-IMPORTANT: You must ONLY use the numbers and data shown in the results above. Do NOT make up, estimate, or calculate any numbers that are not explicitly shown in the results. If the results show specific values, use those exact values. If you need to calculate something, show the calculation using only the numbers from the results.
+        Yields:
+            Chunks of the natural language response as they arrive
+        """
+        return self.stream_messages(self.build_format_messages(question, sql_query, results))
+
+    def build_format_messages(self, question: str, sql_query: str, results: str) -> List[dict]:
+        """Builds the conversation that turns query results into a natural language answer (static instructions first)"""
+        system = """You answer questions about a database using the results of a SQL query.
+
+IMPORTANT: You must ONLY use the numbers and data shown in the results. Do NOT make up, estimate, or calculate any numbers that are not explicitly shown in the results. If the results show specific values, use those exact values. If you need to calculate something, show the calculation using only the numbers from the results.
 
 Provide a clear, natural language answer to the user's question based EXCLUSIVELY on these results."""
 
-        return self.send_prompt(prompt)
+        user = f"""A user asked: "{question}"
+
+The following SQL query was executed:
+{sql_query}
+
+The EXACT results from the database are:
+{results}"""
+
+        return [{"role": "system", "content": system}, {"role": "user", "content": user}]
@@ -0,0 +1,258 @@
+import math
+import re
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+from query_result import QueryResult
+from sqlite_manager import BUSINESS_TERMS
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts fall back to a character estimate
+    tiktoken = None
+
+# Rough characters per token for English text and SQL, used without tiktoken
+CHARS_PER_TOKEN = 4
+
+# Chat formatting overhead, as documented for OpenAI chat models
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+FALLBACK_ENCODING = "o200k_base"
+
+TRUNCATION_NOTE = "\n[... truncated to fit the prompt token budget]"
+
+# Tokenizers are loaded once per model; loading one can take a while
+_ENCODINGS = {}
+
+
+def _load_encoding(model: str):
+    """Gets the tiktoken encoding for a model, or None if tiktoken is unavailable"""
+    if tiktoken is None:
+        return None
+
+    if model not in _ENCODINGS:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception:
+            # The encoding files are downloaded on first use and may be unreachable
+            encoding = None
+        _ENCODINGS[model] = encoding
+    return _ENCODINGS[model]
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the model's tokenizer
+
+    Uses tiktoken when it is installed (pip install tiktoken); otherwise counts
+    are estimated at CHARS_PER_TOKEN characters per token, which is close enough
+    for budgeting but not exact.
+    """
+
+    def __init__(self, model: str = "gpt-4.1"):
+        """
+        Initialize the counter
+
+        Args:
+            model: Model whose tokenizer is used (unknown models use o200k_base)
+        """
+        self.model = model
+        self._encoding = _load_encoding(model)
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the real tokenizer rather than an estimate"""
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        """Counts the tokens in a piece of text"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def count_messages(self, messages: Sequence[dict]) -> int:
+        """Counts the prompt tokens of a chat conversation, including formatting overhead"""
+        return sum(TOKENS_PER_MESSAGE + self.count(message["content"]) for message in messages) + TOKENS_PER_REPLY
+
+
+def split_schema(schema: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """
+    Splits schema text from SQLiteManager.get_schema() into per-table blocks
+
+    Handles both the verbose format ("Table: name" followed by indented lines and a
+    blank line) and the compact format (one "name(...)" line per table).
+
+    Returns:
+        (lines outside any table block, [(table name, block lines), ...]); the
+        outside lines keep a None placeholder where each block was
+    """
+    other: List[Optional[str]] = []
+    blocks: List[Tuple[str, List[str]]] = []
+    current: Optional[List[str]] = None
+
+    for line in schema.split("\n"):
+        verbose = re.match(r"^Table: (\S+)$", line)
+        compact = re.match(r"^([A-Za-z_][A-Za-z0-9_]*)\(", line)
+        if verbose:
+            current = [line]
+            blocks.append((verbose.group(1), current))
+            other.append(None)
+        elif compact:
+            blocks.append((compact.group(1), [line]))
+            other.append(None)
+            current = None
+        elif current is not None and (line.startswith("  ") or line == ""):
+            current.append(line)
+            if line == "":
+                current = None
+        else:
+            current = None
+            other.append(line)
+
+    return other, blocks
+
+
+def drop_schema_tables(schema: str, dropped: Set[str]) -> str:
+    """Removes the given tables (and relationship lines that mention them) from schema text"""
+    other, blocks = split_schema(schema)
+    kept = iter(blocks)
+    lines = []
+    for line in other:
+        if line is None:
+            name, block = next(kept)
+            if name not in dropped:
+                lines.extend(block)
+            continue
+
+        relationship = re.match(r"^- (\w+)\.\w+ -> (\w+)", line)
+        if relationship and (relationship.group(1) in dropped or relationship.group(2) in dropped):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class PromptBudget:
+    """
+    Trims prompt content so a request stays within a token limit
+
+    SQL prompts lose their lowest-ranked few-shot examples first, then the schema
+    tables the question and remaining examples do not mention. Result prompts fall
+    back from the full table to a summary with fewer sample rows, and are cut off
+    as a last resort. Static instructions are never trimmed, so the cached prompt
+    prefix stays the same whatever the budget removes.
+    """
+
+    def __init__(self, max_tokens: int, counter: Optional[TokenCounter] = None):
+        """
+        Initialize the budget
+
+        Args:
+            max_tokens: Maximum prompt tokens per request (the reply is not included)
+            counter: TokenCounter to measure prompts with (default: gpt-4.1 tokenizer)
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+
+    def fits(self, messages: Sequence[dict]) -> bool:
+        """Whether a conversation is within the budget"""
+        return self.counter.count_messages(messages) <= self.max_tokens
+
+    def fit_sql_prompt(self, build: Callable[[str, Optional[list]], List[dict]], question: str,
+                       schema: str, examples: Optional[list]) -> Tuple[str, Optional[list]]:
+        """
+        Trims examples and schema tables until the SQL generation prompt fits
+
+        Args:
+            build: Builds the messages from (schema, examples)
+            question: Natural language question (tables it mentions are kept longest)
+            schema: Schema text from SQLiteManager.get_schema()
+            examples: (question, sql_query) tuples, most relevant first, or None
+
+        Returns:
+            (schema, examples) to send; may still exceed the budget if the question,
+            one example and the mentioned tables alone do not fit
+        """
+        examples = list(examples) if examples else []
+
+        # 1. Drop the lowest-ranked examples, keeping the best one for now
+        while len(examples) > 1 and not self.fits(build(schema, examples)):
+            examples.pop()
+
+        # 2. Drop tables from the end of the schema, unmentioned ones first
+        if not self.fits(build(schema, examples or None)):
+            _, blocks = split_schema(schema)
+            mentioned = self._mentioned_tables(question, examples, [name for name, _ in blocks])
+            candidates = [name for name, _ in reversed(blocks) if name not in mentioned]
+            dropped: Set[str] = set()
+            for name in candidates:
+                dropped.add(name)
+                trimmed = drop_schema_tables(schema, dropped)
+                if self.fits(build(trimmed, examples or None)):
+                    return trimmed, examples or None
+            schema = drop_schema_tables(schema, dropped)
+
+        # 3. Finally drop the last example
+        if examples and not self.fits(build(schema, examples)):
+            examples = []
+
+        return schema, examples or None
+
+    def fit_results(self, build: Callable[[str], List[dict]], result: QueryResult,
+                    max_rows: int = 100, sample_rows: int = 10) -> str:
+        """
+        Renders a result as large as the budget allows
+
+        Tries the normal rendering first, then a summary with sample_rows head and
+        tail rows, halving the samples down to one row, and finally cuts the text.
+
+        Args:
+            build: Builds the messages around the result text
+            result: Query result to render
+            max_rows: Largest result rendered in full
+            sample_rows: Rows in each summary sample
+
+        Returns:
+            Result text for the prompt
+        """
+        text = result.to_prompt_text(max_rows, sample_rows)
+        if self.fits(build(text)):
+            return text
+
+        samples = max(1, sample_rows)
+        while True:
+            text = result.to_prompt_text(0, samples)
+            if self.fits(build(text)) or samples == 1:
+                break
+            samples = max(1, samples // 2)
+
+        # Cut the text in proportion to the overflow until it fits
+        while not self.fits(build(text)) and len(text) > 0:
+            overflow = self.counter.count_messages(build(text)) - self.max_tokens
+            keep = len(text) - max(1, overflow) * CHARS_PER_TOKEN - len(TRUNCATION_NOTE)
+            text = text[:max(0, keep)].rstrip()
+            if self.fits(build(text + TRUNCATION_NOTE)):
+                return text + TRUNCATION_NOTE
+        return text
+
+    @staticmethod
+    def _mentioned_tables(question: str, examples: list, tables: List[str]) -> Set[str]:
+        """
+        Tables named (singular or plural) in the question, implied by its business terms
+        ("profit" needs payment, invoice and expense) or used by the kept examples
+        """
+        words = set(re.findall(r"[a-z_]+", question.lower()))
+        words |= {word[:-1] for word in words if word.endswith("s")}
+        example_sql = " ".join(sql.lower() for _, sql in examples)
+        used = set(re.findall(r"\b(?:from|join)\s+([a-z_][a-z0-9_]*)", example_sql))
+        used |= {table for word in words for table in BUSINESS_TERMS.get(word, [])}
+
+        mentioned = set()
+        for table in tables:
+            name = table.lower()
+            if name in words or name in used or name.replace("_", " ") in question.lower():
+                mentioned.add(table)
+        return mentioned
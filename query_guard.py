@@ -0,0 +1,291 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# SQLite before 3.36 wrote "SCAN TABLE job AS j" where newer versions write "SCAN j"
+_LOOP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?")
+_MATERIALIZE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+_TABLE_ALIAS = re.compile(
+    r"\b(?:from|join)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:as\s+)?([A-Za-z_][A-Za-z0-9_]*))?",
+    re.IGNORECASE
+)
+_COMMA_TABLE_ALIAS = re.compile(
+    r",\s*([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:as\s+)?([A-Za-z_][A-Za-z0-9_]*))?",
+    re.IGNORECASE
+)
+
+# Words that can follow a table name without being an alias
+_NOT_ALIASES = {
+    "cross", "except", "full", "group", "having", "inner", "intersect", "join", "left", "limit",
+    "natural", "on", "order", "outer", "right", "union", "using", "where", "window",
+}
+
+# Number of SQLite virtual machine instructions between progress handler calls
+PROGRESS_INTERVAL = 10000
+
+
+def explain_plan(connection: sqlite3.Connection, query: str,
+                 params: Optional[dict] = None) -> List[Tuple[int, int, str]]:
+    """Runs EXPLAIN QUERY PLAN (with the query's bound parameters, if any), returning (id, parent, detail) rows"""
+    return [(node_id, parent_id, detail)
+            for node_id, parent_id, _, detail in connection.execute(f"EXPLAIN QUERY PLAN {query}", params or ())]
+
+
+def table_aliases(query: str, known_names: Set[str]) -> Dict[str, str]:
+    """
+    Maps lowercased aliases to the names they stand for (query plans refer to aliased
+    tables by alias). Comma-separated FROM items are only trusted for known tables
+    and materialized subqueries, since the same pattern also matches select lists.
+    """
+    aliases = {}
+    for pattern in (_TABLE_ALIAS, _COMMA_TABLE_ALIAS):
+        for name, alias in pattern.findall(query):
+            if pattern is _COMMA_TABLE_ALIAS and name.lower() not in known_names:
+                continue
+            if alias and alias.lower() not in _NOT_ALIASES and alias.lower() != name.lower():
+                aliases[alias.lower()] = name
+    return aliases
+
+
+def estimate_table_rows(connection: sqlite3.Connection, table: str) -> Optional[int]:
+    """Approximates a table's row count cheaply (MAX(rowid) is a single b-tree descent)"""
+    quoted = table.replace('"', '""')
+    try:
+        return connection.execute(f'SELECT MAX(rowid) FROM "{quoted}"').fetchone()[0] or 0
+    except sqlite3.Error:
+        pass
+
+    # WITHOUT ROWID tables: fall back to ANALYZE statistics if there are any
+    try:
+        row = connection.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return int(row[0].split()[0]) if row else None
+
+
+class QueryRejectedError(RuntimeError):
+    """Raised when a query plan is estimated to be too expensive to run"""
+
+    def __init__(self, report: "PlanReport"):
+        super().__init__(f"Query rejected by the cost guard\n{report}")
+        self.report = report
+
+
+class QueryTimeoutError(RuntimeError):
+    """Raised when a running query exceeds its time or VM-step budget and is interrupted"""
+
+
+@dataclass
+class PlanReport:
+    """EXPLAIN QUERY PLAN output annotated with row estimates and the problems found"""
+
+    plan: List[Tuple[int, str]] = field(default_factory=list)
+    table_rows: Dict[str, Optional[int]] = field(default_factory=dict)
+    issues: List[str] = field(default_factory=list)
+    estimated_rows: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def __str__(self) -> str:
+        lines = ["Query plan:"]
+        lines.extend(f"{'  ' * (depth + 1)}{detail}" for depth, detail in self.plan)
+        lines.append(f"Estimated rows visited: {self.estimated_rows:,}")
+        if self.issues:
+            lines.append("Problems:")
+            lines.extend(f"  - {issue}" for issue in self.issues)
+        return "\n".join(lines)
+
+
+class QueryGuard:
+    """
+    Checks generated SQL before it runs and bounds it while it runs
+
+    Before execution, EXPLAIN QUERY PLAN is inspected: every full scan is sized with
+    the table's approximate row count (MAX(rowid), or sqlite_stat1), and loops nested
+    inside other loops multiply. Queries with a full scan above max_scan_rows, or a
+    nested loop above max_join_rows row combinations (typically a cartesian join), are
+    rejected with a report instead of being run.
+
+    During execution a progress handler stops the query once it runs longer than
+    timeout_seconds or executes more than max_vm_steps VM instructions, with a timer
+    calling interrupt() as a backstop.
+    """
+
+    def __init__(self, max_scan_rows: Optional[int] = 5000000, max_join_rows: Optional[int] = 10000000,
+                 timeout_seconds: Optional[float] = 30.0, max_vm_steps: Optional[int] = None,
+                 check_plans: bool = True):
+        """
+        Initialize the guard
+
+        Args:
+            max_scan_rows: Reject full scans of tables larger than this (None disables)
+            max_join_rows: Reject nested loops visiting more row combinations than this (None disables)
+            timeout_seconds: Interrupt queries running longer than this (None disables)
+            max_vm_steps: Interrupt queries executing more VM instructions than this (None disables)
+            check_plans: Whether to inspect query plans before execution at all
+        """
+        self.max_scan_rows = max_scan_rows
+        self.max_join_rows = max_join_rows
+        self.timeout_seconds = timeout_seconds
+        self.max_vm_steps = max_vm_steps
+        self.check_plans = check_plans
+
+    def check(self, connection: sqlite3.Connection, query: str, tables: Iterable[str],
+              params: Optional[dict] = None) -> PlanReport:
+        """
+        Explains a query and estimates how many rows it will visit
+
+        Args:
+            connection: Connection the query will run on
+            query: SQL query to check
+            tables: Names of the tables in the database
+            params: Bound parameters of the query
+
+        Returns:
+            PlanReport listing the plan, row estimates and any problems
+        """
+        rows = explain_plan(connection, query, params)
+
+        children: Dict[int, List[Tuple[int, str]]] = {}
+        for node_id, parent_id, detail in rows:
+            children.setdefault(parent_id, []).append((node_id, detail))
+
+        report = PlanReport()
+        self._collect_plan(children, 0, 0, report.plan)
+
+        known_tables = {table.lower(): table for table in tables}
+        materialized_names = {match.group(1).lower() for match in map(_MATERIALIZE.match, (row[2] for row in rows))
+                              if match}
+        aliases = table_aliases(query, set(known_tables) | materialized_names)
+        materialized: Dict[str, int] = {}
+
+        def table_size(name: str) -> Tuple[str, Optional[int]]:
+            """Resolves a plan name (table, alias or materialized view) to (display name, rows)"""
+            name = aliases.get(name.lower(), name)
+            table = known_tables.get(name.lower())
+            if table is None:
+                return name, materialized.get(name)
+            if table not in report.table_rows:
+                report.table_rows[table] = estimate_table_rows(connection, table)
+            return table, report.table_rows[table]
+
+        def visit(parent_id: int, outer_rows: int) -> Tuple[int, int]:
+            """Walks one query block, returning (rows it produces, rows it visits)"""
+            loop_rows = outer_rows
+            visited = 0
+
+            for node_id, detail in children.get(parent_id, []):
+                loop = _LOOP.match(detail)
+                if loop and detail != "SCAN CONSTANT ROW":
+                    kind = loop.group(1)
+                    name, size = table_size(loop.group(2))
+                    if kind == "SCAN" and size:
+                        is_table = name.lower() in known_tables
+                        if is_table and self.max_scan_rows is not None and size > self.max_scan_rows:
+                            report.issues.append(
+                                f"Full scan of {name} (~{size:,} rows) exceeds the {self.max_scan_rows:,}-row limit; "
+                                f"filter on an indexed column instead"
+                            )
+                        if loop_rows > 1 and self.max_join_rows is not None and loop_rows * size > self.max_join_rows:
+                            report.issues.append(
+                                f"Nested loop scans {name} (~{size:,} rows) once per outer row "
+                                f"(~{loop_rows * size:,} combinations, limit {self.max_join_rows:,}); "
+                                f"check for a missing join condition"
+                            )
+                        loop_rows *= size
+                    visited += loop_rows
+                    continue
+
+                correlated = detail.startswith("CORRELATED")
+                produced, block_visited = visit(node_id, loop_rows if correlated else 1)
+                visited += block_visited
+
+                materialize = _MATERIALIZE.match(detail)
+                if materialize:
+                    materialized[materialize.group(1)] = produced
+
+            return loop_rows, visited
+
+        _, report.estimated_rows = visit(0, 1)
+        return report
+
+    def enforce(self, connection: sqlite3.Connection, query: str, tables: Iterable[str],
+                params: Optional[dict] = None) -> Optional[PlanReport]:
+        """
+        Checks a query plan if plan checking is enabled
+
+        Raises:
+            QueryRejectedError: If the plan is estimated to be too expensive
+        """
+        if not self.check_plans:
+            return None
+
+        report = self.check(connection, query, tables, params)
+        if not report.ok:
+            raise QueryRejectedError(report)
+        return report
+
+    @contextmanager
+    def limit(self, connection: sqlite3.Connection) -> Iterator[None]:
+        """
+        Bounds the statements run on a connection inside the block
+
+        Raises:
+            QueryTimeoutError: If the time or VM-step budget runs out
+        """
+        if self.timeout_seconds is None and self.max_vm_steps is None:
+            yield
+            return
+
+        started = time.monotonic()
+        deadline = started + self.timeout_seconds if self.timeout_seconds is not None else None
+        state = {"steps": 0, "reason": None}
+
+        def on_progress() -> int:
+            state["steps"] += PROGRESS_INTERVAL
+            if self.max_vm_steps is not None and state["steps"] > self.max_vm_steps:
+                state["reason"] = f"exceeded the {self.max_vm_steps:,} VM-step limit"
+                return 1
+            if deadline is not None and time.monotonic() > deadline:
+                state["reason"] = f"exceeded the {self.timeout_seconds}s time limit"
+                return 1
+            return 0
+
+        def on_timeout():
+            # Backstop for long stretches where SQLite does not call the progress handler
+            state["reason"] = state["reason"] or f"exceeded the {self.timeout_seconds}s time limit"
+            connection.interrupt()
+
+        timer = None
+        if deadline is not None:
+            timer = threading.Timer(self.timeout_seconds + 1.0, on_timeout)
+            timer.daemon = True
+            timer.start()
+
+        connection.set_progress_handler(on_progress, PROGRESS_INTERVAL)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if state["reason"] and "interrupt" in str(e).lower():
+                raise QueryTimeoutError(
+                    f"Query stopped after {time.monotonic() - started:.1f}s: {state['reason']}"
+                )
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            connection.set_progress_handler(None, 0)
+
+    @staticmethod
+    def _collect_plan(children: Dict[int, List[Tuple[int, str]]], parent_id: int, depth: int,
+                      plan: List[Tuple[int, str]]):
+        """Flattens the plan tree into (depth, detail) lines in execution order"""
+        for node_id, detail in children.get(parent_id, []):
+            plan.append((depth, detail))
+            QueryGuard._collect_plan(children, node_id, depth + 1, plan)
@@ -1,5 +1,18 @@
+from typing import Callable, Iterator, Optional, Tuple
+
+from answer_renderer import AnswerRenderer
+from entity_index import EntityIndex
+from example_store import ExampleStore
+from exporter import ExportSummary, format_for_path
+from intent_templates import IntentMatch, IntentTemplates
+from metrics import ROW_BUCKETS, MetricsRegistry
 from openai_client import OpenAIClient
+from prompt_budget import PromptBudget
 from sqlite_manager import SQLiteManager
+from schema_linker import SchemaLinker
+from sql_cache import SQLCache
+from sql_validator import SQLValidationError
+from query_result import QueryResult
 
 
 class QueryProcessor:
@@ -11,7 +24,13 @@ class QueryProcessor:
     4. Returns final response
     """
 
-    def __init__(self, db_manager: SQLiteManager, ai_client: OpenAIClient, use_few_shot: bool = False, examples: list = None):
+    def __init__(self, db_manager: SQLiteManager, ai_client: OpenAIClient, use_few_shot: bool = False, examples: list = None,
+                 sql_cache: Optional[SQLCache] = None, example_store: Optional[ExampleStore] = None,
+                 top_k: int = 5, schema_linker: Optional[SchemaLinker] = None,
+                 answer_renderer: Optional[AnswerRenderer] = None, metrics: Optional[MetricsRegistry] = None,
+                 compact_schema: bool = False, prompt_budget: Optional[PromptBudget] = None,
+                 validate_sql: bool = False, repair_attempts: int = 2, sql_candidates: int = 1,
+                 intent_templates: Optional[IntentTemplates] = None, entity_index: Optional[EntityIndex] = None):
         """
         Initialize query processor
 
@@ -20,11 +39,43 @@ class QueryProcessor:
             ai_client: OpenAIClient instance
             use_few_shot: Whether to use few-shot prompting (default: False)
             examples: List of (question, sql_query) tuples for few-shot examples
+            sql_cache: Optional SQLCache used to skip the SQL generation call for repeated questions
+            example_store: Optional ExampleStore; when set, the top_k most relevant examples
+                are retrieved per question instead of sending every entry of examples
+            top_k: Number of examples retrieved from example_store per question
+            schema_linker: Optional SchemaLinker that prunes the prompt schema to relevant tables
+            answer_renderer: Optional AnswerRenderer that answers small results without a model call
+            metrics: Registry receiving per-stage timings, cache hits and row counts
+                (default: the AI client's registry)
+            compact_schema: Send the one-line-per-table schema instead of the verbose one
+            prompt_budget: Optional PromptBudget that trims examples, schema and results
+                so each request stays within a token limit
+            validate_sql: Compile generated SQL before running it and re-prompt with the
+                error when it is invalid
+            repair_attempts: Re-prompts allowed per question after the first generation
+            sql_candidates: SQL candidates requested per call; the first valid one is used
+            intent_templates: Optional IntentTemplates that answer recurring question shapes
+                with parameterized SQL instead of a generation call
+            entity_index: Optional EntityIndex that adds the stored values a question mentions
+                to the prompt and corrects misspelled literals in generated SQL
         """
         self.db_manager = db_manager
         self.ai_client = ai_client
         self.use_few_shot = use_few_shot
         self.examples = examples
+        self.sql_cache = sql_cache
+        self.example_store = example_store
+        self.top_k = top_k
+        self.schema_linker = schema_linker
+        self.answer_renderer = answer_renderer
+        self.metrics = metrics or ai_client.metrics
+        self.compact_schema = compact_schema
+        self.prompt_budget = prompt_budget
+        self.validate_sql = validate_sql
+        self.repair_attempts = repair_attempts
+        self.sql_candidates = sql_candidates
+        self.intent_templates = intent_templates
+        self.entity_index = entity_index
 
     def process_query(self, question: str, show_debug: bool = True) -> str:
         """
@@ -37,29 +88,341 @@ class QueryProcessor:
         Returns:
             Formatted natural language response
         """
-        # Step 1: Get database schema
-        schema = self.db_manager.get_schema()
+        sql_query, result = self._query_database(question, show_debug)
 
-        # Step 2: Convert natural language question to SQL
-        strategy = "few-shot" if self.use_few_shot else "zero-shot"
-        print(f"Converting question to SQL ({strategy})...", end=" ", flush=True)
-        sql_query = self.ai_client.convert_to_sql(question, schema, self.use_few_shot, self.examples)
+        # Step 4: Format results into natural language response
+        print("Formatting response...", end=" ", flush=True)
+        response = self.format_answer(question, sql_query, result)
         print("✓")
 
+        return response
+
+    def process_query_stream(self, question: str, show_debug: bool = True) -> Iterator[str]:
+        """
+        Processes a natural language question, streaming the final response
+
+        Args:
+            question: Natural language question
+            show_debug: Whether to show SQL query and raw results (default: True)
+
+        Yields:
+            Chunks of the natural language response as they arrive from the model
+        """
+        sql_query, result = self._query_database(question, show_debug)
+
+        # Step 4: Stream the natural language response (small results are answered locally)
+        with self.metrics.timer("stage_seconds", stage="format_response"):
+            response = self.render_locally(question, result)
+            if response is not None:
+                yield response
+                return
+
+            yield from self.ai_client.format_response_stream(question, sql_query, self.result_text(question, sql_query, result))
+        self.metrics.increment("answers_total", formatter="llm")
+
+    def export_query(self, question: str, path: str, export_format: Optional[str] = None,
+                     show_debug: bool = True) -> ExportSummary:
+        """
+        Generates SQL for a question and streams its full result to a file
+
+        The answer formatting step is skipped entirely, so no model call is made
+        for the result and exports of any size run in constant memory.
+
+        Args:
+            question: Natural language question
+            path: Output file (.csv, .jsonl or .parquet)
+            export_format: Overrides the format implied by the file extension
+            show_debug: Whether to show the SQL query (default: True)
+
+        Returns:
+            ExportSummary with the row count, file size and duration
+        """
+        # Fail on an unusable file name before paying for SQL generation
+        export_format = format_for_path(path, export_format)
+        schema, schema_hash = self.prompt_schema(question)
+
+        print(f"Converting question to SQL ({self.strategy})...", end=" ", flush=True)
+        sql_query, cached = self.generate_sql(question, schema, schema_hash)
+        print("✓ (cached)" if cached else "✓")
+
         if show_debug:
             print(f"\n[DEBUG] Generated SQL:\n{sql_query}\n")
 
-        # Step 3: Execute SQL query
-        print("Executing SQL query...", end=" ", flush=True)
-        results = self.db_manager.execute_query(sql_query)
-        print("✓")
+        def progress(rows: int):
+            print(f"\rExporting results... {rows:,} rows", end="", flush=True)
+
+        print("Exporting results...", end="", flush=True)
+        try:
+            with self.metrics.timer("stage_seconds", stage="export"):
+                summary = self.db_manager.export_result(sql_query, path, export_format, progress=progress)
+        except (RuntimeError, ValueError, OSError) as e:
+            print()
+            self.metrics.increment("query_errors_total", error=type(e).__name__)
+            raise
+        print(" ✓")
+        self.metrics.increment("exported_rows_total", summary.rows, format=summary.format)
+
+        if self.sql_cache:
+            self.sql_cache.put(question, schema_hash, self.strategy, sql_query)
+
+        return summary
+
+    @property
+    def strategy(self) -> str:
+        """Name of the prompting strategy in use"""
+        return "few-shot" if self.use_few_shot else "zero-shot"
+
+    def prompt_schema(self, question: str, db_manager: Optional[SQLiteManager] = None) -> Tuple[str, Optional[str]]:
+        """
+        Gets the schema text to send with a question
+
+        With a schema linker, only the tables relevant to the question (plus their join
+        paths) are included; the full schema is used when linking is not confident.
+
+        Args:
+            question: Natural language question
+            db_manager: Manager to read the schema from (default: self.db_manager)
+
+        Returns:
+            (schema text, fingerprint of the full schema)
+        """
+        db_manager = db_manager or self.db_manager
+        with self.metrics.timer("stage_seconds", stage="schema"):
+            schema = db_manager.get_schema(compact=self.compact_schema)
+            schema_hash = db_manager.get_schema_hash()
+
+            if self.intent_templates is not None:
+                self.intent_templates.refresh(db_manager)
+            if self.entity_index is not None:
+                self.entity_index.refresh(db_manager)
+
+            if self.schema_linker is not None:
+                tables = self.schema_linker.link(question, db_manager)
+                if tables:
+                    schema = db_manager.get_schema(tables, compact=self.compact_schema)
+
+        return schema, schema_hash
+
+    def match_intent(self, question: str) -> Optional[IntentMatch]:
+        """
+        Matches a question against the intent templates (call prompt_schema() first)
+
+        Returns:
+            IntentMatch with the parameterized SQL and its values, or None if no
+            template applies and the SQL has to be generated
+        """
+        if self.intent_templates is None:
+            return None
+
+        match = self.intent_templates.match(question)
+        self.metrics.increment("intent_template_requests_total", result="hit" if match is not None else "miss")
+        return match
+
+    def generate_sql(self, question: str, schema: str, schema_hash: Optional[str],
+                     validate: Optional[Callable[[str], str]] = None) -> Tuple[str, bool]:
+        """
+        Converts a question to SQL, reusing cached SQL when available
+
+        Args:
+            question: Natural language question
+            schema: Schema prompt text
+            schema_hash: Fingerprint of the schema (used as part of the cache key)
+            validate: Checks SQL on the thread that owns the database connection
+                (default: self.db_manager.validate_sql); used when validation is on
+
+        Returns:
+            (sql_query, whether it came from the cache)
+        """
+        with self.metrics.timer("stage_seconds", stage="generate_sql"):
+            if self.sql_cache:
+                sql_query = self.sql_cache.get(question, schema_hash, self.strategy)
+                self.metrics.increment("sql_cache_requests_total", result="hit" if sql_query is not None else "miss")
+                if sql_query is not None:
+                    return sql_query, True
+
+            examples = self.select_examples(question, schema)
+            values = self.ground_question(question)
+            if self.prompt_budget is not None:
+                schema, examples = self.prompt_budget.fit_sql_prompt(
+                    lambda text, selected: self.ai_client.build_sql_messages(question, text, selected, values),
+                    question, schema, examples
+                )
+
+            if not self.validate_sql:
+                sql_query = self.ai_client.convert_to_sql(question, schema, bool(examples), examples, values)
+            else:
+                messages = self.ai_client.build_sql_messages(question, schema, examples, values)
+                sql_query = self.repair_sql(messages, validate or self.db_manager.validate_sql)
+            return self.ground_sql(sql_query), False
+
+    def ground_question(self, question: str) -> Optional[list]:
+        """
+        Looks up the stored values (names, statuses, ...) a question mentions
+
+        Returns:
+            Lines such as "company.name = 'Central Glass DC'" for the prompt, or None
+        """
+        if self.entity_index is None:
+            return None
+
+        matches = self.entity_index.ground(question)
+        self.metrics.increment("entity_hints_total", len(matches))
+        return [str(match) for match in matches] or None
+
+    def ground_sql(self, sql_query: str) -> str:
+        """Replaces literals in generated SQL that match no stored value with the closest stored one"""
+        if self.entity_index is None:
+            return sql_query
+
+        sql_query, replacements = self.entity_index.rewrite_sql(sql_query)
+        if replacements:
+            self.metrics.increment("entity_rewrites_total", len(replacements))
+        return sql_query
+
+    def repair_sql(self, messages: list, validate: Callable[[str], str]) -> str:
+        """
+        Generates SQL until a candidate validates, feeding each failure back to the model
+
+        Args:
+            messages: SQL generation conversation
+            validate: Returns the cleaned SQL or raises SQLValidationError
+
+        Returns:
+            The first valid SQL query
+
+        Raises:
+            SQLValidationError: If no candidate is valid after repair_attempts re-prompts
+        """
+        error = None
+        for attempt in range(self.repair_attempts + 1):
+            for candidate in self.ai_client.generate_sql_candidates(messages, n=self.sql_candidates):
+                try:
+                    sql_query = validate(candidate)
+                except SQLValidationError as e:
+                    error = e
+                    continue
+
+                self.metrics.increment("sql_validation_total", result="valid" if attempt == 0 else "repaired")
+                return sql_query
+
+            if attempt < self.repair_attempts:
+                self.metrics.increment("sql_repairs_total")
+                messages = self.ai_client.build_repair_messages(messages, error.sql, error.reason)
+
+        self.metrics.increment("sql_validation_total", result="invalid")
+        raise error
+
+    def select_examples(self, question: str, schema: str) -> Optional[list]:
+        """
+        Picks the few-shot examples to send with a question
+
+        With an example store, only the most relevant examples whose tables exist in
+        the schema are used, so few-shot prompting works on any database the library
+        covers. Otherwise the fixed example list is used when few-shot is enabled.
+
+        Returns:
+            List of (question, sql_query) tuples, or None for zero-shot prompting
+        """
+        if self.example_store is not None:
+            tables = SQLiteManager.schema_tables(schema)
+            return self.example_store.top_k(question, self.top_k, available_tables=tables) or None
+
+        return self.examples if self.use_few_shot else None
+
+    def execute_sql(self, question: str, sql_query: str, schema_hash: Optional[str],
+                    db_manager: Optional[SQLiteManager] = None, params: Optional[dict] = None) -> QueryResult:
+        """
+        Executes generated SQL and caches it once it has run successfully
+
+        Args:
+            question: Natural language question the SQL was generated for
+            sql_query: SQL query to execute
+            schema_hash: Fingerprint of the schema the SQL was generated against
+            db_manager: Manager to run the query on (default: self.db_manager)
+            params: Values for the query's named parameters (intent template SQL)
+
+        Returns:
+            Structured query result
+        """
+        try:
+            with self.metrics.timer("stage_seconds", stage="execute_sql"):
+                result = (db_manager or self.db_manager).fetch_result(sql_query, params)
+        except RuntimeError as e:
+            self.metrics.increment("query_errors_total", error=type(e).__name__)
+            raise
+        self.metrics.observe("result_rows", result.total_count, buckets=ROW_BUCKETS)
+
+        # Only cache SQL that actually executed, so a bad generation is not replayed;
+        # template SQL is not cached since it needs its parameters
+        if self.sql_cache and params is None:
+            self.sql_cache.put(question, schema_hash, self.strategy, sql_query)
+
+        return result
+
+    def format_answer(self, question: str, sql_query: str, result: QueryResult) -> str:
+        """Turns a query result into a natural language answer, locally when the renderer allows"""
+        with self.metrics.timer("stage_seconds", stage="format_response"):
+            response = self.render_locally(question, result)
+            if response is not None:
+                return response
+
+            response = self.ai_client.format_response(question, sql_query, self.result_text(question, sql_query, result))
+        self.metrics.increment("answers_total", formatter="llm")
+        return response
+
+    def result_text(self, question: str, sql_query: str, result: QueryResult) -> str:
+        """Renders a result for the answer prompt, shrinking it to the prompt budget if one is set"""
+        if self.prompt_budget is None:
+            return self.db_manager.format_result(result)
+
+        return self.prompt_budget.fit_results(
+            lambda text: self.ai_client.build_format_messages(question, sql_query, text),
+            result, self.db_manager.prompt_rows, self.db_manager.sample_rows
+        )
+
+    def render_locally(self, question: str, result: QueryResult) -> Optional[str]:
+        """Returns a templated answer for the result, or None if the model should format it"""
+        if self.answer_renderer is None:
+            return None
+
+        response = self.answer_renderer.render(question, result)
+        if response is not None:
+            self.metrics.increment("answers_total", formatter="local")
+        return response
+
+    def _query_database(self, question: str, show_debug: bool) -> Tuple[str, QueryResult]:
+        """
+        Runs steps 1-3: fetch schema, generate (or reuse) SQL and execute it
+
+        Returns:
+            (sql_query, structured query result)
+        """
+        # Step 1: Get database schema (pruned to the relevant tables if schema linking is on)
+        schema, schema_hash = self.prompt_schema(question)
+
+        # Step 2: Convert natural language question to SQL (known question shapes use a template)
+        strategy = self.strategy
+        print(f"Converting question to SQL ({strategy})...", end=" ", flush=True)
+        match = self.match_intent(question)
+        if match is not None:
+            sql_query = match.display_sql
+            print("✓ (template)")
+        else:
+            sql_query, cached = self.generate_sql(question, schema, schema_hash)
+            print("✓ (cached)" if cached else "✓")
 
         if show_debug:
-            print(f"\n[DEBUG] Raw Query Results:\n{results}\n")
+            print(f"\n[DEBUG] Generated SQL:\n{sql_query}\n")
 
-        # Step 4: Format results into natural language response
-        print("Formatting response...", end=" ", flush=True)
-        response = self.ai_client.format_response(question, sql_query, results)
+        # Step 3: Execute SQL query (template SQL runs with bound parameters)
+        print("Executing SQL query...", end=" ", flush=True)
+        if match is not None:
+            result = self.execute_sql(question, match.sql, schema_hash, params=match.params)
+        else:
+            result = self.execute_sql(question, sql_query, schema_hash)
         print("✓")
 
-        return response
+        if show_debug:
+            print(f"\n[DEBUG] Raw Query Results:\n{self.db_manager.format_result(result)}\n")
+
+        return sql_query, result
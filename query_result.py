@@ -0,0 +1,271 @@
+import sqlite3
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Distinct values tracked per column before the count is reported as a lower bound
+MAX_TRACKED_DISTINCT = 1000
+
+
+def _sort_key(value: Any) -> tuple:
+    """Orders values the way SQLite does (NULL < numbers < text < blob) so mixed columns compare"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def _format_cell(value: Any) -> str:
+    """Formats a single cell for text output"""
+    return str(value) if value is not None else "NULL"
+
+
+def _encode_value(value: Any) -> Any:
+    """Makes a cell JSON-safe (BLOBs become tagged hex strings)"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$blob": bytes(value).hex()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """Reverses _encode_value"""
+    if isinstance(value, dict) and "$blob" in value:
+        return bytes.fromhex(value["$blob"])
+    return value
+
+
+@dataclass
+class ColumnStats:
+    """Running min/max/distinct/null statistics for one result column"""
+
+    min: Any = None
+    max: Any = None
+    nulls: int = 0
+    distinct_values: set = field(default_factory=set)
+    distinct_overflow: bool = False
+    restored_distinct: Optional[int] = None
+
+    def add(self, value: Any):
+        """Folds one value into the statistics"""
+        if value is None:
+            self.nulls += 1
+            return
+
+        if self.min is None or _sort_key(value) < _sort_key(self.min):
+            self.min = value
+        if self.max is None or _sort_key(value) > _sort_key(self.max):
+            self.max = value
+
+        if not self.distinct_overflow:
+            self.distinct_values.add(value)
+            if len(self.distinct_values) > MAX_TRACKED_DISTINCT:
+                self.distinct_overflow = True
+                self.distinct_values = set()
+
+    @property
+    def distinct_count(self) -> int:
+        """Number of distinct non-NULL values seen (a lower bound once distinct_overflow is set)"""
+        if self.restored_distinct is not None:
+            return self.restored_distinct
+        return MAX_TRACKED_DISTINCT if self.distinct_overflow else len(self.distinct_values)
+
+    def describe(self) -> str:
+        """Returns a one-line summary of the statistics"""
+        distinct = f">{MAX_TRACKED_DISTINCT}" if self.distinct_overflow else str(self.distinct_count)
+        return f"min={_format_cell(self.min)}, max={_format_cell(self.max)}, distinct={distinct}, nulls={self.nulls}"
+
+    def to_dict(self) -> dict:
+        """Serializes the statistics to a JSON-safe dict"""
+        return {
+            "min": _encode_value(self.min),
+            "max": _encode_value(self.max),
+            "nulls": self.nulls,
+            "distinct": self.distinct_count,
+            "distinct_overflow": self.distinct_overflow,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnStats":
+        """Rebuilds statistics serialized with to_dict"""
+        return cls(
+            min=_decode_value(data["min"]),
+            max=_decode_value(data["max"]),
+            nulls=data["nulls"],
+            distinct_overflow=data["distinct_overflow"],
+            restored_distinct=data["distinct"]
+        )
+
+
+@dataclass
+class QueryResult:
+    """
+    Structured result of a query
+
+    Only the first max_rows rows are kept in memory; the remaining rows are
+    scanned to count them and to collect a tail sample and per-column statistics.
+    """
+
+    columns: List[str]
+    rows: List[tuple]
+    total_count: int
+    truncated: bool = False
+    count_exact: bool = True
+    tail: List[tuple] = field(default_factory=list)
+    column_stats: Dict[str, ColumnStats] = field(default_factory=dict)
+    has_result_set: bool = True
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor, max_rows: int = 1000, batch_size: int = 500,
+                    scan_limit: Optional[int] = 1000000, sample_rows: int = 10) -> "QueryResult":
+        """
+        Builds a result by streaming an executed cursor with fetchmany
+
+        Args:
+            cursor: Cursor on which a statement has been executed
+            max_rows: Maximum number of rows kept in memory
+            batch_size: Number of rows fetched per fetchmany call
+            scan_limit: Stop counting rows after this many (None scans everything)
+            sample_rows: Number of trailing rows kept as a tail sample
+
+        Returns:
+            QueryResult for the cursor
+        """
+        if cursor.description is None:
+            return cls(columns=[], rows=[], total_count=0, has_result_set=False)
+
+        columns = [description[0] for description in cursor.description]
+        stats = [ColumnStats() for _ in columns]
+        rows: List[tuple] = []
+        tail: deque = deque(maxlen=sample_rows)
+        total = 0
+        count_exact = True
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+
+            for row in batch:
+                total += 1
+                if len(rows) < max_rows:
+                    rows.append(row)
+                else:
+                    tail.append(row)
+                for i, cell in enumerate(row):
+                    stats[i].add(cell)
+
+            if scan_limit is not None and total >= scan_limit:
+                count_exact = cursor.fetchone() is None
+                break
+
+        return cls(
+            columns=columns,
+            rows=rows,
+            total_count=total,
+            truncated=total > len(rows),
+            count_exact=count_exact,
+            tail=list(tail),
+            column_stats=dict(zip(columns, stats))
+        )
+
+    def to_table(self, rows: Optional[List[tuple]] = None) -> str:
+        """
+        Formats rows as a padded text table
+
+        Args:
+            rows: Rows to format (default: all in-memory rows)
+
+        Returns:
+            Text table with a header and separator line
+        """
+        if not self.has_result_set or not self.columns:
+            return "Query executed successfully (no results)"
+
+        rows = self.rows if rows is None else rows
+        cells = [[_format_cell(cell) for cell in row] for row in rows]
+
+        col_widths = [len(col) for col in self.columns]
+        for row in cells:
+            for i, cell in enumerate(row):
+                col_widths[i] = max(col_widths[i], len(cell))
+
+        output_lines = [
+            " | ".join(col.ljust(col_widths[i]) for i, col in enumerate(self.columns)),
+            "-+-".join("-" * col_widths[i] for i in range(len(self.columns)))
+        ]
+
+        if cells:
+            for row in cells:
+                output_lines.append(" | ".join(cell.ljust(col_widths[i]) for i, cell in enumerate(row)))
+        else:
+            output_lines.append("(No rows returned)")
+
+        return "\n".join(output_lines)
+
+    def to_prompt_text(self, max_rows: int = 100, sample_rows: int = 10) -> str:
+        """
+        Formats the result for inclusion in a prompt
+
+        Small results are rendered as a full table. Larger results are replaced by a
+        compact summary: row count, head and tail samples and per-column statistics.
+
+        Args:
+            max_rows: Largest result rendered in full
+            sample_rows: Rows shown in each of the head and tail samples
+
+        Returns:
+            Text representation of the result
+        """
+        if not self.has_result_set or (not self.truncated and self.total_count <= max_rows):
+            return self.to_table()
+
+        count = f"{self.total_count}" if self.count_exact else f"more than {self.total_count}"
+        lines = [
+            f"RESULT SUMMARY: {count} rows, {len(self.columns)} columns (too many to list in full).",
+            "",
+            f"First {min(sample_rows, len(self.rows))} rows:",
+            self.to_table(self.rows[:sample_rows]),
+        ]
+
+        tail = (self.rows + self.tail)[-sample_rows:] if self.count_exact else []
+        if tail and self.total_count > sample_rows:
+            lines.extend(["", f"Last {len(tail)} rows:", self.to_table(tail)])
+
+        lines.extend(["", "Column statistics:"])
+        for column in self.columns:
+            lines.append(f"  - {column}: {self.column_stats[column].describe()}")
+
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.to_prompt_text()
+
+    def to_dict(self) -> dict:
+        """Serializes the result to a JSON-safe dict"""
+        return {
+            "columns": self.columns,
+            "rows": [[_encode_value(cell) for cell in row] for row in self.rows],
+            "total_count": self.total_count,
+            "truncated": self.truncated,
+            "count_exact": self.count_exact,
+            "tail": [[_encode_value(cell) for cell in row] for row in self.tail],
+            "has_result_set": self.has_result_set,
+            "column_stats": {column: stats.to_dict() for column, stats in self.column_stats.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueryResult":
+        """Rebuilds a result serialized with to_dict"""
+        return cls(
+            columns=data["columns"],
+            rows=[tuple(_decode_value(cell) for cell in row) for row in data["rows"]],
+            total_count=data["total_count"],
+            truncated=data["truncated"],
+            count_exact=data["count_exact"],
+            tail=[tuple(_decode_value(cell) for cell in row) for row in data["tail"]],
+            column_stats={column: ColumnStats.from_dict(stats) for column, stats in data["column_stats"].items()},
+            has_result_set=data["has_result_set"]
+        )
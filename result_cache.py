@@ -0,0 +1,182 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from query_result import QueryResult
+
+# Matches quoted literals/identifiers so canonicalization never rewrites their contents
+_QUOTED_OR_SPACE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])|\s+")
+
+# SQL whose result depends on when or how often it runs: 'now' and date functions without a
+# time value read the clock, random() and the change counters differ on every call
+_NON_DETERMINISTIC = re.compile(
+    r"'now'|\bCURRENT_(?:DATE|TIME|TIMESTAMP)\b|\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)|\bstrftime\s*\(\s*'(?:[^']|'')*'\s*\)",
+    re.IGNORECASE
+)
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of QueryResult objects with an optional on-disk tier
+
+    Entries are keyed by database path plus canonicalized SQL and tagged with a
+    validity stamp. The in-memory tier uses a stamp built from PRAGMA data_version,
+    the connection's own change counter and the file mtime; the on-disk tier only
+    survives across processes, so it is tagged with the file mtime/size alone.
+    A stamp mismatch is treated as a miss and the stale entry is dropped. Queries
+    that read the clock or call random() are never cached (see is_cacheable()).
+    """
+
+    def __init__(self, max_entries: int = 256, disk_path: Optional[str] = None, max_disk_entries: int = 10000):
+        """
+        Initialize the result cache
+
+        Args:
+            max_entries: Maximum number of results held in memory
+            disk_path: Optional path to a SQLite side file for the on-disk tier
+            max_disk_entries: Maximum number of results held on disk
+        """
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[tuple, QueryResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = None
+
+        if disk_path:
+            try:
+                self.disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self.disk.execute(
+                    """CREATE TABLE IF NOT EXISTS result_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        file_stamp TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        last_used REAL NOT NULL
+                    )"""
+                )
+                self.disk.commit()
+            except sqlite3.Error as e:
+                raise RuntimeError(f"Failed to open result cache at {disk_path}: {e}")
+
+    @staticmethod
+    def canonicalize(sql: str) -> str:
+        """Collapses whitespace outside quoted sections and drops trailing semicolons"""
+        def replace(match):
+            return match.group(1) if match.group(1) else " "
+
+        return _QUOTED_OR_SPACE.sub(replace, sql).strip().rstrip(";").strip()
+
+    @staticmethod
+    def is_cacheable(sql: str, params: Optional[dict] = None) -> bool:
+        """
+        Whether a query's result only depends on the data
+
+        Queries reading the clock (date('now'), CURRENT_DATE, ...) or calling random()
+        are never cached: the file stamps would keep "jobs started in the last 30 days"
+        valid for as long as the file is unchanged.
+        """
+        if _NON_DETERMINISTIC.search(sql):
+            return False
+        return not any(isinstance(value, str) and value.strip().lower() == "now" for value in (params or {}).values())
+
+    def make_key(self, db_path: str, sql: str, params: Optional[dict] = None) -> str:
+        """Builds the cache key for a query (and its bound parameters) against a given database file"""
+        key = f"{db_path}\x1f{self.canonicalize(sql)}"
+        if params:
+            key += f"\x1f{json.dumps(params, sort_keys=True, default=str)}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, db_path: str, sql: str, data_stamp: tuple, file_stamp: tuple,
+            params: Optional[dict] = None) -> Optional[QueryResult]:
+        """
+        Looks up a cached result
+
+        Args:
+            db_path: Path of the database the query runs against
+            sql: SQL query text
+            data_stamp: In-process validity stamp for the memory tier
+            file_stamp: File-level validity stamp for the disk tier
+            params: Bound parameters of the query
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        key = self.make_key(db_path, sql, params)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] == data_stamp:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self.disk is not None:
+                row = self.disk.execute(
+                    "SELECT file_stamp, result FROM result_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row and row[0] == repr(file_stamp):
+                    self.disk.execute("UPDATE result_cache SET last_used = ? WHERE cache_key = ?", (time.time(), key))
+                    self.disk.commit()
+                    result = QueryResult.from_dict(json.loads(row[1]))
+                    self._put_memory(key, data_stamp, result)
+                    self.hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put(self, db_path: str, sql: str, data_stamp: tuple, file_stamp: tuple, result: QueryResult,
+            params: Optional[dict] = None):
+        """Stores a query result in both tiers"""
+        key = self.make_key(db_path, sql, params)
+
+        with self._lock:
+            self._put_memory(key, data_stamp, result)
+
+            if self.disk is not None:
+                self.disk.execute(
+                    "INSERT OR REPLACE INTO result_cache (cache_key, file_stamp, result, last_used) VALUES (?, ?, ?, ?)",
+                    (key, repr(file_stamp), json.dumps(result.to_dict()), time.time())
+                )
+                self.disk.execute(
+                    "DELETE FROM result_cache WHERE cache_key IN ("
+                    "SELECT cache_key FROM result_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+                self.disk.commit()
+
+    def _put_memory(self, key: str, data_stamp: tuple, result: QueryResult):
+        """Inserts into the memory tier, evicting the least recently used entry if full"""
+        self._memory[key] = (data_stamp, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Removes every cached result from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self.disk is not None:
+                self.disk.execute("DELETE FROM result_cache")
+                self.disk.commit()
+
+    def stats(self) -> dict:
+        """Returns entry count and hit/miss counters"""
+        with self._lock:
+            return {"entries": len(self._memory), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """Closes the on-disk tier"""
+        with self._lock:
+            if self.disk is not None:
+                self.disk.close()
+                self.disk = None
@@ -0,0 +1,228 @@
+import sqlite3
+import time
+from typing import Dict, List
+
+# Summary table advertised in the schema prompt (see ROLLUP_RULES in sqlite_manager)
+ROLLUP_TABLE = "company_month_rollup"
+
+# Calendar month of a date column, 'YYYY-MM'; undated rows are grouped under 'unknown'
+_MONTH = "COALESCE(substr({date}, 1, 7), 'unknown')"
+
+CREATE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    company_id INTEGER NOT NULL REFERENCES company(company_id),
+    month TEXT NOT NULL,
+    revenue REAL NOT NULL DEFAULT 0,
+    expenses REAL NOT NULL DEFAULT 0,
+    payroll REAL NOT NULL DEFAULT 0,
+    profit REAL GENERATED ALWAYS AS (revenue - expenses) VIRTUAL,
+    PRIMARY KEY (company_id, month)
+) WITHOUT ROWID
+"""
+
+# Each measure's contributions as (company_id, month, amount) for one changed source row.
+# {row} is NEW or OLD and {sign} is + or -. Revenue follows the business rules: payments
+# are attributed to the company of their invoice.
+_CONTRIBUTIONS = {
+    "payment": ("revenue", f"""
+        SELECT i.company_id, {_MONTH.format(date="{row}.payment_date")}, {{sign}}COALESCE({{row}}.amount, 0)
+        FROM invoice i WHERE i.invoice_id = {{row}}.invoice_id AND i.company_id IS NOT NULL"""),
+    "expense": ("expenses", f"""
+        SELECT {{row}}.company_id, {_MONTH.format(date="{row}.expense_date")}, {{sign}}COALESCE({{row}}.amount, 0)
+        WHERE {{row}}.company_id IS NOT NULL"""),
+    "payroll": ("payroll", f"""
+        SELECT {{row}}.company_id, {_MONTH.format(date="pp.pay_period_end")}, {{sign}}COALESCE({{row}}.gross_pay, 0)
+        FROM pay_period pp WHERE pp.pay_period_id = {{row}}.pay_period_id AND {{row}}.company_id IS NOT NULL"""),
+    # Changing an invoice's company moves its payments; a pay period's end date moves its payroll
+    "invoice": ("revenue", f"""
+        SELECT {{row}}.company_id, {_MONTH.format(date="p.payment_date")}, {{sign}}SUM(COALESCE(p.amount, 0))
+        FROM payment p WHERE p.invoice_id = {{row}}.invoice_id AND {{row}}.company_id IS NOT NULL
+        GROUP BY 2"""),
+    "pay_period": ("payroll", f"""
+        SELECT pr.company_id, {_MONTH.format(date="{row}.pay_period_end")}, {{sign}}SUM(COALESCE(pr.gross_pay, 0))
+        FROM payroll pr WHERE pr.pay_period_id = {{row}}.pay_period_id AND pr.company_id IS NOT NULL
+        GROUP BY pr.company_id"""),
+}
+
+# Only these columns of the parent tables affect the rollup
+_UPDATE_COLUMNS = {
+    "invoice": "invoice_id, company_id",
+    "pay_period": "pay_period_id, pay_period_end",
+}
+
+# Full rebuild: the same contributions, aggregated over every row
+_REFRESH = {
+    "revenue": f"""
+        SELECT i.company_id, {_MONTH.format(date="p.payment_date")}, SUM(COALESCE(p.amount, 0))
+        FROM payment p JOIN invoice i ON p.invoice_id = i.invoice_id
+        WHERE i.company_id IS NOT NULL GROUP BY 1, 2""",
+    "expenses": f"""
+        SELECT e.company_id, {_MONTH.format(date="e.expense_date")}, SUM(COALESCE(e.amount, 0))
+        FROM expense e WHERE e.company_id IS NOT NULL GROUP BY 1, 2""",
+    "payroll": f"""
+        SELECT pr.company_id, {_MONTH.format(date="pp.pay_period_end")}, SUM(COALESCE(pr.gross_pay, 0))
+        FROM payroll pr JOIN pay_period pp ON pr.pay_period_id = pp.pay_period_id
+        WHERE pr.company_id IS NOT NULL GROUP BY 1, 2""",
+}
+
+
+def _upsert(measure: str, select: str) -> str:
+    """Adds the selected (company_id, month, amount) rows to a measure"""
+    return (f"INSERT INTO {ROLLUP_TABLE} (company_id, month, {measure}) {select.strip()} "
+            f"ON CONFLICT (company_id, month) DO UPDATE SET {measure} = {measure} + excluded.{measure};")
+
+
+def trigger_statements() -> List[str]:
+    """CREATE TRIGGER statements that keep the rollup current on every insert, update and delete"""
+    statements = []
+    for table, (measure, select) in _CONTRIBUTIONS.items():
+        add = _upsert(measure, select.format(row="NEW", sign=""))
+        remove = _upsert(measure, select.format(row="OLD", sign="-"))
+        update_of = f" OF {_UPDATE_COLUMNS[table]}" if table in _UPDATE_COLUMNS else ""
+
+        for event, body in (("INSERT", add), ("DELETE", remove), (f"UPDATE{update_of}", remove + "\n    " + add)):
+            name = f"{ROLLUP_TABLE}_{table}_{event.split()[0].lower()}"
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}\nBEGIN\n    {body}\nEND"
+            )
+    return statements
+
+
+def trigger_names() -> List[str]:
+    """Names of the triggers created by trigger_statements()"""
+    return [f"{ROLLUP_TABLE}_{table}_{event}" for table in _CONTRIBUTIONS for event in ("insert", "delete", "update")]
+
+
+class RollupManager:
+    """
+    Maintains precomputed per-company, per-month financial summaries
+
+    company_month_rollup holds revenue (payments, attributed through their invoice),
+    expenses, payroll (gross pay, by pay period end) and profit (revenue - expenses)
+    for every company and calendar month. Triggers on the source tables apply each
+    change incrementally; refresh() rebuilds the table from scratch, e.g. after bulk
+    loads with the triggers dropped or to clear floating-point drift.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the manager
+
+        Args:
+            db_path: Database to maintain (opened read-write for each operation)
+        """
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        try:
+            return sqlite3.connect(self.db_path, isolation_level=None)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to open database at {self.db_path}: {e}")
+
+    def create(self, triggers: bool = True) -> Dict[str, float]:
+        """
+        Creates the rollup table (and triggers) and fills it
+
+        Args:
+            triggers: Install triggers for incremental maintenance; without them the
+                table only changes when refresh() is called
+
+        Returns:
+            Statistics of the initial refresh (see refresh())
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(CREATE_TABLE)
+            if triggers:
+                for statement in trigger_statements():
+                    connection.execute(statement)
+            stats = self._refresh(connection)
+            connection.execute("COMMIT")
+            return stats
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise RuntimeError(f"Failed to create rollups: {e}")
+        finally:
+            connection.close()
+
+    def refresh(self) -> Dict[str, float]:
+        """
+        Rebuilds the rollup table from the source tables in one transaction
+
+        Returns:
+            {"rows": rollup rows written, "seconds": rebuild time}
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            stats = self._refresh(connection)
+            connection.execute("COMMIT")
+            return stats
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise RuntimeError(f"Failed to refresh rollups: {e}")
+        finally:
+            connection.close()
+
+    def drop(self):
+        """Removes the rollup table and its triggers"""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for name in trigger_names():
+                connection.execute(f"DROP TRIGGER IF EXISTS {name}")
+            connection.execute(f"DROP TABLE IF EXISTS {ROLLUP_TABLE}")
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise RuntimeError(f"Failed to drop rollups: {e}")
+        finally:
+            connection.close()
+
+    def verify(self, tolerance: float = 0.01) -> List[str]:
+        """
+        Compares the rollup with a fresh aggregation of the source tables
+
+        Args:
+            tolerance: Largest absolute difference accepted per value
+
+        Returns:
+            One line per (company, month, measure) that differs; empty if consistent
+        """
+        connection = self._connect()
+        try:
+            stored = {
+                (company_id, month): (revenue, expenses, payroll)
+                for company_id, month, revenue, expenses, payroll in connection.execute(
+                    f"SELECT company_id, month, revenue, expenses, payroll FROM {ROLLUP_TABLE}"
+                )
+            }
+            expected: Dict[tuple, List[float]] = {}
+            for index, measure in enumerate(("revenue", "expenses", "payroll")):
+                for company_id, month, amount in connection.execute(_REFRESH[measure]):
+                    expected.setdefault((company_id, month), [0.0, 0.0, 0.0])[index] = amount
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to verify rollups: {e}")
+        finally:
+            connection.close()
+
+        differences = []
+        for key in sorted(set(stored) | set(expected), key=lambda key: (key[0], key[1])):
+            actual = stored.get(key, (0.0, 0.0, 0.0))
+            wanted = expected.get(key, [0.0, 0.0, 0.0])
+            for measure, have, want in zip(("revenue", "expenses", "payroll"), actual, wanted):
+                if abs(have - want) > tolerance:
+                    differences.append(f"company {key[0]}, {key[1]}, {measure}: {have:.2f} stored, {want:.2f} expected")
+        return differences
+
+    def _refresh(self, connection: sqlite3.Connection) -> Dict[str, float]:
+        started = time.perf_counter()
+        connection.execute(f"DELETE FROM {ROLLUP_TABLE}")
+        for measure, select in _REFRESH.items():
+            connection.execute(_upsert(measure, select))
+        rows = connection.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLE}").fetchone()[0]
+        return {"rows": rows, "seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,166 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+from example_store import tokenize
+from sqlite_manager import BUSINESS_CONTEXT, BUSINESS_TERMS, SQLiteManager
+
+# Weight of a question term matching each part of a table's description
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_NAME_WEIGHT = 1.0
+NOTE_WEIGHT = 0.5
+BUSINESS_TERM_WEIGHT = 3.0
+
+
+class SchemaLinker:
+    """
+    Selects the tables relevant to a question so only they are sent in the prompt
+
+    Tables are indexed by the words in their name, their column names and their
+    business context note, weighted by how rare each word is across tables. The
+    best-matching tables are then connected through the foreign-key graph so the
+    join path between them is included too. When nothing matches well, or when the
+    selection would cover most of the schema anyway, linking gives up and the caller
+    should fall back to the full schema.
+    """
+
+    def __init__(self, min_score: float = 2.0, max_seed_tables: int = 6, max_fraction: float = 0.6):
+        """
+        Initialize the linker
+
+        Args:
+            min_score: Minimum relevance score for a table to be selected directly
+            max_seed_tables: Maximum number of directly selected tables (join-path tables come on top)
+            max_fraction: Give up if the selection covers more than this fraction of all tables
+        """
+        self.min_score = min_score
+        self.max_seed_tables = max_seed_tables
+        self.max_fraction = max_fraction
+        self._schema_hash: Optional[str] = None
+        self._term_weights: Dict[str, Dict[str, float]] = {}
+        self._idf: Dict[str, float] = {}
+        self._neighbors: Dict[str, Set[str]] = {}
+        self._tables: List[str] = []
+        self._lock = threading.Lock()
+
+    def link(self, question: str, db_manager: SQLiteManager) -> Optional[List[str]]:
+        """
+        Picks the tables needed to answer a question
+
+        Args:
+            question: Natural language question
+            db_manager: Open database manager whose catalog is indexed
+
+        Returns:
+            Table names (relevant tables plus the tables on their join paths), or None
+            when confidence is too low and the full schema should be used
+        """
+        catalog = db_manager.get_catalog()
+
+        with self._lock:
+            if catalog["schema_hash"] != self._schema_hash:
+                self._build_index(catalog)
+
+            scores = self._score(question)
+            seeds = [table for table, score in sorted(scores.items(), key=lambda item: -item[1])
+                     if score >= self.min_score][:self.max_seed_tables]
+            if not seeds:
+                return None
+
+            selected = self._connect(seeds, scores)
+            if len(selected) > self.max_fraction * len(self._tables):
+                return None
+
+            return [table for table in self._tables if table in selected]
+
+    def _build_index(self, catalog: Dict):
+        """Indexes table names, column names, notes and the foreign-key graph"""
+        tables = catalog["tables"]
+        self._tables = list(tables)
+        self._term_weights = {}
+
+        for table, columns in tables.items():
+            weights: Dict[str, float] = {}
+
+            def add(terms, weight):
+                for term in terms:
+                    weights[term] = max(weights.get(term, 0.0), weight)
+
+            add(tokenize(BUSINESS_CONTEXT.get(table, "")), NOTE_WEIGHT)
+            add(tokenize(" ".join(column.replace("_", " ") for column, _ in columns)), COLUMN_NAME_WEIGHT)
+            add(tokenize(table.replace("_", " ")) + [table.lower()], TABLE_NAME_WEIGHT)
+            self._term_weights[table] = weights
+
+        document_frequency: Dict[str, int] = {}
+        for weights in self._term_weights.values():
+            for term in weights:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self._idf = {term: math.log(1 + len(tables) / count) for term, count in document_frequency.items()}
+
+        self._neighbors = {table: set() for table in tables}
+        for table, _, ref_table, _ in catalog["foreign_keys"]:
+            if table in self._neighbors and ref_table in self._neighbors:
+                self._neighbors[table].add(ref_table)
+                self._neighbors[ref_table].add(table)
+
+        self._schema_hash = catalog["schema_hash"]
+
+    def _score(self, question: str) -> Dict[str, float]:
+        """Scores every table against the question's terms"""
+        terms = set(tokenize(question))
+        scores: Dict[str, float] = {}
+
+        for table, weights in self._term_weights.items():
+            score = sum(weights[term] * self._idf[term] for term in terms if term in weights)
+            if score:
+                scores[table] = score
+
+        for term in terms:
+            for table in BUSINESS_TERMS.get(term, []):
+                if table in self._term_weights:
+                    scores[table] = scores.get(table, 0.0) + BUSINESS_TERM_WEIGHT
+
+        return scores
+
+    def _connect(self, seeds: List[str], scores: Optional[Dict[str, float]] = None) -> Set[str]:
+        """
+        Joins the seed tables with shortest foreign-key paths (a greedy Steiner tree)
+
+        Among equally short paths, the one through higher-scoring tables wins (then
+        alphabetical order), so the choice does not depend on set iteration order.
+        """
+        scores = scores or {}
+
+        def ranked(tables):
+            return sorted(tables, key=lambda table: (-scores.get(table, 0.0), table))
+
+        selected = {seeds[0]}
+
+        for seed in seeds[1:]:
+            if seed in selected:
+                continue
+
+            # Breadth-first search from the current selection towards the next seed
+            previous = {table: None for table in selected}
+            queue = deque(ranked(selected))
+            while queue:
+                table = queue.popleft()
+                if table == seed:
+                    break
+                for neighbor in ranked(self._neighbors.get(table, ())):
+                    if neighbor not in previous:
+                        previous[neighbor] = table
+                        queue.append(neighbor)
+
+            if seed not in previous:
+                # Not reachable through foreign keys; include it on its own
+                selected.add(seed)
+                continue
+
+            table = seed
+            while table is not None and table not in selected:
+                selected.add(table)
+                table = previous[table]
+
+        return selected
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple, Union
+
+from openai_client import OpenAIError
+from query_guard import QueryRejectedError, QueryTimeoutError
+from query_processor import QueryProcessor
+from shard_manager import ShardMergeError
+from sql_cache import SQLCache
+from sql_validator import SQLValidationError
+from sqlite_manager import QueryExecutionError
+
+MAX_BODY_BYTES = 1024 * 1024
+HEADER_TIMEOUT_SECONDS = 10
+
+# Failures caused by the question: no valid SQL could be generated for it, or the SQL could not
+# run (rejected, timed out, failed in SQLite or not combinable across shards)
+QUESTION_ERRORS = (SQLValidationError, QueryExecutionError, QueryRejectedError, QueryTimeoutError, ShardMergeError)
+
+
+class ServerBusyError(Exception):
+    """Raised when the server is at its pending-request limit"""
+
+
+class ChatServer:
+    """
+    Minimal asyncio HTTP/JSON front end for QueryProcessor
+
+    Endpoints:
+        POST /query   {"question": "..."} -> {"question", "sql", "columns", "rows", "answer", ...}
+        GET  /health  -> {"status": "ok", "in_flight": N, "pending": N}
+        GET  /metrics -> processor metrics in the Prometheus text format
+
+    LLM calls and SQLite execution run on thread pools so the event loop stays
+    responsive. Identical questions that arrive while one is already in flight
+    share a single upstream pipeline run. At most max_concurrency pipelines run at
+    once; beyond max_pending waiting requests, new ones get 503 with Retry-After.
+    """
+
+    def __init__(self, processor: QueryProcessor, host: str = "127.0.0.1", port: int = 8080,
+                 max_concurrency: int = 8, max_pending: int = 64):
+        """
+        Initialize the server
+
+        Args:
+            processor: QueryProcessor whose database manager is safe to use from several threads
+            host: Interface to listen on
+            port: TCP port to listen on
+            max_concurrency: Maximum number of questions processed at the same time
+            max_pending: Maximum number of distinct questions admitted (running plus waiting)
+        """
+        self.processor = processor
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.llm_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="serve-llm")
+        self.db_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="serve-db")
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._running = 0
+
+    def serve_forever(self):
+        """Runs the server until interrupted"""
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self.llm_executor.shutdown(wait=False)
+            self.db_executor.shutdown(wait=False)
+
+    async def _serve(self):
+        """Starts listening and serves connections"""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Serving on {addresses} (POST /query, GET /health, GET /metrics)", file=sys.stderr)
+
+        async with server:
+            await server.serve_forever()
+
+    async def answer(self, question: str) -> dict:
+        """
+        Answers a question, coalescing it with an identical in-flight question if there is one
+
+        Raises:
+            ServerBusyError: If max_pending distinct questions are already admitted
+        """
+        key = SQLCache.normalize_question(question)
+
+        future = self._in_flight.get(key)
+        if future is None:
+            if len(self._in_flight) >= self.max_pending:
+                raise ServerBusyError("Too many pending questions")
+
+            future = asyncio.ensure_future(self._run_pipeline(question))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shield so one client disconnecting does not cancel the shared run
+        return await asyncio.shield(future)
+
+    def _validate(self, sql_query: str) -> str:
+        """Compiles generated SQL on a database thread (called from an LLM thread)"""
+        return self.db_executor.submit(self.processor.db_manager.validate_sql, sql_query).result()
+
+    async def _run_pipeline(self, question: str) -> dict:
+        """Runs schema lookup, SQL generation, execution and formatting off the event loop"""
+        loop = asyncio.get_running_loop()
+
+        async with self._semaphore:
+            self._running += 1
+            try:
+                schema, schema_hash = await loop.run_in_executor(
+                    self.db_executor, self.processor.prompt_schema, question
+                )
+                match = self.processor.match_intent(question)
+                if match is not None:
+                    sql_query, cached = match.display_sql, False
+                    result = await loop.run_in_executor(
+                        self.db_executor, self.processor.execute_sql, question, match.sql, schema_hash,
+                        None, match.params
+                    )
+                else:
+                    sql_query, cached = await loop.run_in_executor(
+                        self.llm_executor, self.processor.generate_sql, question, schema, schema_hash, self._validate
+                    )
+                    result = await loop.run_in_executor(
+                        self.db_executor, self.processor.execute_sql, question, sql_query, schema_hash
+                    )
+                answer = await loop.run_in_executor(
+                    self.llm_executor, self.processor.format_answer, question, sql_query, result
+                )
+            finally:
+                self._running -= 1
+
+        return {
+            "question": question,
+            "sql": sql_query,
+            "sql_cached": cached,
+            "intent": match.template.pattern if match is not None else None,
+            "columns": result.columns,
+            "rows": result.to_dict()["rows"],
+            "total_count": result.total_count,
+            "truncated": result.truncated,
+            "answer": answer,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Handles one HTTP request per connection"""
+        try:
+            try:
+                method, path, headers, body = await asyncio.wait_for(
+                    self._read_request(reader), HEADER_TIMEOUT_SECONDS
+                )
+            except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                await self._send_response(writer, HTTPStatus.BAD_REQUEST, {"error": f"Malformed request: {e}"})
+                return
+
+            status, payload, extra_headers = await self._route(method, path, body)
+            await self._send_response(writer, status, payload, extra_headers)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, Union[dict, str], dict]:
+        """Dispatches a request to the matching endpoint"""
+        if path == "/metrics":
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use GET"}, {"Allow": "GET"}
+            return HTTPStatus.OK, self.processor.metrics.to_prometheus(), {}
+
+        if path == "/health":
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use GET"}, {"Allow": "GET"}
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "in_flight": self._running,
+                "pending": len(self._in_flight),
+            }, {}
+
+        if path != "/query":
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {path}"}, {}
+
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST"}, {"Allow": "POST"}
+
+        try:
+            request = json.loads(body.decode("utf-8") or "{}")
+            question = request.get("question", "").strip() if isinstance(request, dict) else ""
+        except (ValueError, UnicodeDecodeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"}, {}
+
+        if not question:
+            return HTTPStatus.BAD_REQUEST, {"error": "Missing 'question'"}, {}
+
+        try:
+            return HTTPStatus.OK, await self.answer(question), {}
+        except ServerBusyError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}, {"Retry-After": "1"}
+        except QUESTION_ERRORS as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {"question": question, "error": str(e)}, {}
+        except OpenAIError as e:
+            return HTTPStatus.BAD_GATEWAY, {"question": question, "error": str(e)}, {}
+        except Exception as e:
+            print(f"Error answering {question!r}: {type(e).__name__}: {e}", file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"question": question, "error": "Internal server error"}, {}
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        """Reads and parses an HTTP/1.x request"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ValueError(f"bad request line {request_line!r}")
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _send_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: Union[dict, str],
+                             extra_headers: Optional[dict] = None):
+        """Writes a JSON response (or a plain-text one for string payloads) and flushes it"""
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        for name, value in (extra_headers or {}).items():
+            lines.append(f"{name}: {value}")
+
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
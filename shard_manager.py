@@ -0,0 +1,914 @@
+import glob
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from exporter import DEFAULT_BATCH_SIZE
+from query_result import QueryResult
+from sqlite_manager import QueryExecutionError, SQLiteManager
+
+# Rows each shard may return to the merge step (groups of an aggregate, or rows to concatenate)
+DEFAULT_MAX_PARTIAL_ROWS = 10000
+
+DEFAULT_SHARD_WORKERS = 8
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*'|[xX]'[0-9A-Fa-f]*')
+  | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+  | (?P<param>[:@$][A-Za-z_][A-Za-z0-9_]*|\?\d*)
+  | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|.)
+""", re.VERBOSE | re.DOTALL)
+
+# Aggregates whose per-shard partial results can be recombined
+_AGGREGATES = {"COUNT", "SUM", "TOTAL", "AVG", "MIN", "MAX", "GROUP_CONCAT"}
+
+# Aggregates with no exact recombination from partial results
+_UNMERGEABLE_AGGREGATES = {"JSON_GROUP_ARRAY", "JSON_GROUP_OBJECT", "STRING_AGG"}
+
+# Words that are not column references when they appear in an expression
+_KEYWORDS = {
+    "AND", "AS", "ASC", "BETWEEN", "BINARY", "BLOB", "BY", "CASE", "CAST", "COLLATE", "CURRENT_DATE",
+    "CURRENT_TIME", "CURRENT_TIMESTAMP", "DESC", "DISTINCT", "ELSE", "END", "ESCAPE", "EXISTS", "FALSE",
+    "FIRST", "FLOAT", "GLOB", "IN", "INT", "INTEGER", "IS", "ISNULL", "LAST", "LIKE", "MATCH", "NOCASE",
+    "NOT", "NOTNULL", "NULL", "NULLS", "NUMERIC", "OR", "REAL", "REGEXP", "RTRIM", "TEXT", "THEN", "TRUE",
+    "VARCHAR", "WHEN",
+}
+
+_CLAUSES = ("FROM", "WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT")
+_COMPOUND = {"UNION", "INTERSECT", "EXCEPT"}
+_DIRECTION = re.compile(r"\s+(?:COLLATE\s+\w+\s*)?(?:ASC|DESC)?(?:\s+NULLS\s+(?:FIRST|LAST))?\s*$", re.IGNORECASE)
+
+
+class ShardMergeError(RuntimeError):
+    """Raised when a query's per-shard results cannot be combined into the result of the whole"""
+
+
+@dataclass
+class _Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+
+def _tokenize(sql: str) -> List[_Token]:
+    """Splits SQL into tokens (comments and whitespace dropped), recording parenthesis depth"""
+    tokens = []
+    depth = 0
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        text = match.group()
+        if text == ")":
+            depth -= 1
+        tokens.append(_Token(kind, text, match.start(), match.end(), depth))
+        if text == "(":
+            depth += 1
+    return tokens
+
+
+def _split_top_level(tokens: List[_Token], depth: int) -> List[List[_Token]]:
+    """Splits tokens at the commas of the given depth"""
+    parts, current = [], []
+    for token in tokens:
+        if token.text == "," and token.depth == depth:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _name(token: _Token) -> Optional[str]:
+    """Lowercased identifier a word or quoted token names (None for other tokens)"""
+    if token.kind == "word":
+        return token.text.lower()
+    if token.kind == "quoted":
+        return token.text[1:-1].lower()
+    return None
+
+
+def _span(sql: str, tokens: List[_Token]) -> str:
+    return sql[tokens[0].start:tokens[-1].end] if tokens else ""
+
+
+def _normalized(sql: str, tokens: List[_Token]) -> str:
+    return " ".join(token.upper if token.kind == "word" else token.text for token in tokens)
+
+
+@dataclass
+class ShardPlan:
+    """
+    How to run a query on every shard and combine the results
+
+    shard_sql runs on each shard; its rows are loaded into a table named partials
+    (columns __p0, __p1, ...) and merge_sql computes the final result from it.
+    """
+
+    shard_sql: str
+    merge_sql: str
+    partial_columns: int
+    aggregate: bool
+    # Whether the combined row count is the sum of the shard row counts
+    additive_count: bool = False
+    output_names: List[str] = field(default_factory=list)
+    # Whether the query only reads replicated tables and runs on the first shard alone
+    single_shard: bool = False
+
+
+class _Planner:
+    """Builds a ShardPlan for one query (see plan_query())"""
+
+    def __init__(self, sql: str, sharded_tables: Optional[Set[str]] = None):
+        self.sql = sql.strip().rstrip(";").strip()
+        self.tokens = _tokenize(self.sql)
+        # Lowercased names holding different rows on each shard (None: every table and CTE)
+        self.sharded_tables = sharded_tables
+        self.partials: List[str] = []
+        self._partial_index: Dict[str, int] = {}
+        self._clause_starts: Dict[str, int] = {}
+        # Whether scalar aggregate subqueries are merged (only in SELECTs without FROM)
+        self._merge_subqueries = False
+
+    def partial(self, expression: str, key: Optional[str] = None) -> str:
+        """Adds (or reuses) a shard output column and returns its name in the merge query"""
+        key = key or expression
+        if key not in self._partial_index:
+            self._partial_index[key] = len(self.partials)
+            self.partials.append(expression)
+        return f"__p{self._partial_index[key]}"
+
+    def plan(self, output_names: List[str]) -> ShardPlan:
+        top = [token for token in self.tokens if token.depth == 0]
+        select_index = next((i for i, token in enumerate(self.tokens)
+                             if token.depth == 0 and token.upper in ("SELECT", "VALUES")), None)
+        if select_index is None or self.tokens[select_index].upper == "VALUES":
+            raise ShardMergeError("only SELECT queries can be run across shards")
+
+        if not self._reads_sharded(self.tokens):
+            return self._plan_single_shard(output_names)
+
+        # CTE bodies, derived tables and subqueries run unchanged on every shard
+        nested = self._nested_queries()
+        if any(token.upper in _COMPOUND for token in top):
+            self._check_nested(nested)
+            return self._plan_compound(output_names)
+
+        clauses = self._clauses(select_index)
+        items = _split_top_level(clauses["SELECT"], 0)
+        distinct = False
+        if items and items[0] and items[0][0].upper in ("DISTINCT", "ALL"):
+            distinct = items[0][0].upper == "DISTINCT"
+            items[0] = items[0][1:]
+
+        if any(token.upper == "OVER" for token in self._outside_subqueries(clauses["SELECT"])):
+            raise ShardMergeError("window functions cannot be combined across shards")
+
+        has_aggregate = any(self._aggregate_calls(item) for item in items) or bool(clauses.get("GROUP"))
+        prefix = self.sql[:self.tokens[select_index].start]
+        if has_aggregate:
+            self._check_nested(nested)
+            return self._plan_aggregate(prefix, clauses, items, distinct, output_names)
+
+        has_subquery = any(token.text == "(" and following.upper in ("SELECT", "WITH")
+                           for token, following in zip(clauses["SELECT"], clauses["SELECT"][1:]))
+        if "FROM" not in clauses and has_subquery:
+            # SELECT (SELECT SUM(...) FROM ...) - (SELECT SUM(...) FROM ...): merge each subquery's
+            # aggregate (scalar_aggregate() checks what they contain), or fall back to one row
+            # per shard if they are not all aggregates
+            select_start = self.tokens[select_index].start
+            select_end = min(self._clause_starts.values(), default=len(self.sql))
+            self._check_nested([(open_index, close) for open_index, close in nested
+                                if not select_start < self.tokens[open_index].start < select_end])
+            self._merge_subqueries = True
+            try:
+                return self._plan_aggregate(prefix, clauses, items, distinct, output_names)
+            except ShardMergeError:
+                self.partials, self._partial_index, self._merge_subqueries = [], {}, False
+        self._check_nested(nested)
+        return self._plan_concatenate(clauses, distinct, output_names)
+
+    def scalar_aggregate(self) -> Tuple[str, List[str], str]:
+        """
+        Plans a scalar subquery such as (SELECT COALESCE(SUM(x), 0) FROM t WHERE ...)
+
+        Returns:
+            (merge expression over __p0, __p1, ..., the partial expressions, the
+            subquery text from FROM on)
+        """
+        select_index = next((i for i, token in enumerate(self.tokens) if token.depth == 0), None)
+        if select_index is None or self.tokens[select_index].upper != "SELECT" \
+                or any(token.depth == 0 and token.upper in _COMPOUND for token in self.tokens):
+            raise ShardMergeError("only plain aggregate subqueries can be combined across shards")
+
+        clauses = self._clauses(select_index)
+        items = _split_top_level(clauses["SELECT"], 0)
+        if len(items) != 1 or any(clause in clauses for clause in ("GROUP", "HAVING", "WINDOW")):
+            raise ShardMergeError("only single-value aggregate subqueries can be combined across shards")
+
+        expression, _ = self._strip_alias(items[0])
+        if not self._aggregate_calls(expression):
+            raise ShardMergeError("subqueries without aggregates cannot be combined across shards")
+        self._check_nested(self._nested_queries())
+        merged = self._rewrite(expression)
+        tail = self.sql[self._clause_starts["FROM"]:] if "FROM" in clauses else ""
+        return merged, self.partials, tail
+
+    def _clauses(self, select_index: int) -> Dict[str, List[_Token]]:
+        """Splits the main SELECT into its clauses, by keyword at depth 0"""
+        clauses: Dict[str, List[_Token]] = {"SELECT": []}
+        current = "SELECT"
+        for token in self.tokens[select_index + 1:]:
+            if token.depth == 0 and token.kind == "word" and token.upper in _CLAUSES:
+                current = token.upper
+                clauses[current] = []
+                self._clause_starts[current] = token.start
+                continue
+            if token.depth == 0 and token.kind == "word" and token.upper == "BY" and current in ("GROUP", "ORDER") \
+                    and not clauses[current]:
+                continue
+            clauses[current].append(token)
+        return clauses
+
+    def _nested_queries(self) -> List[Tuple[int, int]]:
+        """(open, close) token indexes of the outermost parenthesized queries: CTE bodies, derived tables, subqueries"""
+        ranges = []
+        index = 0
+        while index < len(self.tokens) - 1:
+            if self.tokens[index].text == "(" and self.tokens[index + 1].upper in ("SELECT", "WITH", "VALUES"):
+                close = self._closing(self.tokens, index)
+                ranges.append((index, close))
+                index = close
+            index += 1
+        return ranges
+
+    def _reads_sharded(self, tokens: List[_Token]) -> bool:
+        """Whether tokens may read a sharded table, directly or through a CTE built on one"""
+        if self.sharded_tables is None:
+            return True
+        sharded = set(self.sharded_tables)
+        # WITH name AS (...): a CTE is sharded if its body reads a sharded table
+        for index, token in enumerate(self.tokens[:-2]):
+            if token.kind in ("word", "quoted") and self.tokens[index + 1].upper == "AS" \
+                    and self.tokens[index + 2].text == "(" and self.tokens[index + 2].depth == token.depth:
+                body = self.tokens[index + 3:self._closing(self.tokens, index + 2)]
+                if any(_name(other) in sharded for other in body):
+                    sharded.add(_name(token))
+        return any(_name(token) in sharded for token in tokens)
+
+    def _plan_single_shard(self, output_names: List[str]) -> ShardPlan:
+        """Queries reading only replicated tables: run unchanged on one shard, rows passed through"""
+        merge_sql = "SELECT " + ", ".join(
+            f'__p{i} AS "{name.replace(chr(34), chr(34) * 2)}"' for i, name in enumerate(output_names)
+        ) + " FROM partials"
+        return ShardPlan(self.sql, merge_sql, len(output_names), aggregate=False, additive_count=True,
+                         output_names=output_names, single_shard=True)
+
+    def _check_nested(self, ranges: List[Tuple[int, int]]):
+        """
+        Rejects nested queries whose result depends on rows in other shards
+
+        A nested query runs separately on every shard, so it only sees that shard's
+        rows. Filters and joins are fine as long as related rows share a shard, but an
+        aggregate, GROUP BY, DISTINCT, UNION, LIMIT or window function would be computed
+        per shard (an AVG per shard, a top 1 per shard) instead of over all the data.
+        """
+        for open_index, close in ranges:
+            tokens = self.tokens[open_index + 1:close]
+            if not self._reads_sharded(tokens):
+                # Replicated tables hold the same rows everywhere, so every shard computes the same answer
+                continue
+            for index, token in enumerate(tokens):
+                following = tokens[index + 1] if index + 1 < len(tokens) else None
+                previous = tokens[index - 1] if index else None
+                problem = None
+                if token.kind != "word":
+                    continue
+                if following is not None and following.text == "(" and (
+                        token.upper in _UNMERGEABLE_AGGREGATES or token.upper in _AGGREGATES and not (
+                        token.upper in ("MIN", "MAX")
+                        and len(_split_top_level(tokens[index + 2:self._closing(tokens, index + 1)],
+                                                 following.depth + 1)) > 1)):
+                    problem = f"{token.text.lower()}()"
+                elif token.upper in ("GROUP", "LIMIT", "OFFSET", "OVER"):
+                    problem = {"GROUP": "GROUP BY", "OVER": "a window function"}.get(token.upper, token.upper)
+                elif token.upper == "DISTINCT" and previous is not None and previous.upper == "SELECT":
+                    problem = "SELECT DISTINCT"
+                elif token.upper == "UNION" and (following is None or following.upper != "ALL"):
+                    problem = "UNION"
+                if problem:
+                    raise ShardMergeError(f"{problem} inside a subquery or CTE cannot be combined across shards")
+
+    @staticmethod
+    def _outside_subqueries(tokens: List[_Token]) -> List[_Token]:
+        """Tokens that are not inside a parenthesized SELECT"""
+        kept = []
+        skip_depth = None
+        for index, token in enumerate(tokens):
+            if skip_depth is not None:
+                if token.text == ")" and token.depth == skip_depth:
+                    skip_depth = None
+                continue
+            if token.text == "(" and index + 1 < len(tokens) and tokens[index + 1].upper in ("SELECT", "WITH"):
+                skip_depth = token.depth
+                continue
+            kept.append(token)
+        return kept
+
+    def _aggregate_calls(self, tokens: List[_Token]) -> List[Tuple[int, int]]:
+        """(start, end) token ranges of aggregate calls outside subqueries, including FILTER clauses"""
+        calls = []
+        outside = self._outside_subqueries(tokens)
+        index = 0
+        while index < len(outside):
+            token = outside[index]
+            following = outside[index + 1] if index + 1 < len(outside) else None
+            if token.kind == "word" and following is not None and following.text == "(":
+                name = token.upper
+                close = self._closing(outside, index + 1)
+                arguments = _split_top_level(outside[index + 2:close], following.depth + 1)
+                if name in _UNMERGEABLE_AGGREGATES:
+                    raise ShardMergeError(f"{name.lower()}() cannot be combined across shards")
+                is_aggregate = name in _AGGREGATES and not (name in ("MIN", "MAX") and len(arguments) > 1)
+                if is_aggregate:
+                    end = close
+                    if end + 2 < len(outside) and outside[end + 1].upper == "FILTER":
+                        end = self._closing(outside, end + 2)
+                    calls.append((index, end))
+                    index = end + 1
+                    continue
+            index += 1
+        return [(tokens.index(outside[start]), tokens.index(outside[end])) for start, end in calls]
+
+    @staticmethod
+    def _closing(tokens: List[_Token], open_index: int) -> int:
+        depth = tokens[open_index].depth
+        for index in range(open_index + 1, len(tokens)):
+            if tokens[index].text == ")" and tokens[index].depth == depth:
+                return index
+        raise ShardMergeError("unbalanced parentheses")
+
+    def _merge_aggregate(self, tokens: List[_Token]) -> str:
+        """Splits one aggregate call into shard partials and returns its merge expression"""
+        name = tokens[0].upper
+        close = self._closing(tokens, 1)
+        inner = tokens[2:close]
+        call = _span(self.sql, tokens)
+        if inner and inner[0].upper == "DISTINCT" and name not in ("MIN", "MAX"):
+            raise ShardMergeError(f"{name.lower()}(DISTINCT ...) cannot be combined across shards")
+
+        key = _normalized(self.sql, tokens)
+        if name == "COUNT":
+            return f"SUM({self.partial(call, key)})"
+        if name in ("SUM", "TOTAL", "MIN", "MAX"):
+            return f"{name}({self.partial(call, key)})"
+        if name == "AVG":
+            filter_clause = " " + _span(self.sql, tokens[close + 1:]) if close + 1 < len(tokens) else ""
+            argument = _span(self.sql, inner)
+            total = self.partial(f"SUM({argument}){filter_clause}", "SUM:" + key)
+            count = self.partial(f"COUNT({argument}){filter_clause}", "COUNT:" + key)
+            return f"(SUM({total}) * 1.0 / NULLIF(SUM({count}), 0))"
+        # GROUP_CONCAT: concatenate the shard strings with the same separator
+        arguments = _split_top_level(inner, tokens[1].depth + 1)
+        separator = _span(self.sql, arguments[1]) if len(arguments) > 1 else "','"
+        return f"GROUP_CONCAT({self.partial(call, key)}, {separator})"
+
+    def _rewrite(self, tokens: List[_Token], aliases: Optional[Dict[str, str]] = None) -> str:
+        """
+        Rewrites an expression over the shard tables into one over the partials table
+
+        Aggregate calls become merges of their partials and column references
+        become partial columns (group keys, or bare columns SQLite takes from the
+        row an aggregate picked). Identifiers naming an output column (aliases,
+        allowed in HAVING and ORDER BY) are replaced with that column's expression.
+        """
+        calls = dict(self._aggregate_calls(tokens))
+        parts = []
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if index in calls:
+                parts.append(self._merge_aggregate(tokens[index:calls[index] + 1]))
+                index = calls[index] + 1
+                continue
+            if token.text == "(" and index + 1 < len(tokens) and tokens[index + 1].upper in ("SELECT", "WITH"):
+                if not self._merge_subqueries:
+                    raise ShardMergeError("subqueries outside aggregates cannot be combined across shards")
+                close = self._closing(tokens, index)
+                subquery = _span(self.sql, tokens[index + 1:close])
+                if not self._reads_sharded(tokens[index + 1:close]):
+                    # Replicated tables only: every shard returns the same value, so take any one
+                    parts.append(f"MAX({self.partial(f'({subquery})')})")
+                    index = close + 1
+                    continue
+                merged, partials, tail = _Planner(subquery, self.sharded_tables).scalar_aggregate()
+                names = [self.partial(f"(SELECT {partial} {tail})") for partial in partials]
+                parts.append("(" + re.sub(r"\b__p(\d+)\b", lambda match: names[int(match.group(1))], merged) + ")")
+                index = close + 1
+                continue
+
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            is_reference = (token.kind == "quoted" or token.kind == "word" and token.upper not in _KEYWORDS) \
+                and not (following is not None and following.text == "(")
+            if is_reference:
+                alias = aliases.get(token.text.strip('"`[]').lower()) if aliases else None
+                if alias is not None and (following is None or following.text != "."):
+                    parts.append(f"({alias})")
+                    index += 1
+                    continue
+
+                # A column, possibly qualified (table.column)
+                end = index
+                while end + 2 < len(tokens) and tokens[end + 1].text == "." and tokens[end + 2].kind in ("word", "quoted"):
+                    end += 2
+                reference = tokens[index:end + 1]
+                parts.append(self.partial(_span(self.sql, reference), _normalized(self.sql, reference)))
+                index = end + 1
+                continue
+            if token.kind == "param":
+                raise ShardMergeError("parameters outside the FROM and WHERE clauses are not supported across shards")
+            parts.append(token.text)
+            index += 1
+        return " ".join(parts)
+
+    def _plan_aggregate(self, prefix: str, clauses: Dict[str, List[_Token]], items: List[List[_Token]],
+                        distinct: bool, output_names: List[str]) -> ShardPlan:
+        merged_items = []
+        expressions = []
+        explicit_aliases = {}
+        for item in items:
+            expression, alias = self._strip_alias(item)
+            expressions.append(_span(self.sql, expression))
+            if alias is not None:
+                explicit_aliases[alias.strip('"`[]').lower()] = expressions[-1]
+            if expression[-1].text == "*" and (len(expression) == 1 or expression[-2].text == "."):
+                raise ShardMergeError("SELECT * cannot be combined with aggregates across shards")
+            merged_items.append(self._rewrite(expression))
+
+        aliases = {name.lower(): merged for name, merged in zip(output_names, merged_items)}
+        group_by = []
+        shard_group_by = []
+        for term in _split_top_level(clauses.get("GROUP", []), 0):
+            position = self._ordinal(term, len(merged_items))
+            group_by.append(merged_items[position] if position is not None else self._rewrite(term, aliases))
+            # The shard select list is replaced by partials, so aliases and ordinals are spelled out
+            name = _span(self.sql, term).strip('"`[]').lower()
+            if position is not None:
+                shard_group_by.append(expressions[position])
+            elif len(term) == 1 and name in explicit_aliases:
+                shard_group_by.append(explicit_aliases[name])
+            else:
+                shard_group_by.append(_span(self.sql, term))
+
+        having = self._rewrite(clauses["HAVING"], aliases) if clauses.get("HAVING") else None
+        order_by = self._order_by(clauses.get("ORDER", []), merged_items, output_names, aliases)
+        limit = self._limit_text(clauses.get("LIMIT", []))
+
+        # The shard query keeps FROM, WHERE and GROUP BY and returns every group's partials
+        shard_clauses = [f"{prefix}SELECT " + ", ".join(f"{partial} AS __p{i}" for i, partial in enumerate(self.partials))]
+        for clause in ("FROM", "WHERE"):
+            if clause in clauses:
+                shard_clauses.append(f"{clause} {_span(self.sql, clauses[clause])}")
+        if shard_group_by:
+            shard_clauses.append("GROUP BY " + ", ".join(shard_group_by))
+
+        merge = ["SELECT " + ("DISTINCT " if distinct else "") + ", ".join(
+            f'{merged} AS "{name.replace(chr(34), chr(34) * 2)}"' for merged, name in zip(merged_items, output_names)
+        ), "FROM partials"]
+        if group_by:
+            merge.append("GROUP BY " + ", ".join(group_by))
+        if having:
+            merge.append(f"HAVING {having}")
+        if order_by:
+            merge.append(f"ORDER BY {order_by}")
+        if limit:
+            merge.append(limit)
+
+        return ShardPlan(" ".join(shard_clauses), " ".join(merge), len(self.partials), aggregate=True,
+                         output_names=output_names)
+
+    def _plan_concatenate(self, clauses: Dict[str, List[_Token]], distinct: bool,
+                          output_names: List[str]) -> ShardPlan:
+        width = len(output_names)
+        columns = [f"__p{i}" for i in range(width)]
+        aliases = {name.lower(): column for name, column in zip(output_names, columns)}
+
+        # ORDER BY terms that are not output columns are computed per row on the shards
+        hidden = []
+        terms = []
+        for term in _split_top_level(clauses.get("ORDER", []), 0):
+            expression, direction = self._split_direction(term)
+            position = self._ordinal(expression, width)
+            name = _span(self.sql, expression).strip('"`[]').lower()
+            if position is not None:
+                terms.append(columns[position] + direction)
+            elif name in aliases:
+                terms.append(aliases[name] + direction)
+            else:
+                hidden.append(_span(self.sql, expression))
+                terms.append(f"__p{width + len(hidden) - 1}{direction}")
+
+        limit = self._limit_text(clauses.get("LIMIT", []))
+        shard_sql = self.sql
+        if hidden:
+            # Append the hidden columns to the select list, just before its first clause
+            insert_at = min(self._clause_starts.values())
+            shard_sql = (self.sql[:insert_at].rstrip() + ", "
+                         + ", ".join(f"{expression} AS __h{i}" for i, expression in enumerate(hidden))
+                         + " " + self.sql[insert_at:])
+        shard_sql = self._shard_limit(shard_sql, clauses.get("LIMIT", []), self._clause_starts.get("LIMIT"))
+
+        merge = ["SELECT " + ("DISTINCT " if distinct else "") + ", ".join(
+            f'{column} AS "{name.replace(chr(34), chr(34) * 2)}"' for column, name in zip(columns, output_names)
+        ), "FROM partials"]
+        if terms:
+            merge.append("ORDER BY " + ", ".join(terms))
+        if limit:
+            merge.append(limit)
+
+        return ShardPlan(shard_sql, " ".join(merge), width + len(hidden), aggregate=False,
+                         additive_count=not distinct and not limit, output_names=output_names)
+
+    def _plan_compound(self, output_names: List[str]) -> ShardPlan:
+        """UNION/INTERSECT/EXCEPT queries: concatenated, ordered and limited again by output column"""
+        if any(self._aggregate_calls(self.tokens)):
+            raise ShardMergeError("compound queries with aggregates cannot be combined across shards")
+        # UNION ALL keeps duplicates, so rows a DISTINCT or GROUP BY member returns from several shards
+        # would all be kept
+        top = [(index, token) for index, token in enumerate(self.tokens) if token.depth == 0]
+        union_all = any(token.upper == "UNION" and self.tokens[index + 1].upper == "ALL" for index, token in top)
+        if union_all and any(token.upper == "GROUP" or token.upper == "DISTINCT" and self.tokens[index - 1].upper == "SELECT"
+                             for index, token in top):
+            raise ShardMergeError("DISTINCT or GROUP BY in a UNION ALL cannot be combined across shards")
+
+        order_index = next((i for i, token in enumerate(self.tokens) if token.depth == 0 and token.upper == "ORDER"), None)
+        limit_index = next((i for i, token in enumerate(self.tokens) if token.depth == 0 and token.upper == "LIMIT"), None)
+        width = len(output_names)
+        columns = [f"__p{i}" for i in range(width)]
+        aliases = {name.lower(): column for name, column in zip(output_names, columns)}
+
+        terms = []
+        if order_index is not None:
+            end = limit_index if limit_index is not None else len(self.tokens)
+            for term in _split_top_level(self.tokens[order_index + 2:end], 0):
+                expression, direction = self._split_direction(term)
+                position = self._ordinal(expression, width)
+                name = _span(self.sql, expression).strip('"`[]').lower()
+                if position is not None:
+                    terms.append(columns[position] + direction)
+                elif name in aliases:
+                    terms.append(aliases[name] + direction)
+                else:
+                    raise ShardMergeError("ORDER BY of a compound query must name output columns")
+
+        limit_tokens = self.tokens[limit_index + 1:] if limit_index is not None else []
+        limit = self._limit_text(limit_tokens)
+        # UNION (unlike UNION ALL) removes duplicates, including those between shards
+        distinct = any(token.upper in _COMPOUND and self.tokens[index + 1].upper != "ALL"
+                       for index, token in enumerate(self.tokens) if token.depth == 0)
+        merge = ["SELECT " + ("DISTINCT " if distinct else "") + ", ".join(
+            f'{column} AS "{name.replace(chr(34), chr(34) * 2)}"' for column, name in zip(columns, output_names)
+        ), "FROM partials"]
+        if terms:
+            merge.append("ORDER BY " + ", ".join(terms))
+        if limit:
+            merge.append(limit)
+        limit_start = self.tokens[limit_index].start if limit_index is not None else None
+        return ShardPlan(self._shard_limit(self.sql, limit_tokens, limit_start), " ".join(merge), width, aggregate=False,
+                         output_names=output_names)
+
+    def _order_by(self, tokens: List[_Token], merged_items: List[str], output_names: List[str],
+                  aliases: Dict[str, str]) -> str:
+        terms = []
+        for term in _split_top_level(tokens, 0):
+            expression, direction = self._split_direction(term)
+            position = self._ordinal(expression, len(merged_items))
+            name = _span(self.sql, expression).strip('"`[]').lower()
+            if position is not None:
+                terms.append(f"{position + 1}{direction}")
+            elif name in aliases and len(expression) == 1:
+                terms.append(f'"{output_names[[n.lower() for n in output_names].index(name)]}"{direction}')
+            else:
+                terms.append(self._rewrite(expression, aliases) + direction)
+        return ", ".join(terms)
+
+    def _split_direction(self, term: List[_Token]) -> Tuple[List[_Token], str]:
+        """Separates ASC/DESC, NULLS FIRST/LAST and COLLATE from an ORDER BY term"""
+        text = _span(self.sql, term)
+        match = _DIRECTION.search(text)
+        suffix = match.group(0) if match and match.group(0).strip() else ""
+        if not suffix:
+            return term, ""
+        cut = term[0].start + len(text) - len(suffix)
+        return [token for token in term if token.end <= cut], " " + suffix.strip()
+
+    @staticmethod
+    def _strip_alias(item: List[_Token]) -> Tuple[List[_Token], Optional[str]]:
+        """Splits "AS alias" or a bare trailing alias ("SUM(x) total") from a select item"""
+        if len(item) >= 3 and item[-2].upper == "AS":
+            return item[:-2], item[-1].text
+        if len(item) >= 2:
+            last, before = item[-1], item[-2]
+            if last.kind in ("word", "quoted") and last.upper not in _KEYWORDS and (
+                    before.text == ")" or before.kind in ("word", "quoted", "number", "string")
+                    and (before.upper not in _KEYWORDS or before.upper == "END")):
+                return item[:-1], last.text
+        return item, None
+
+    @staticmethod
+    def _ordinal(term: List[_Token], width: int) -> Optional[int]:
+        if len(term) == 1 and term[0].kind == "number" and term[0].text.isdigit():
+            position = int(term[0].text) - 1
+            if 0 <= position < width:
+                return position
+        return None
+
+    def _limit_text(self, tokens: List[_Token]) -> Optional[str]:
+        if not tokens:
+            return None
+        if any(token.kind == "param" for token in tokens):
+            raise ShardMergeError("LIMIT must be a number across shards")
+        return "LIMIT " + _span(self.sql, tokens)
+
+    def _shard_limit(self, shard_sql: str, tokens: List[_Token], keyword_start: Optional[int]) -> str:
+        """Each shard returns LIMIT + OFFSET rows without the offset; the merge applies both"""
+        texts = [token.upper for token in tokens]
+        if len(texts) == 1 and texts[0].isdigit():
+            return shard_sql
+        if len(texts) == 3 and texts[0].isdigit() and texts[2].isdigit() and texts[1] in ("OFFSET", ","):
+            limit, offset = (texts[0], texts[2]) if texts[1] == "OFFSET" else (texts[2], texts[0])
+            # The LIMIT clause ends the query, so it is the same suffix of shard_sql
+            head = shard_sql[:len(shard_sql) - (len(self.sql) - keyword_start)]
+            return f"{head.rstrip()} LIMIT {int(limit) + int(offset)}"
+        if not tokens:
+            return shard_sql
+        raise ShardMergeError("LIMIT must be a number across shards")
+
+
+def plan_query(sql: str, output_names: List[str], sharded_tables: Optional[Iterable[str]] = None) -> ShardPlan:
+    """
+    Plans how to run a SELECT on every shard and combine the results
+
+    Aggregates are split into partial aggregates that every shard computes for
+    its own rows (AVG as SUM and COUNT, COUNT summed, MIN of MINs, ...) and the
+    merge query aggregates the partials again per group, then applies HAVING,
+    ORDER BY and LIMIT. Queries without aggregates have their rows concatenated,
+    then ordered and limited again.
+
+    CTEs, derived tables and subqueries run unchanged on every shard, so they may
+    filter and join but not aggregate, group, deduplicate or limit: those would be
+    computed per shard. The exceptions are a SELECT without FROM whose items are
+    scalar aggregate subqueries, which are merged like top-level aggregates, and
+    nested queries reading only replicated tables, which every shard answers alike.
+    Queries reading only replicated tables run on the first shard alone.
+
+    Args:
+        sql: SELECT statement to run on every shard
+        output_names: Column names of the query's result
+        sharded_tables: Tables holding different rows on each shard; all other
+            names are replicated tables (None: every table is sharded)
+
+    Returns:
+        ShardPlan
+
+    Raises:
+        ShardMergeError: If the result cannot be combined exactly (COUNT(DISTINCT),
+            window functions, aggregates, GROUP BY, DISTINCT or LIMIT inside a CTE or
+            subquery, ...)
+    """
+    sharded = {name.lower() for name in sharded_tables} if sharded_tables is not None else None
+    return _Planner(sql, sharded).plan(output_names)
+
+
+def expand_shard_paths(patterns: List[str]) -> List[str]:
+    """
+    Expands shard arguments (paths or glob patterns) into a sorted list of files
+
+    Raises:
+        RuntimeError: If a pattern matches nothing
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches or not all(os.path.isfile(path) for path in matches):
+            raise RuntimeError(f"No shard database found for {pattern}")
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+class ShardedSQLiteManager(SQLiteManager):
+    """
+    Runs queries across several SQLite files with the same schema
+
+    The first shard serves as the schema source: prompts, validation and schema
+    hashes come from it, so the schema is introspected once. Value lookups for
+    entity grounding and intent templates (read_values()) cover every shard. Every query is
+    planned by plan_query() and run on all shards in parallel, each shard through
+    its own pooled, read-only SQLiteManager (with the query guard and result cache
+    applied per shard); the partial results are combined in an in-memory database.
+    """
+
+    def __init__(self, workers: int = DEFAULT_SHARD_WORKERS, max_partial_rows: int = DEFAULT_MAX_PARTIAL_ROWS,
+                 replicated_tables: Iterable[str] = (), **kwargs):
+        """
+        Initialize the manager
+
+        Args:
+            workers: Threads querying shards concurrently
+            max_partial_rows: Rows each shard may return to the merge step
+            replicated_tables: Tables holding the same rows on every shard (lookup
+                tables such as customer); queries reading only these run on one shard
+            **kwargs: SQLiteManager settings, applied to every shard (connections are
+                always pooled and read-only)
+        """
+        kwargs["pooled"] = True
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.max_partial_rows = max_partial_rows
+        self.replicated_tables = {name.lower() for name in replicated_tables}
+        self.shards: List[SQLiteManager] = []
+        self.shard_paths: List[str] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._shard_settings = kwargs
+        # Names that may hold different rows per shard; None until replicated tables are configured
+        self._sharded_tables: Optional[Set[str]] = None
+
+    def open_shards(self, paths: List[str]) -> bool:
+        """
+        Opens every shard and checks that their schemas match
+
+        Args:
+            paths: Shard database files (the first one is the schema source)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not paths:
+            print("Error opening shards: no shard databases given", file=sys.stderr)
+            return False
+        if not self.open_database(paths[0]):
+            return False
+
+        settings = dict(self._shard_settings, max_rows=self.max_partial_rows, workload_log=None)
+        for path in paths:
+            shard = SQLiteManager(**settings)
+            if not shard.open_database(path):
+                self.close_database()
+                return False
+            self.shards.append(shard)
+            self.shard_paths.append(path)
+
+        expected = self.get_schema_hash()
+        mismatched = [path for shard, path in zip(self.shards, self.shard_paths) if shard.get_schema_hash() != expected]
+        if mismatched:
+            print(f"Error opening shards: schema differs from {paths[0]} in {', '.join(mismatched)}",
+                  file=sys.stderr)
+            self.close_database()
+            return False
+
+        if self.replicated_tables:
+            # Views count as sharded, since they may read sharded tables
+            names = {name.lower() for name, in self.read_values(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+            tables = {table.lower() for table in self.get_catalog()["tables"]}
+            unknown = self.replicated_tables - tables
+            if unknown:
+                print(f"Error opening shards: replicated tables not in the schema: {', '.join(sorted(unknown))}",
+                      file=sys.stderr)
+                self.close_database()
+                return False
+            self._sharded_tables = names - self.replicated_tables
+
+        self._executor = ThreadPoolExecutor(max_workers=min(self.workers, len(self.shards)),
+                                            thread_name_prefix="shard")
+        return True
+
+    def close_database(self):
+        """Closes every shard's connections and the schema source"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for shard in self.shards:
+            shard.close_database()
+        self.shards = []
+        self.shard_paths = []
+        self._sharded_tables = None
+        super().close_database()
+
+    def get_data_stamps(self) -> Tuple[tuple, tuple]:
+        """Gets stamps that change whenever any shard's data changes"""
+        if not self.is_open or not self.shards:
+            raise RuntimeError("Database is not open")
+        stamps = [shard.get_data_stamps() for shard in self.shards]
+        return tuple(stamp for stamp, _ in stamps), tuple(file_stamp for _, file_stamp in stamps)
+
+    def read_values(self, query: str, params: tuple = ()) -> List[tuple]:
+        """
+        Runs an internal lookup on every shard and returns the distinct rows
+
+        Meant for DISTINCT value lookups (entity grounding, template slots): a LIMIT
+        caps each shard, so a limit reached in one shard is still reached in the union.
+        """
+        if not self.is_open or not self.shards:
+            raise RuntimeError("Database is not open")
+        rows = {}
+        for shard, path in zip(self.shards, self.shard_paths):
+            try:
+                for row in shard.read_values(query, params):
+                    rows.setdefault(row, None)
+            except QueryExecutionError as e:
+                raise QueryExecutionError(f"{os.path.basename(path)}: {e}")
+        return list(rows)
+
+    def plan(self, query: str, params: Optional[dict] = None) -> ShardPlan:
+        """Plans a query against the schema source (see plan_query())"""
+        sql = query.strip().rstrip(";")
+        try:
+            cursor = self.db.execute(f"SELECT * FROM ({sql}) LIMIT 0", params or ())
+            output_names = [description[0] for description in cursor.description]
+            cursor.close()
+        except sqlite3.Error as e:
+            raise QueryExecutionError(f"SQL query failed: {e}")
+        return plan_query(sql, output_names, self._sharded_tables)
+
+    def fetch_result(self, query: str, params: Optional[dict] = None) -> QueryResult:
+        """
+        Runs a query on every shard in parallel and combines the results
+
+        Raises:
+            ShardMergeError: If the query's results cannot be combined exactly
+            RuntimeError: If a shard fails (the message names the shard)
+        """
+        if not self.is_open or not self._executor:
+            raise RuntimeError("Database is not open")
+
+        plan = self.plan(query, params)
+        shards = self.shards[:1] if plan.single_shard else self.shards
+        futures = [self._executor.submit(shard.fetch_result, plan.shard_sql, params) for shard in shards]
+        partials = []
+        for future, path in zip(futures, self.shard_paths):
+            try:
+                partials.append(future.result())
+            except RuntimeError as e:
+                if type(e) in (RuntimeError, QueryExecutionError):
+                    raise type(e)(f"{os.path.basename(path)}: {e}")
+                raise
+        self.metrics.increment("shard_queries_total", plan="single_shard" if plan.single_shard
+                               else "aggregate" if plan.aggregate else "concatenate")
+
+        for result, path in zip(partials, self.shard_paths):
+            if plan.aggregate and result.truncated:
+                raise ShardMergeError(f"{os.path.basename(path)} returned more than {self.max_partial_rows} "
+                                      f"groups to combine; narrow the query")
+
+        return self._merge(plan, partials)
+
+    def export_result(self, query: str, path: str, export_format: Optional[str] = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE, progress=None):
+        """Exports stream from a single cursor and are not available across shards"""
+        raise RuntimeError("Exports are not supported across shards; export from one shard with --database")
+
+    def _merge(self, plan: ShardPlan, partials: List[QueryResult]) -> QueryResult:
+        """Loads the shard rows into an in-memory table and runs the merge query over it"""
+        connection = sqlite3.connect(":memory:")
+        try:
+            columns = ", ".join(f"__p{i}" for i in range(plan.partial_columns))
+            placeholders = ", ".join("?" for _ in range(plan.partial_columns))
+            connection.execute(f"CREATE TABLE partials ({columns})")
+            for result in partials:
+                connection.executemany(f"INSERT INTO partials VALUES ({placeholders})", result.rows)
+
+            cursor = connection.execute(plan.merge_sql)
+            result = QueryResult.from_cursor(
+                cursor,
+                max_rows=self.max_rows,
+                batch_size=self.fetch_batch_size,
+                scan_limit=self.scan_limit,
+                sample_rows=self.sample_rows
+            )
+        except sqlite3.Error as e:
+            raise ShardMergeError(f"failed to combine shard results: {e}")
+        finally:
+            connection.close()
+
+        # Rows the shards counted but did not return still count towards the total
+        if plan.additive_count and any(partial.truncated for partial in partials):
+            result.total_count = sum(partial.total_count for partial in partials)
+            result.truncated = result.total_count > len(result.rows)
+            result.count_exact = all(partial.count_exact for partial in partials)
+        return result
@@ -0,0 +1,141 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_SQL_CACHE_PATH = ".sql_cache.sqlite"
+
+
+class SQLCache:
+    """
+    Persistent question -> SQL cache stored in a small SQLite side file
+
+    Entries are keyed by the normalized question, the schema fingerprint and the
+    prompting strategy, so a schema change or a strategy switch never serves stale SQL.
+    Eviction is LRU (bounded by max_entries) plus an optional time-to-live.
+    """
+
+    def __init__(self, path: str = DEFAULT_SQL_CACHE_PATH, max_entries: int = 1000,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        """
+        Initialize the cache, creating the side file if needed
+
+        Args:
+            path: Path to the SQLite cache file
+            max_entries: Maximum number of cached entries before least-recently-used eviction
+            ttl_seconds: Maximum age of an entry in seconds (None disables expiry)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS sql_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    sql_query TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used ON sql_cache(last_used)")
+            self.db.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to open SQL cache at {path}: {e}")
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Normalizes case, whitespace and trailing punctuation so trivial variants share an entry"""
+        normalized = re.sub(r"\s+", " ", question.strip().lower())
+        return normalized.rstrip(" ?!.;")
+
+    def make_key(self, question: str, schema_hash: Optional[str], strategy: str) -> str:
+        """Builds the cache key for a question under a given schema and prompting strategy"""
+        parts = [self.normalize_question(question), schema_hash or "", strategy]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, question: str, schema_hash: Optional[str], strategy: str) -> Optional[str]:
+        """
+        Looks up cached SQL for a question
+
+        Args:
+            question: Natural language question
+            schema_hash: Fingerprint of the schema the SQL was generated against
+            strategy: Prompting strategy ("few-shot" or "zero-shot")
+
+        Returns:
+            Cached SQL query, or None on a miss
+        """
+        key = self.make_key(question, schema_hash, strategy)
+        now = time.time()
+
+        with self._lock:
+            row = self.db.execute(
+                "SELECT sql_query, created_at FROM sql_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self.db.execute("DELETE FROM sql_cache WHERE cache_key = ?", (key,))
+                self.db.commit()
+                row = None
+
+            if not row:
+                self.misses += 1
+                return None
+
+            self.db.execute("UPDATE sql_cache SET last_used = ? WHERE cache_key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question: str, schema_hash: Optional[str], strategy: str, sql_query: str):
+        """Stores generated SQL for a question, evicting least-recently-used entries if full"""
+        key = self.make_key(question, schema_hash, strategy)
+        now = time.time()
+
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sql_cache "
+                "(cache_key, question, strategy, sql_query, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.normalize_question(question), strategy, sql_query, now, now)
+            )
+            self._evict(now)
+            self.db.commit()
+
+    def _evict(self, now: float):
+        """Drops expired entries and trims the cache down to max_entries"""
+        if self.ttl_seconds is not None:
+            self.db.execute("DELETE FROM sql_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        self.db.execute(
+            "DELETE FROM sql_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        """Removes every cached entry and resets the hit/miss counters"""
+        with self._lock:
+            self.db.execute("DELETE FROM sql_cache")
+            self.db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns entry count and hit/miss counters"""
+        with self._lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """Closes the cache file"""
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,191 @@
+import difflib
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from query_guard import table_aliases
+
+# Authorizer actions a read-only query may need
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+# Names of the authorizer action codes, for error messages
+_ACTION_NAMES = {
+    getattr(sqlite3, name): name[len("SQLITE_"):]
+    for name in (
+        "SQLITE_CREATE_INDEX", "SQLITE_CREATE_TABLE", "SQLITE_CREATE_TEMP_INDEX", "SQLITE_CREATE_TEMP_TABLE",
+        "SQLITE_CREATE_TEMP_TRIGGER", "SQLITE_CREATE_TEMP_VIEW", "SQLITE_CREATE_TRIGGER", "SQLITE_CREATE_VIEW",
+        "SQLITE_DELETE", "SQLITE_DROP_INDEX", "SQLITE_DROP_TABLE", "SQLITE_DROP_TEMP_INDEX",
+        "SQLITE_DROP_TEMP_TABLE", "SQLITE_DROP_TEMP_TRIGGER", "SQLITE_DROP_TEMP_VIEW", "SQLITE_DROP_TRIGGER",
+        "SQLITE_DROP_VIEW", "SQLITE_INSERT", "SQLITE_PRAGMA", "SQLITE_TRANSACTION", "SQLITE_UPDATE",
+        "SQLITE_ATTACH", "SQLITE_DETACH", "SQLITE_ALTER_TABLE", "SQLITE_REINDEX", "SQLITE_ANALYZE",
+        "SQLITE_CREATE_VTABLE", "SQLITE_DROP_VTABLE", "SQLITE_SAVEPOINT",
+    )
+}
+
+_CODE_BLOCK = re.compile(r"```(?:sql)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+_STATEMENT_START = re.compile(r"^\s*(?:WITH|SELECT|VALUES)\b", re.IGNORECASE | re.MULTILINE)
+_INLINE_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_ANY_STATEMENT = re.compile(
+    r"^\s*(?:WITH|SELECT|VALUES|INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|ATTACH|DETACH|PRAGMA|"
+    r"BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|VACUUM|ANALYZE|REINDEX|EXPLAIN)\b",
+    re.IGNORECASE
+)
+# Errors SQLite reports when text is not SQL, as opposed to SQL naming unknown tables or columns
+_PARSE_ERROR = re.compile(r"syntax error|incomplete input|unrecognized token", re.IGNORECASE)
+_NO_SUCH_COLUMN = re.compile(r"no such column: (?:(\w+)\.)?(\w+)")
+_NO_SUCH_TABLE = re.compile(r"no such table: (?:\w+\.)?(\w+)")
+
+# Most close matches suggested per unknown identifier
+MAX_SUGGESTIONS = 3
+
+
+class SQLValidationError(RuntimeError):
+    """Raised when generated SQL does not compile, is not read-only or is not SQL at all"""
+
+    def __init__(self, sql: str, reason: str):
+        super().__init__(f"Generated SQL is invalid: {reason}")
+        self.sql = sql
+        self.reason = reason
+
+
+def _parses(statement: str) -> bool:
+    """Whether SQLite's parser accepts a statement; unknown tables, columns and functions are fine"""
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute(f"EXPLAIN {statement}")
+        return True
+    except sqlite3.Error as e:
+        return not _PARSE_ERROR.search(str(e))
+    finally:
+        connection.close()
+
+
+def _split_statement(text: str) -> Tuple[str, str]:
+    """Splits text after its first complete (semicolon-terminated) statement, if it has one"""
+    for match in re.finditer(";", text):
+        if sqlite3.complete_statement(text[:match.end()]):
+            return text[:match.end()].strip(), text[match.end():]
+    return text.strip(), ""
+
+
+def extract_sql(text: str) -> str:
+    """
+    Pulls the SQL statement out of a model response
+
+    Takes the contents of a markdown code block if there is one. Otherwise the
+    statement starts at the first line that begins a query and parses as one, so
+    prose such as "Select the rows with:" is skipped; a SELECT inside a line is the
+    last resort. Prose after the statement's terminating semicolon is dropped.
+
+    Raises:
+        SQLValidationError: If the response contains more than one statement
+    """
+    block = _CODE_BLOCK.search(text)
+    if block:
+        text = block.group(1)
+
+    starts = [match.start() for match in _STATEMENT_START.finditer(text)]
+    inline = _INLINE_SELECT.search(text)
+    if inline and inline.start() not in starts:
+        starts.append(inline.start())
+
+    for start in starts:
+        statement, rest = _split_statement(text[start:])
+        if _parses(statement):
+            if _ANY_STATEMENT.match(rest):
+                raise SQLValidationError(text.strip(), "only a single SQL statement is allowed")
+            return statement
+
+    # Nothing parses: return the likeliest statement so validation reports SQLite's error
+    return _split_statement(text[starts[0]:] if starts else text)[0]
+
+
+def validate_sql(connection: sqlite3.Connection, query: str, tables: Dict[str, List[Tuple[str, str]]],
+                 read_only: bool = True) -> str:
+    """
+    Compiles a query without running it and checks that it only reads data
+
+    The statement is prepared through EXPLAIN, so SQLite resolves every table,
+    column and function against the live schema but executes nothing. An
+    authorizer denies any action other than reading while it compiles.
+
+    Args:
+        connection: Connection to compile the query on
+        query: SQL (or a model response containing SQL) to validate
+        tables: Catalog {table: [(column, type), ...]} used to suggest fixes for
+            unknown identifiers
+        read_only: Reject statements that would write or change connection state
+
+    Returns:
+        The cleaned SQL statement
+
+    Raises:
+        SQLValidationError: If the query is missing, does not compile or is not read-only
+    """
+    sql = extract_sql(query)
+    if not sql:
+        raise SQLValidationError(query, "the response does not contain a SQL query")
+
+    denied = []
+
+    def authorizer(action: int, arg1: Optional[str], arg2: Optional[str], db_name: Optional[str],
+                   trigger: Optional[str]) -> int:
+        if action in _READ_ONLY_ACTIONS:
+            return sqlite3.SQLITE_OK
+        denied.append(" ".join(filter(None, (_ACTION_NAMES.get(action, str(action)), arg1))))
+        return sqlite3.SQLITE_DENY
+
+    if read_only:
+        connection.set_authorizer(authorizer)
+    try:
+        connection.execute(f"EXPLAIN {sql}")
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        if denied:
+            raise SQLValidationError(sql, f"only read-only queries are allowed (not permitted: {', '.join(denied)})")
+        raise SQLValidationError(sql, f"{e}{identifier_hints(str(e), sql, tables)}")
+    finally:
+        if read_only:
+            connection.set_authorizer(None)
+
+    return sql
+
+
+def identifier_hints(error: str, sql: str, tables: Dict[str, List[Tuple[str, str]]]) -> str:
+    """
+    Suggests likely fixes for "no such column" and "no such table" errors
+
+    Returns:
+        Hint text starting with a newline, or "" when there is nothing to suggest
+    """
+    hints = []
+    column_error = _NO_SUCH_COLUMN.search(error)
+    table_error = _NO_SUCH_TABLE.search(error)
+    lowered = {name.lower(): name for name in tables}
+
+    if column_error:
+        qualifier, column = column_error.groups()
+        if qualifier:
+            name = table_aliases(sql, set(lowered)).get(qualifier.lower(), qualifier)
+            table = lowered.get(name.lower())
+            if table:
+                columns = [col_name for col_name, _ in tables[table]]
+                hints.extend(_close_matches(column, columns, "Did you mean"))
+                hints.append(f"Columns of {table}: {', '.join(columns)}")
+        else:
+            owners = [table for table, columns in tables.items()
+                      if any(col_name.lower() == column.lower() for col_name, _ in columns)]
+            if owners:
+                hints.append(f"{column} is a column of: {', '.join(owners)} (is that table joined?)")
+            else:
+                all_columns = sorted({col_name for columns in tables.values() for col_name, _ in columns})
+                hints.extend(_close_matches(column, all_columns, "Did you mean"))
+    elif table_error:
+        hints.extend(_close_matches(table_error.group(1), list(tables), "Did you mean"))
+        hints.append(f"Available tables: {', '.join(tables)}")
+
+    return "".join(f"\nHint: {hint}" for hint in hints)
+
+
+def _close_matches(word: str, candidates: List[str], prefix: str) -> List[str]:
+    matches = difflib.get_close_matches(word, candidates, n=MAX_SUGGESTIONS, cutoff=0.6)
+    return [f"{prefix} {' or '.join(matches)}?"] if matches else []
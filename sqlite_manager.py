@@ -1,13 +1,134 @@
+import hashlib
+import os
+import re
 import sqlite3
-from typing import List, Tuple, Optional
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Optional
+from urllib.parse import quote
+
+from exporter import DEFAULT_BATCH_SIZE, ExportSummary, export_cursor
+from index_advisor import WorkloadLog
+from metrics import MetricsRegistry
+from query_guard import QueryGuard
+from query_result import QueryResult
+from result_cache import ResultCache
+from rollups import ROLLUP_TABLE
+from sql_validator import validate_sql
+
+
+class QueryExecutionError(RuntimeError):
+    """Raised when SQLite fails to run a query (unknown table or column, bad syntax, ...)"""
+
+
+BUSINESS_CONTEXT = {
+    "invoice": "REVENUE: Invoices sent to customers (money coming in). Use invoice.total_amount for revenue calculations.",
+    "payment": "REVENUE: Actual payments received from customers for invoices. Use payment.amount for actual cash received.",
+    "expense": "COSTS: Expenses paid to vendors/suppliers (money going out). Use expense.amount for cost calculations.",
+    "job": "Jobs/work performed for customers. Links customers to companies.",
+    "company": "Companies in the system (e.g., 'Central Glass DC', 'Recon Pest Control').",
+    "customer": "Customers who receive services.",
+    "employee": "Employees who work for companies.",
+    "payroll": "Employee payroll records (costs).",
+    ROLLUP_TABLE: "PRECOMPUTED monthly totals per company: revenue (payments), expenses, payroll (gross pay) and profit (revenue - expenses). month is 'YYYY-MM'.",
+}
+
+# Business vocabulary that does not appear in table or column names, mapped to the
+# tables needed to answer questions using it (see BUSINESS_RULES)
+BUSINESS_TERMS = {
+    "revenue": ["payment", "invoice", "company", ROLLUP_TABLE],
+    "income": ["payment", "invoice", "company", ROLLUP_TABLE],
+    "earn": ["payment", "invoice", "company", ROLLUP_TABLE],
+    "made": ["payment", "invoice", "company", ROLLUP_TABLE],
+    "profit": ["payment", "invoice", "expense", "company", ROLLUP_TABLE],
+    "cost": ["expense", "payroll", "company", ROLLUP_TABLE],
+    "spend": ["expense", "company", ROLLUP_TABLE],
+    "spent": ["expense", "company", ROLLUP_TABLE],
+    "pay": ["payroll", "employee"],
+    "salary": ["employee", "payroll"],
+    "worker": ["employee", "employee_company"],
+    "staff": ["employee", "employee_company"],
+    "work": ["employee_company", "employee"],
+}
+
+BUSINESS_RULES = [
+    "- Revenue = sum of payment.amount for a company (actual money received from customers)",
+    "- Expenses = sum of expense.amount for a company (ALL expenses, not just those linked to specific jobs)",
+    "- Profit = Revenue - Expenses (calculate separately, then subtract)",
+    "- For profit calculations: Use separate subqueries for revenue and expenses, then subtract",
+    "- Example profit query: SELECT (SELECT SUM(p.amount) FROM payment p JOIN invoice i ON p.invoice_id = i.invoice_id JOIN company c ON i.company_id = c.company_id WHERE c.name = 'X') - (SELECT SUM(e.amount) FROM expense e JOIN company c ON e.company_id = c.company_id WHERE c.name = 'X')",
+    "- Do NOT join expenses through jobs/invoices for profit - use ALL company expenses",
+]
+
+# Added to the business rules when the rollup table is part of the schema (see rollups.py)
+ROLLUP_RULES = [
+    f"- {ROLLUP_TABLE} already applies the rules above: prefer it for revenue, expense, payroll and profit totals by company and/or month, summing its rows instead of aggregating payment, invoice, expense or payroll",
+    f"- Example: SELECT SUM(r.profit) FROM {ROLLUP_TABLE} r JOIN company c ON r.company_id = c.company_id WHERE c.name = 'X' AND r.month BETWEEN '2025-01' AND '2025-06'",
+    "- Use the base tables only for per-invoice, per-payment, per-job or per-day details",
+]
 
 
 class SQLiteManager:
-    """Manages SQLite database operations"""
+    """
+    Manages SQLite database operations
+
+    By default a single read-write connection is used, which may only be used from the
+    thread that opened the database. In pooled mode every thread lazily gets its own
+    read-only connection (URI mode=ro, query_only) tuned for reads, so one manager can
+    serve concurrent questions.
+    """
+
+    def __init__(self, result_cache: Optional[ResultCache] = None, max_rows: int = 1000,
+                 prompt_rows: int = 100, sample_rows: int = 10, fetch_batch_size: int = 500,
+                 scan_limit: Optional[int] = 1000000, pooled: bool = False,
+                 mmap_size: int = 256 * 1024 * 1024, cache_size: int = -64 * 1024,
+                 query_guard: Optional[QueryGuard] = None, workload_log: Optional[WorkloadLog] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Initialize the manager
 
-    def __init__(self):
-        self.db: Optional[sqlite3.Connection] = None
+        Args:
+            result_cache: Optional ResultCache used to skip re-running unchanged queries
+            max_rows: Maximum number of result rows kept in memory per query
+            prompt_rows: Largest result rendered in full by execute_query; larger ones are summarized
+            sample_rows: Rows shown in the head and tail samples of a summarized result
+            fetch_batch_size: Number of rows fetched per fetchmany call
+            scan_limit: Stop counting result rows after this many (None counts all of them)
+            pooled: Use one read-only connection per thread instead of a single connection
+            mmap_size: PRAGMA mmap_size in bytes for pooled connections (0 disables memory mapping)
+            cache_size: PRAGMA cache_size for pooled connections (negative values are KiB)
+            query_guard: Optional QueryGuard that rejects expensive plans and bounds execution time
+            workload_log: Optional WorkloadLog recording every executed query and its plan
+            metrics: Registry receiving result cache hit/miss counts
+        """
+        self._db: Optional[sqlite3.Connection] = None
+        self.db_path: Optional[str] = None
         self.is_open = False
+        self.result_cache = result_cache
+        self.max_rows = max_rows
+        self.prompt_rows = prompt_rows
+        self.sample_rows = sample_rows
+        self.fetch_batch_size = fetch_batch_size
+        self.scan_limit = scan_limit
+        self.pooled = pooled
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.query_guard = query_guard
+        self.workload_log = workload_log
+        self.metrics = metrics or MetricsRegistry()
+        self.is_wal = False
+        self._local = threading.local()
+        self._pool: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._data_generation = 0
+        self._schema_lock = threading.RLock()
+        self._schema_cache: Optional[str] = None
+        self._compact_schema_cache: Optional[str] = None
+        self._schema_version: Optional[int] = None
+        self._schema_hash: Optional[str] = None
+        self._catalog: Optional[Dict] = None
 
     def open_database(self, db_path: str) -> bool:
         """
@@ -23,77 +144,339 @@ class SQLiteManager:
             self.close_database()
 
         try:
-            self.db = sqlite3.connect(db_path)
+            if self.pooled:
+                self.db_path = os.path.abspath(db_path)
+                # Open the calling thread's connection now so a bad path fails here
+                journal_mode = self._open_pooled_connection().execute("PRAGMA journal_mode").fetchone()[0]
+                self.is_wal = journal_mode == "wal"
+                if not self.is_wal:
+                    # Read-only connections cannot switch the journal mode themselves
+                    print(f"Warning: {db_path} uses journal_mode={journal_mode}; pooled readers block writers "
+                          f"while they run. Enable WAL (PRAGMA journal_mode = WAL) to let them run concurrently.",
+                          file=sys.stderr)
+            else:
+                # As with pooled connections, check_same_thread is off only so the owner can close
+                # a connection from another thread (the batch runner closes its workers' clones)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self.db_path = os.path.abspath(db_path)
             self.is_open = True
+            self.invalidate_schema_cache()
             return True
         except sqlite3.Error as e:
-            print(f"Error opening database: {e}", file=__import__('sys').stderr)
+            self.close_database()
+            print(f"Error opening database: {e}", file=sys.stderr)
             return False
 
+    @property
+    def db(self) -> Optional[sqlite3.Connection]:
+        """The connection for the calling thread (opened on first use in pooled mode)"""
+        if not self.pooled:
+            return self._db
+
+        if not self.db_path:
+            return None
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._open_pooled_connection()
+        return connection
+
+    def _open_pooled_connection(self) -> sqlite3.Connection:
+        """Opens and tunes a read-only connection for the calling thread"""
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+
+        # check_same_thread is off only so close_database() can close every thread's
+        # connection; each connection is otherwise used solely by its own thread
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        connection.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        connection.execute("PRAGMA temp_store = MEMORY")
+        connection.execute("PRAGMA query_only = ON")
+
+        self._local.connection = connection
+        with self._pool_lock:
+            self._pool.append(connection)
+        return connection
+
+    def clone(self) -> "SQLiteManager":
+        """
+        Creates a manager with the same settings and its own connection to the same database
+
+        sqlite3 connections may only be used by the thread that created them, so
+        worker threads call this from the thread that will use the clone.
+        """
+        manager = SQLiteManager(
+            result_cache=self.result_cache,
+            max_rows=self.max_rows,
+            prompt_rows=self.prompt_rows,
+            sample_rows=self.sample_rows,
+            fetch_batch_size=self.fetch_batch_size,
+            scan_limit=self.scan_limit,
+            pooled=self.pooled,
+            mmap_size=self.mmap_size,
+            cache_size=self.cache_size,
+            query_guard=self.query_guard,
+            workload_log=self.workload_log,
+            metrics=self.metrics
+        )
+        if self.db_path and not manager.open_database(self.db_path):
+            raise RuntimeError(f"Failed to open database at {self.db_path}")
+        return manager
+
     def close_database(self):
-        """Closes the database connection"""
-        if self.db:
-            self.db.close()
-            self.db = None
+        """Closes the database connection (every thread's connection in pooled mode)"""
+        if self._db:
+            self._db.close()
+            self._db = None
+
+        with self._pool_lock:
+            for connection in self._pool:
+                connection.close()
+            self._pool = []
+        self._local = threading.local()
+
+        self.db_path = None
         self.is_open = False
+        self.is_wal = False
+        self.invalidate_schema_cache()
 
     def execute_query(self, query: str) -> str:
         """
         Executes a SQL query and returns results as formatted string
 
+        Large results are summarized (row count, samples and column statistics)
+        instead of being dumped in full; see fetch_result() for the structured form.
+
         Args:
             query: SQL query to execute
 
         Returns:
             Formatted string representation of results
         """
+        return self.format_result(self.fetch_result(query))
+
+    def format_result(self, result: QueryResult) -> str:
+        """Formats a structured result for display or prompting, summarizing it if it is large"""
+        return result.to_prompt_text(self.prompt_rows, self.sample_rows)
+
+    def fetch_result(self, query: str, params: Optional[dict] = None) -> QueryResult:
+        """
+        Executes a SQL query and returns a structured, row-capped result
+
+        Rows are streamed with fetchmany; at most max_rows are kept in memory. When a
+        result cache is configured, results are reused until the database changes
+        (PRAGMA data_version, this connection's changes or the file mtime); queries
+        reading the clock or calling random() always run.
+
+        Args:
+            query: SQL query to execute
+            params: Values for the query's named parameters (:name)
+
+        Returns:
+            QueryResult with columns, capped rows, truncated flag and total count
+        """
         if not self.is_open or not self.db:
             raise RuntimeError("Database is not open")
 
+        if self.result_cache is None:
+            return self._run_query(query, params)
+
+        if not self.result_cache.is_cacheable(query, params):
+            self.metrics.increment("result_cache_requests_total", result="uncacheable")
+            return self._run_query(query, params)
+
         try:
-            cursor = self.db.cursor()
-            cursor.execute(query)
+            data_stamp, file_stamp = self._get_data_stamps()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"SQL query failed: {e}")
 
-            columns = [description[0] for description in cursor.description]
+        cached = self.result_cache.get(self.db_path, query, data_stamp, file_stamp, params)
+        self.metrics.increment("result_cache_requests_total", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
 
-            rows = cursor.fetchall()
+        result = self._run_query(query, params)
 
-            if not columns:
-                return "Query executed successfully (no results)"
+        # Statements without a result set (DML/DDL) are never cached
+        if result.has_result_set:
+            self.result_cache.put(self.db_path, query, data_stamp, file_stamp, result, params)
 
-            col_widths = [len(col) for col in columns]
-            for row in rows:
-                for i, cell in enumerate(row):
-                    cell_str = str(cell) if cell is not None else "NULL"
-                    col_widths[i] = max(col_widths[i], len(cell_str))
+        return result
 
-            output_lines = []
+    def get_data_stamps(self) -> Tuple[tuple, tuple]:
+        """
+        Gets stamps that change whenever the database's data changes
 
-            header = " | ".join(col.ljust(col_widths[i]) for i, col in enumerate(columns))
-            output_lines.append(header)
+        Returns:
+            (in-process stamp, file-level stamp); see _get_data_stamps()
+        """
+        if not self.is_open or not self.db:
+            raise RuntimeError("Database is not open")
 
-            separator = "-+-".join("-" * col_widths[i] for i in range(len(columns)))
-            output_lines.append(separator)
+        try:
+            return self._get_data_stamps()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to read the data version: {e}")
 
-            if rows:
-                for row in rows:
-                    row_str = " | ".join(
-                        (str(cell) if cell is not None else "NULL").ljust(col_widths[i])
-                        for i, cell in enumerate(row)
-                    )
-                    output_lines.append(row_str)
-            else:
-                output_lines.append("(No rows returned)")
+    def read_values(self, query: str, params: tuple = ()) -> List[tuple]:
+        """
+        Runs an internal lookup, such as the distinct values of a column
+
+        Used to ground entities and fill template slots; it bypasses the query guard,
+        the result cache and the row cap. Must be called from the thread that owns
+        the connection.
 
-            return "\n".join(output_lines)
+        Args:
+            query: SELECT statement
+            params: Positional parameters
 
+        Returns:
+            Result rows
+        """
+        if not self.is_open or not self.db:
+            raise RuntimeError("Database is not open")
+
+        try:
+            return self.db.execute(query, params).fetchall()
         except sqlite3.Error as e:
-            raise RuntimeError(f"SQL query failed: {e}")
+            raise QueryExecutionError(f"SQL query failed: {e}")
+
+    def _get_data_stamps(self) -> Tuple[tuple, tuple]:
+        """
+        Builds validity stamps for cached results
+
+        Returns:
+            (in-process stamp, file-level stamp). PRAGMA data_version only changes on
+            commits from other connections, so this connection's total_changes is
+            included too; the -wal file is included so WAL-mode writes are noticed
+            before a checkpoint touches the main file.
+        """
+        connection = self.db
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA data_version")
+        data_version = cursor.fetchone()[0]
+
+        file_stamp = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                stat = os.stat(path)
+                file_stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                file_stamp.append(None)
+        file_stamp = tuple(file_stamp)
+
+        if not self.pooled:
+            return (data_version, connection.total_changes, file_stamp), file_stamp
+
+        # data_version values are per connection, so in pooled mode any connection that
+        # sees its value move bumps a shared generation counter instead
+        last_seen = getattr(self._local, "data_version", None)
+        if last_seen is not None and last_seen != data_version:
+            with self._pool_lock:
+                self._data_generation += 1
+        self._local.data_version = data_version
+
+        return (self._data_generation, file_stamp), file_stamp
+
+    def _run_query(self, query: str, params: Optional[dict] = None) -> QueryResult:
+        """
+        Runs a query against the database, streaming rows into a QueryResult
+
+        With a query guard, the plan is checked first and execution (including fetching)
+        is bounded by the guard's time and VM-step budget.
+
+        Raises:
+            QueryRejectedError: If the guard estimates the plan is too expensive
+            QueryTimeoutError: If the query runs out of budget
+            RuntimeError: If SQLite reports an error
+        """
+        connection = self.db
+        try:
+            report = None
+            if self.query_guard is not None:
+                report = self.query_guard.enforce(connection, query, self.get_catalog()["tables"], params)
+
+            started = time.perf_counter()
+            with self.query_guard.limit(connection) if self.query_guard is not None else nullcontext():
+                cursor = connection.cursor()
+                cursor.execute(query, params or ())
+                result = QueryResult.from_cursor(
+                    cursor,
+                    max_rows=self.max_rows,
+                    batch_size=self.fetch_batch_size,
+                    scan_limit=self.scan_limit,
+                    sample_rows=self.sample_rows
+                )
+
+            if self.workload_log is not None and result.has_result_set:
+                plan = [detail for _, detail in report.plan] if report is not None else None
+                self.workload_log.record(connection, query, time.perf_counter() - started, plan, params)
+
+            return result
+        except sqlite3.Error as e:
+            raise QueryExecutionError(f"SQL query failed: {e}")
+
+    def export_result(self, query: str, path: str, export_format: Optional[str] = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE,
+                      progress: Optional[Callable[[int], None]] = None) -> ExportSummary:
+        """
+        Streams the full result of a query to a CSV, JSONL or Parquet file
+
+        Unlike fetch_result(), nothing is capped or kept in memory and the result
+        cache is bypassed. The query is validated as read-only first; the query
+        guard's limits do not apply, since exports are expected to be large.
+
+        Args:
+            query: SQL query to export
+            path: Output file
+            export_format: "csv", "jsonl" or "parquet" (default: from the file extension)
+            batch_size: Rows fetched and written per batch
+            progress: Called with the running row count after each batch
 
-    def get_schema(self) -> str:
+        Returns:
+            ExportSummary with the row count, file size and duration
+        """
+        if not self.is_open or not self.db:
+            raise RuntimeError("Database is not open")
+
+        query = self.validate_sql(query)
+        try:
+            cursor = self.db.cursor()
+            cursor.execute(query)
+            return export_cursor(cursor, path, export_format, batch_size, progress)
+        except sqlite3.Error as e:
+            raise QueryExecutionError(f"SQL query failed: {e}")
+
+    def validate_sql(self, query: str) -> str:
+        """
+        Compiles a query against this database without running it
+
+        Args:
+            query: SQL (or a model response containing SQL) to check
+
+        Returns:
+            The cleaned SQL statement
+
+        Raises:
+            SQLValidationError: If it does not compile or is not read-only
+        """
+        if not self.is_open or not self.db:
+            raise RuntimeError("Database is not open")
+
+        return validate_sql(self.db, query, self.get_catalog()["tables"])
+
+    def get_schema(self, tables: Optional[Iterable[str]] = None, compact: bool = False) -> str:
         """
         Gets the database schema as a formatted string with business context
 
+        The schema text is cached and only rebuilt when SQLite's
+        PRAGMA schema_version changes (i.e. after any DDL statement).
+
+        Args:
+            tables: Optional subset of tables to include. A subset schema also lists
+                the foreign-key relationships between the included tables.
+            compact: Render one line per table with PK/FK markers instead of one line per column
+
         Returns:
             Schema information including tables and columns with business context
         """
@@ -101,48 +484,180 @@ class SQLiteManager:
             return "Database not open"
 
         try:
-            tables = self._get_table_names()
-            if not tables:
-                return "No tables found in database"
-
-            schema_lines = ["Database Schema:\n"]
-
-            business_context = {
-                "invoice": "REVENUE: Invoices sent to customers (money coming in). Use invoice.total_amount for revenue calculations.",
-                "payment": "REVENUE: Actual payments received from customers for invoices. Use payment.amount for actual cash received.",
-                "expense": "COSTS: Expenses paid to vendors/suppliers (money going out). Use expense.amount for cost calculations.",
-                "job": "Jobs/work performed for customers. Links customers to companies.",
-                "company": "Companies in the system (e.g., 'Central Glass DC', 'Recon Pest Control').",
-                "customer": "Customers who receive services.",
-                "employee": "Employees who work for companies.",
-                "payroll": "Employee payroll records (costs).",
-            }
-
-            for table_name in tables:
-                schema_lines.append(f"Table: {table_name}")
-                if table_name in business_context:
-                    schema_lines.append(f"  NOTE: {business_context[table_name]}")
-                columns = self._get_table_columns(table_name)
-
-                for col_name, col_type in columns:
-                    schema_lines.append(f"  - {col_name} ({col_type})")
+            with self._schema_lock:
+                self._refresh_schema_cache()
+                if tables is None:
+                    if not compact:
+                        return self._schema_cache
+                    if self._compact_schema_cache is None:
+                        self._compact_schema_cache = self._render_compact_schema(list(self._catalog["tables"]))
+                    return self._compact_schema_cache
+
+                wanted = set(tables)
+                selected = [name for name in self._catalog["tables"] if name in wanted]
+                if compact:
+                    return self._render_compact_schema(selected)
+                return self._render_schema(selected, include_relationships=True)
 
-                schema_lines.append("")
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to retrieve schema: {e}")
 
-            schema_lines.append("\nIMPORTANT BUSINESS RULES:")
-            schema_lines.append("- Revenue = sum of payment.amount for a company (actual money received from customers)")
-            schema_lines.append("- Expenses = sum of expense.amount for a company (ALL expenses, not just those linked to specific jobs)")
-            schema_lines.append("- Profit = Revenue - Expenses (calculate separately, then subtract)")
-            schema_lines.append("- For profit calculations: Use separate subqueries for revenue and expenses, then subtract")
-            schema_lines.append("- Example profit query: SELECT (SELECT SUM(p.amount) FROM payment p JOIN invoice i ON p.invoice_id = i.invoice_id JOIN company c ON i.company_id = c.company_id WHERE c.name = 'X') - (SELECT SUM(e.amount) FROM expense e JOIN company c ON e.company_id = c.company_id WHERE c.name = 'X')")
-            schema_lines.append("- Do NOT join expenses through jobs/invoices for profit - use ALL company expenses")
-            schema_lines.append("")
+    def get_catalog(self) -> Dict:
+        """
+        Gets the cached database catalog
 
-            return "\n".join(schema_lines)
+        Returns:
+            {"tables": {table: [(column, type), ...]},
+             "primary_keys": {table: [column, ...]},
+             "foreign_keys": [(table, column, referenced_table, referenced_column), ...],
+             "schema_hash": fingerprint of the full schema text}
+        """
+        if not self.is_open or not self.db:
+            raise RuntimeError("Database is not open")
 
+        try:
+            with self._schema_lock:
+                self._refresh_schema_cache()
+                return dict(self._catalog, schema_hash=self._schema_hash)
         except sqlite3.Error as e:
             raise RuntimeError(f"Failed to retrieve schema: {e}")
 
+    @staticmethod
+    def schema_tables(schema: str) -> Set[str]:
+        """Extracts the table names listed in schema text produced by get_schema() (either format)"""
+        names = re.findall(r"^Table: (\S+)$", schema, re.MULTILINE)
+        names += re.findall(r"^([A-Za-z_][A-Za-z0-9_]*)\(", schema, re.MULTILINE)
+        return {name.lower() for name in names}
+
+    def get_schema_hash(self) -> Optional[str]:
+        """
+        Gets a stable fingerprint of the current schema
+
+        Suitable as a cache key for anything derived from the schema prompt.
+
+        Returns:
+            SHA-256 hex digest of the schema text, or None if the database is not open
+        """
+        if not self.is_open or not self.db:
+            return None
+
+        with self._schema_lock:
+            self.get_schema()
+            return self._schema_hash
+
+    def invalidate_schema_cache(self):
+        """Drops the cached schema so the next get_schema() call rebuilds it"""
+        with self._schema_lock:
+            self._schema_cache = None
+            self._compact_schema_cache = None
+            self._schema_version = None
+            self._schema_hash = None
+            self._catalog = None
+
+    def _refresh_schema_cache(self):
+        """Reloads the catalog and schema text if PRAGMA schema_version has changed"""
+        version = self._get_schema_version()
+        if self._schema_cache is not None and version == self._schema_version:
+            return
+
+        tables = self._get_table_names()
+        self._catalog = {
+            "tables": {table_name: self._get_table_columns(table_name) for table_name in tables},
+            "primary_keys": {table_name: self._get_primary_key(table_name) for table_name in tables},
+            "foreign_keys": [fk for table_name in tables for fk in self._get_foreign_keys(table_name)],
+        }
+
+        schema = self._render_schema(tables)
+        self._schema_cache = schema
+        self._compact_schema_cache = None
+        self._schema_version = version
+        self._schema_hash = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+    def _render_schema(self, tables: List[str], include_relationships: bool = False) -> str:
+        """Builds the schema prompt text for the given tables from the cached catalog"""
+        if not tables:
+            return "No tables found in database"
+
+        schema_lines = ["Database Schema:\n"]
+
+        for table_name in tables:
+            schema_lines.append(f"Table: {table_name}")
+            if table_name in BUSINESS_CONTEXT:
+                schema_lines.append(f"  NOTE: {BUSINESS_CONTEXT[table_name]}")
+            columns = self._catalog["tables"][table_name]
+
+            for col_name, col_type in columns:
+                schema_lines.append(f"  - {col_name} ({col_type})")
+
+            schema_lines.append("")
+
+        if include_relationships:
+            selected = set(tables)
+            relationships = [
+                f"- {table}.{column} -> {ref_table}.{ref_column}" if ref_column else f"- {table}.{column} -> {ref_table}"
+                for table, column, ref_table, ref_column in self._catalog["foreign_keys"]
+                if table in selected and ref_table in selected
+            ]
+            if relationships:
+                schema_lines.append("RELATIONSHIPS:")
+                schema_lines.extend(relationships)
+                schema_lines.append("")
+
+        schema_lines.append("\nIMPORTANT BUSINESS RULES:")
+        schema_lines.extend(BUSINESS_RULES)
+        if ROLLUP_TABLE in tables:
+            schema_lines.extend(ROLLUP_RULES)
+        schema_lines.append("")
+
+        return "\n".join(schema_lines)
+
+    def _render_compact_schema(self, tables: List[str]) -> str:
+        """
+        Builds a condensed schema: the business rules, then one line per table
+
+        Example line: job(job_id INTEGER PK, company_id INTEGER FK>company, ...) -- note
+        The static rules come first so the prompt prefix stays identical when only
+        the table selection changes.
+        """
+        if not tables:
+            return "No tables found in database"
+
+        # "FK>company" when the referenced column has the same name, otherwise "FK>company.id"
+        references = {
+            (table, column): ref_table if ref_column in (None, column) else f"{ref_table}.{ref_column}"
+            for table, column, ref_table, ref_column in self._catalog["foreign_keys"]
+        }
+
+        lines = ["BUSINESS RULES:"]
+        lines.extend(BUSINESS_RULES)
+        if ROLLUP_TABLE in tables:
+            lines.extend(ROLLUP_RULES)
+        lines.extend(["", "Database Schema (table(column TYPE, ...); PK = primary key, FK>t = references the same-named column of t, FK>t.c = references t.c):"])
+
+        for table_name in tables:
+            primary_key = self._catalog["primary_keys"].get(table_name, [])
+            columns = []
+            for col_name, col_type in self._catalog["tables"][table_name]:
+                column = f"{col_name} {col_type}"
+                if col_name in primary_key:
+                    column += " PK"
+                if (table_name, col_name) in references:
+                    column += f" FK>{references[(table_name, col_name)]}"
+                columns.append(column)
+
+            line = f"{table_name}({', '.join(columns)})"
+            if table_name in BUSINESS_CONTEXT:
+                line += f" -- {BUSINESS_CONTEXT[table_name]}"
+            lines.append(line)
+
+        return "\n".join(lines) + "\n"
+
+    def _get_schema_version(self) -> int:
+        """Gets SQLite's schema cookie, which changes whenever the schema is modified"""
+        cursor = self.db.cursor()
+        cursor.execute("PRAGMA schema_version")
+        return cursor.fetchone()[0]
+
     def _get_table_names(self) -> List[str]:
         """Gets table names in the database"""
         if not self.db:
@@ -160,16 +675,35 @@ class SQLiteManager:
             return []
 
         cursor = self.db.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
+        # table_xinfo also lists generated columns; hidden = 1 marks virtual table internals
+        cursor.execute(f"PRAGMA table_xinfo({table_name})")
 
         columns = []
         for row in cursor.fetchall():
+            if row[6] == 1:
+                continue
             col_name = row[1]
             col_type = row[2] if row[2] else "TEXT"
             columns.append((col_name, col_type))
 
         return columns
 
+    def _get_primary_key(self, table_name: str) -> List[str]:
+        """Gets the primary key column names of a table, in key order"""
+        cursor = self.db.cursor()
+        cursor.execute(f"PRAGMA table_info({table_name})")
+
+        # Row layout: cid, name, type, notnull, dflt_value, pk (1-based position in the key, 0 if not)
+        return [row[1] for row in sorted(cursor.fetchall(), key=lambda row: row[5]) if row[5]]
+
+    def _get_foreign_keys(self, table_name: str) -> List[Tuple[str, str, str, str]]:
+        """Gets (table, column, referenced_table, referenced_column) for each foreign key of a table"""
+        cursor = self.db.cursor()
+        cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+
+        # Row layout: id, seq, table, from, to, on_update, on_delete, match
+        return [(table_name, row[3], row[2], row[4]) for row in cursor.fetchall()]
+
     def is_open(self) -> bool:
         """Checks if database is open"""
         return self.is_open
@@ -0,0 +1,19 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE = os.path.join(REPO_ROOT, "centralglass_recon.sqlite")
+
+# The modules live flat in the repository root
+sys.path.insert(0, REPO_ROOT)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A scratch copy of the bundled Central Glass / Recon database"""
+    path = str(tmp_path / "centralglass_recon.sqlite")
+    shutil.copyfile(DEFAULT_DATABASE, path)
+    return path
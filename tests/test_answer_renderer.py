@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from answer_renderer import AnswerRenderer, format_value
+from query_result import QueryResult
+
+
+@pytest.fixture
+def connection(database):
+    connection = sqlite3.connect(database)
+    yield connection
+    connection.close()
+
+
+def render(connection, question, sql, policy="auto"):
+    result = QueryResult.from_cursor(connection.execute(sql), max_rows=100)
+    return AnswerRenderer(policy).render(question, result)
+
+
+def test_filtered_count_goes_to_the_model(connection):
+    question = "How many jobs are currently in progress?"
+    sql = "SELECT COUNT(*) FROM job WHERE status = 'in_progress'"
+    assert render(connection, question, sql) is None
+    # Without a model the answer restates the question instead of dropping its filter
+    assert render(connection, question, sql, "local") == f'The answer to "{question}" is 1.'
+
+
+def test_unqualified_count_is_rendered_locally(connection):
+    assert render(connection, "How many jobs are there?", "SELECT COUNT(*) FROM job") == "The number of jobs is 8."
+
+
+def test_what_is_question_keeps_its_qualifiers(connection):
+    answer = render(connection, "What is the total revenue for Central Glass DC?",
+                    "SELECT SUM(p.amount) FROM payment p JOIN company c USING (company_id) "
+                    "WHERE c.name = 'Central Glass DC'")
+    assert answer == "The total revenue for Central Glass DC is 9,100.00."
+    assert render(connection, "What are the total expenses?", "SELECT SUM(amount) FROM expense") \
+        == "The total expenses are 4,020.75."
+
+
+def test_list_leads_with_a_name_column(connection):
+    answer = render(connection, "Which customers are the first jobs for?",
+                    "SELECT j.job_id, c.name FROM job j JOIN customer c USING (customer_id) ORDER BY j.job_id LIMIT 3")
+    assert answer.splitlines()[2:] == [
+        "- Crescent Valley Library (job id: 1)",
+        "- Northbridge Property Group (job id: 2)",
+        "- Pine & Harbor Apartments (job id: 3)",
+    ]
+
+
+@pytest.mark.parametrize("value, column, expected", [
+    (1024, "job_id", "1024"),
+    (2026, "year", "2026"),
+    (2026, "invoice_year", "2026"),
+    (1024, "COUNT(job_id)", "1,024"),
+    (1024, "jobs", "1,024"),
+    (1234.5, "SUM(amount)", "1,234.50"),
+    (1234.5, "total_revenue", "1,234.50"),
+    (0.123456789, "completion_ratio", "0.123456789"),
+    (0.1 + 0.2, "rate", "0.3"),
+    (None, "amount", "no value"),
+])
+def test_format_value(value, column, expected):
+    assert format_value(value, column) == expected
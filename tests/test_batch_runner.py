@@ -0,0 +1,48 @@
+import io
+import json
+
+from answer_renderer import AnswerRenderer
+from batch_runner import BatchRunner
+from intent_templates import IntentTemplates
+from metrics import MetricsRegistry
+from query_processor import QueryProcessor
+from sqlite_manager import SQLiteManager
+
+EXAMPLE = ("How many jobs does Recon Pest Control have?",
+           "SELECT COUNT(*) FROM job j JOIN company c ON c.company_id = j.company_id WHERE c.name = 'Recon Pest Control'")
+
+
+def test_every_thread_manager_is_closed(database, tmp_path, monkeypatch):
+    clones = []
+    clone = SQLiteManager.clone
+
+    def recording_clone(self):
+        manager = clone(self)
+        clones.append(manager)
+        return manager
+
+    monkeypatch.setattr(SQLiteManager, "clone", recording_clone)
+
+    db_manager = SQLiteManager()
+    assert db_manager.open_database(database)
+    # Questions matching the template need no model; the rest fail in the LLM stage (no client),
+    # after their database thread has already opened a connection
+    processor = QueryProcessor(db_manager, None, metrics=MetricsRegistry(),
+                               intent_templates=IntentTemplates([EXAMPLE]),
+                               answer_renderer=AnswerRenderer("local"))
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text("\n".join(json.dumps(question) for question in [
+        "How many jobs does Recon Pest Control have?",
+        "How many jobs does Central Glass DC have?",
+        "What is the average invoice?",
+        "Which customer pays the most?",
+    ]) + "\n")
+
+    output = io.StringIO()
+    summary = BatchRunner(processor, workers=4, db_workers=3).run(str(questions), output)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert summary["succeeded"] == 2 and summary["failed"] == 2
+    assert sorted(record["rows"][0][0] for record in records if "rows" in record) == [4, 4]
+    assert clones and all(not manager.is_open for manager in clones)
+    db_manager.close_database()
@@ -0,0 +1,117 @@
+import pytest
+
+from entity_index import EntityIndex, similarity
+from sqlite_manager import SQLiteManager
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+@pytest.fixture
+def index(db_manager):
+    index = EntityIndex()
+    index.refresh(db_manager)
+    yield index
+    index.close()
+
+
+def test_low_cardinality_text_columns_are_indexed(index):
+    assert ("company", "name") in index.columns
+    assert ("job", "status") in index.columns
+    # Dates stored as text are not entities
+    assert ("job", "start_date") not in index.columns
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM company WHERE name = 'Central Glass'",
+     "SELECT * FROM company WHERE name = 'Central Glass DC'"),
+    ("SELECT * FROM job j WHERE j.status = 'in progress'",
+     "SELECT * FROM job j WHERE j.status = 'in_progress'"),
+    ("SELECT * FROM job j JOIN company c ON c.company_id = j.company_id WHERE c.name = 'recon pest'",
+     "SELECT * FROM job j JOIN company c ON c.company_id = j.company_id WHERE c.name = 'Recon Pest Control'"),
+])
+def test_unknown_literals_are_rewritten_to_stored_values(index, sql, expected):
+    rewritten, replacements = index.rewrite_sql(sql)
+    assert rewritten == expected
+    assert len(replacements) == 1
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM company WHERE name = 'Recon Pest Control'",
+    "SELECT * FROM company WHERE name = 'Acme Roofing Supplies'",
+    # Close spellings are not evidence: 'unpaid' is not 'paid', 'material' is not 'materials'
+    "SELECT * FROM invoice WHERE status = 'unpaid'",
+    "SELECT * FROM expense WHERE category = 'material'",
+    "SELECT * FROM company WHERE name = 'recon pest controll'",
+    # Unindexed columns are left alone
+    "SELECT * FROM job WHERE start_date = '2024-01'",
+    # The literal is compared to a column of another table
+    "SELECT * FROM job WHERE status = 'Central Glass'",
+])
+def test_other_literals_are_kept(index, sql):
+    assert index.rewrite_sql(sql) == (sql, [])
+
+
+def test_quotes_in_rewritten_values_are_escaped(db_manager):
+    db_manager.execute_query("INSERT INTO company (name) VALUES ('O''Brien Glazing')")
+    index = EntityIndex()
+    try:
+        index.refresh(db_manager)
+        rewritten, _ = index.rewrite_sql("SELECT * FROM company WHERE name = 'o''brien glazing'")
+        assert rewritten == "SELECT * FROM company WHERE name = 'O''Brien Glazing'"
+    finally:
+        index.close()
+
+
+def test_ambiguous_partial_literals_are_kept(db_manager):
+    db_manager.execute_query("INSERT INTO company (name) VALUES ('Central Glass West')")
+    index = EntityIndex()
+    try:
+        index.refresh(db_manager)
+        sql = "SELECT * FROM company WHERE name = 'Central Glass'"
+        assert index.rewrite_sql(sql) == (sql, [])
+    finally:
+        index.close()
+
+
+def test_question_mentions_are_grounded(index):
+    matches = index.ground("How much did central glas invoice last month?")
+    assert matches[0].value == "Central Glass DC"
+    assert str(matches[0]) == "company.name = 'Central Glass DC'"
+
+
+def test_longer_mentions_rank_first(index):
+    # 'glass' alone is a whole word of glass_install, but 'centrl glass' explains more of the question
+    matches = index.ground("How many jobs for centrl glass?")
+    assert str(matches[0]) == "company.name = 'Central Glass DC'"
+
+
+def test_index_is_rebuilt_when_data_changes(db_manager, index):
+    assert not index.refresh(db_manager)
+    db_manager.execute_query("INSERT INTO company (name) VALUES ('Acme Roofing')")
+    assert index.refresh(db_manager)
+    assert index.rewrite_sql("SELECT * FROM company WHERE name = 'acme roofing'")[0].endswith("'Acme Roofing'")
+
+
+def test_file_index_is_reused_across_sessions(db_manager, tmp_path):
+    path = str(tmp_path / "entities.sqlite")
+    first = EntityIndex(path)
+    assert first.refresh(db_manager)
+    first.close()
+
+    second = EntityIndex(path)
+    try:
+        assert not second.refresh(db_manager)
+        assert ("company", "name") in second.columns
+    finally:
+        second.close()
+
+
+def test_similarity():
+    assert similarity("central glass dc", "central glass dc") == 1.0
+    assert similarity("central glas", "central glass dc") > similarity("recon", "central glass dc")
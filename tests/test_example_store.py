@@ -0,0 +1,37 @@
+from example_store import ExampleStore
+
+EXAMPLES = [
+    ("How many jobs does Central Glass have?", "SELECT COUNT(*) FROM job j JOIN company c USING (company_id) "
+                                               "WHERE c.name = 'Central Glass'"),
+    ("What is the total of all invoices?", "SELECT SUM(total_amount) FROM invoice"),
+]
+
+
+def test_sync_adds_new_examples_incrementally(tmp_path):
+    store = ExampleStore.from_examples(EXAMPLES[:1])
+    assert store.sync(EXAMPLES)
+    assert store.examples == EXAMPLES
+    assert not store.sync(EXAMPLES)
+
+
+def test_sync_drops_edited_examples(tmp_path):
+    path = str(tmp_path / "index.json")
+    ExampleStore.from_examples(EXAMPLES).save(path)
+
+    edited = [(EXAMPLES[0][0], EXAMPLES[0][1].replace("'Central Glass'", "'Central Glass DC'")), EXAMPLES[1]]
+    store = ExampleStore.load(path)
+    assert store.sync(edited)
+    store.save(path)
+
+    reloaded = ExampleStore.load(path)
+    assert reloaded.examples == edited
+    assert reloaded.top_k("How many jobs does Central Glass DC have?", k=1) == [edited[0]]
+    # The rebuilt index matches one built from scratch
+    assert reloaded.postings == ExampleStore.from_examples(edited).postings
+
+
+def test_sync_drops_removed_examples():
+    store = ExampleStore.from_examples(EXAMPLES)
+    assert store.sync(EXAMPLES[1:])
+    assert store.examples == EXAMPLES[1:]
+    assert store.top_k("jobs for Central Glass", k=5) == []
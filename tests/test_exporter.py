@@ -0,0 +1,109 @@
+import argparse
+import csv
+import json
+import sqlite3
+
+import pytest
+
+import main
+from exporter import export_cursor, unique_columns
+from sqlite_manager import SQLiteManager
+
+JOIN = "SELECT j.*, i.* FROM job j JOIN invoice i ON i.job_id = j.job_id ORDER BY i.invoice_id"
+
+
+@pytest.fixture
+def connection(database):
+    connection = sqlite3.connect(database)
+    yield connection
+    connection.close()
+
+
+def test_unique_columns():
+    assert unique_columns(["id", "name", "id", "id"]) == ["id", "name", "id_2", "id_3"]
+    # A generated name never collides with a real column
+    assert unique_columns(["id", "id", "id_2"]) == ["id", "id_3", "id_2"]
+    assert unique_columns(["a", "b"]) == ["a", "b"]
+
+
+def test_jsonl_keeps_duplicate_columns(connection, tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    summary = export_cursor(connection.execute(JOIN), path, batch_size=2)
+    expected = connection.execute(JOIN).fetchall()
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert summary.rows == len(records) == len(expected)
+    assert [list(record.values()) for record in records] == [list(row) for row in expected]
+    assert "job_id_2" in records[0] and "company_id_2" in records[0] and "status_2" in records[0]
+
+
+def test_csv_matches_jsonl(connection, tmp_path):
+    export_cursor(connection.execute(JOIN), str(tmp_path / "out.csv"))
+    with open(tmp_path / "out.csv", newline="", encoding="utf-8") as f:
+        header, *rows = list(csv.reader(f))
+    assert len(header) == len(connection.execute(JOIN).description)
+    assert len(rows) == len(connection.execute(JOIN).fetchall())
+    assert not (tmp_path / "out.csv.part").exists()
+
+
+def test_parquet_schema_is_inferred_past_leading_nulls(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (id INTEGER, amount REAL, note TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)",
+                           [(i, None, None) for i in range(5)] + [(5, 1.5, "late"), (6, 2, None)])
+    path = str(tmp_path / "out.parquet")
+    # Batches of two: amount and note are NULL in the first two batches
+    summary = export_cursor(connection.execute("SELECT * FROM t ORDER BY id"), path, batch_size=2)
+    connection.close()
+
+    table = pyarrow.parquet.read_table(path)
+    assert summary.rows == table.num_rows == 7
+    assert table.schema.field("id").type == pyarrow.int64()
+    assert table.schema.field("amount").type == pyarrow.float64()
+    assert table.schema.field("note").type == pyarrow.string()
+    assert table.column("amount").to_pylist() == [None] * 5 + [1.5, 2.0]
+    assert table.column("note").to_pylist() == [None] * 5 + ["late", None]
+
+
+def test_parquet_mixed_type_sample_is_written_as_strings(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    connection = sqlite3.connect(":memory:")
+    path = str(tmp_path / "out.parquet")
+    export_cursor(connection.execute("SELECT 1 AS value UNION ALL SELECT 'a'"), path)
+    connection.close()
+    assert pyarrow.parquet.read_table(path).column("value").to_pylist() == ["1", "a"]
+
+
+def test_parquet_type_change_after_the_schema_is_fixed(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (value)")
+    connection.executemany("INSERT INTO t VALUES (?)", [(1,), (2,), ("three",)])
+    with pytest.raises(RuntimeError, match="value changes type mid-result"):
+        export_cursor(connection.execute("SELECT value FROM t ORDER BY rowid"), str(tmp_path / "out.parquet"),
+                      batch_size=1)
+    connection.close()
+
+
+def test_unwritable_export_path_is_reported(database, tmp_path, capsys):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+
+    class Processor:
+        def export_query(self, question, path, export_format=None, show_debug=True):
+            return manager.export_result("SELECT * FROM job", path, export_format)
+
+    args = argparse.Namespace(export=(str(tmp_path / "missing" / "jobs.csv"), "All jobs"), export_format=None,
+                              no_debug=True)
+    try:
+        assert main.run_export(Processor(), args) == 1
+    finally:
+        manager.close_database()
+    assert capsys.readouterr().err.startswith("Error: ")
@@ -0,0 +1,61 @@
+import sqlite3
+
+from index_advisor import IndexAdvisor, WorkloadLog, read_workload
+
+WORKLOAD = [
+    "SELECT COUNT(*) FROM Job j WHERE j.Status = 'completed'",
+    "SELECT SUM(amount) FROM expense WHERE CATEGORY = 'materials'",
+    "SELECT name FROM company",
+]
+
+
+def record(database, path, statements):
+    log = WorkloadLog(path)
+    connection = sqlite3.connect(database)
+    for sql in statements:
+        log.record(connection, sql, 0.001)
+    connection.close()
+    log.close()
+    return read_workload(path)
+
+
+def test_columns_are_matched_case_insensitively(database, tmp_path):
+    workload = record(database, str(tmp_path / "workload.jsonl"), WORKLOAD)
+    recommendations = IndexAdvisor(database).recommend(workload)
+    assert sorted((r.table, r.column) for r in recommendations) == [("expense", "category"), ("job", "status")]
+
+
+def test_plans_from_older_sqlite_versions(database):
+    # SQLite before 3.36 names loops "SCAN TABLE x AS y" instead of "SCAN y"
+    workload = [
+        {"sql": WORKLOAD[0], "plan": ["SCAN TABLE job AS j"], "executions": 1},
+        {"sql": "SELECT * FROM invoice i JOIN payment p ON p.method = i.status",
+         "plan": ["SCAN TABLE invoice AS i", "SEARCH TABLE payment AS p USING AUTOMATIC COVERING INDEX (method=?)"],
+         "executions": 1},
+    ]
+    recommendations = IndexAdvisor(database).recommend(workload)
+    assert sorted((r.table, r.column) for r in recommendations) == [
+        ("invoice", "status"), ("job", "status"), ("payment", "method")]
+
+
+def test_each_recommendation_is_timed_on_its_own(database, tmp_path):
+    workload = record(database, str(tmp_path / "workload.jsonl"), WORKLOAD)
+    advisor = IndexAdvisor(database)
+    recommendations = advisor.recommend(workload)
+    copy_path = str(tmp_path / "indexed.sqlite")
+
+    evaluation = advisor.evaluate(recommendations, workload, copy_path, repeat=1)
+
+    by_index = {timing.recommendation.name: timing for timing in evaluation.recommendations}
+    assert [t.sql for t in by_index["idx_job_status"].timings] == [WORKLOAD[0]]
+    assert [t.sql for t in by_index["idx_expense_category"].timings] == [WORKLOAD[1]]
+    assert all(t.before_ms is not None and t.after_ms is not None
+               for timing in evaluation.recommendations for t in timing.timings)
+    assert len(evaluation.combined) == len(WORKLOAD)
+
+    # The copy keeps every index; the original is untouched
+    indexes = {row[0] for row in sqlite3.connect(copy_path).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+    assert indexes == set(by_index)
+    assert not sqlite3.connect(database).execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'idx_%'").fetchone()[0]
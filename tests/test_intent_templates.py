@@ -0,0 +1,85 @@
+import pytest
+
+from intent_templates import IntentTemplates, normalize_question
+from sqlite_manager import SQLiteManager
+
+COMPANY_JOBS = ("How many jobs does Recon Pest Control have?",
+                "SELECT COUNT(*) FROM job j JOIN company c ON c.company_id = j.company_id "
+                "WHERE c.name = 'Recon Pest Control'")
+JOBS_BY_STATUS = ("List the jobs that are completed",
+                  "SELECT job_id FROM job WHERE status = 'completed'")
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+def test_template_is_derived_from_the_example(db_manager):
+    templates = IntentTemplates([COMPANY_JOBS])
+    assert templates.refresh(db_manager)
+    template = templates.templates[0]
+    assert template.pattern == "How many jobs does {company} have?"
+    assert template.sql.endswith("WHERE c.name = :company")
+    assert template.slots == {"company": ("company", "name")}
+
+
+def test_question_about_another_value_matches_and_runs(db_manager):
+    templates = IntentTemplates([COMPANY_JOBS])
+    templates.refresh(db_manager)
+    match = templates.match("  how many JOBS does central glass dc have ")
+    assert match.params == {"company": "Central Glass DC"}
+    assert match.display_sql.endswith("WHERE c.name = 'Central Glass DC'")
+
+    expected = db_manager.fetch_result(match.display_sql).rows
+    assert db_manager.fetch_result(match.sql, match.params).rows == expected == [(4,)]
+
+
+def test_underscored_values_match_their_spaced_spelling(db_manager):
+    templates = IntentTemplates([JOBS_BY_STATUS])
+    templates.refresh(db_manager)
+    match = templates.match("List the jobs that are in progress")
+    assert match is not None and match.params == {"job_status": "in_progress"}
+
+
+@pytest.mark.parametrize("question", [
+    "How many jobs does Acme have?",
+    "How many jobs does Recon Pest Control have this year?",
+    "What jobs does Recon Pest Control have?",
+])
+def test_other_questions_fall_through(db_manager, question):
+    templates = IntentTemplates([COMPANY_JOBS])
+    templates.refresh(db_manager)
+    assert templates.match(question) is None
+
+
+def test_examples_without_stored_literals_give_no_template(db_manager):
+    templates = IntentTemplates([("How many jobs are there?", "SELECT COUNT(*) FROM job"),
+                                 ("Jobs of Acme?", "SELECT * FROM job j JOIN company c USING (company_id) "
+                                                   "WHERE c.name = 'Acme'")])
+    templates.refresh(db_manager)
+    assert len(templates) == 0
+
+
+def test_columns_with_too_many_values_are_not_slots(db_manager):
+    templates = IntentTemplates([COMPANY_JOBS], max_slot_values=1)
+    templates.refresh(db_manager)
+    assert len(templates) == 0
+
+
+def test_new_values_are_picked_up_on_refresh(db_manager):
+    templates = IntentTemplates([COMPANY_JOBS])
+    templates.refresh(db_manager)
+    assert not templates.refresh(db_manager)
+
+    db_manager.execute_query("INSERT INTO company (name) VALUES ('Acme Roofing')")
+    assert templates.match("How many jobs does Acme Roofing have?") is None
+    assert templates.refresh(db_manager, force=True)
+    assert templates.match("How many jobs does Acme Roofing have?").params == {"company": "Acme Roofing"}
+
+
+def test_normalize_question():
+    assert normalize_question("  How MANY\tjobs?! ") == "how many jobs"
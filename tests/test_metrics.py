@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry
+
+
+def histogram_of(values, buckets):
+    histogram = Histogram(buckets)
+    for value in values:
+        histogram.observe(value)
+    return histogram
+
+
+def test_empty_histogram_has_no_quantiles():
+    assert Histogram().quantile(0.5) is None
+
+
+def test_quantiles_interpolate_within_buckets():
+    histogram = histogram_of(range(1, 101), buckets=range(10, 101, 10))
+    assert histogram.quantile(0.5) == pytest.approx(50)
+    assert histogram.quantile(0.95) == pytest.approx(95)
+    assert histogram.quantile(0.99) == pytest.approx(99)
+    assert histogram.quantile(1.0) == 100
+
+
+def test_quantiles_are_exact_when_a_bucket_holds_equal_samples():
+    histogram = histogram_of([0.3] * 10, buckets=(0.1, 0.5, 1.0))
+    assert histogram.quantile(0.5) == 0.3
+    assert histogram.quantile(0.99) == 0.3
+
+
+def test_quantiles_stay_within_the_observed_range():
+    histogram = histogram_of([12, 13, 14], buckets=(10, 100))
+    assert 12 <= histogram.quantile(0.01) and histogram.quantile(0.99) <= 14
+
+
+def test_overflow_bucket_interpolates_up_to_the_maximum():
+    histogram = histogram_of([0.5, 70, 90], buckets=(1, 60))
+    assert histogram.counts == [1, 0, 2]
+    assert 60 <= histogram.quantile(0.9) <= 90
+    assert histogram.quantile(1.0) == 90
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = histogram_of([1, 1.5, 2], buckets=(1, 2))
+    assert histogram.counts == [1, 2, 0]
+    assert histogram._cumulative() == [1, 3, 3]
+
+
+def test_counters_accumulate_per_label_set():
+    metrics = MetricsRegistry()
+    metrics.increment("answers_total", formatter="local")
+    metrics.increment("answers_total", 2, formatter="local")
+    metrics.increment("answers_total", formatter="llm")
+    assert metrics.counter_value("answers_total", formatter="local") == 3
+    assert metrics.counter_value("answers_total", formatter="llm") == 1
+    assert metrics.counter_value("answers_total", formatter="other") == 0
+
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry()
+    metrics.increment("sql_cache_requests_total", result="hit")
+    metrics.increment("sql_cache_requests_total", 2, result="miss")
+    metrics.observe("result_rows", 5, buckets=(1, 10))
+    metrics.observe("result_rows", 50, buckets=(1, 10))
+
+    assert metrics.to_prometheus().splitlines() == [
+        "# HELP sql_cache_requests_total Question-to-SQL cache lookups by result",
+        "# TYPE sql_cache_requests_total counter",
+        'sql_cache_requests_total{result="hit"} 1',
+        'sql_cache_requests_total{result="miss"} 2',
+        "# HELP result_rows Rows returned by executed queries",
+        "# TYPE result_rows histogram",
+        'result_rows_bucket{le="1"} 0',
+        'result_rows_bucket{le="10"} 1',
+        'result_rows_bucket{le="+Inf"} 2',
+        "result_rows_sum 55.0",
+        "result_rows_count 2",
+    ]
+
+
+def test_prometheus_labels_are_escaped_and_fractions_kept():
+    metrics = MetricsRegistry()
+    metrics.describe("custom_total", "A custom counter")
+    metrics.increment("custom_total", 0.5, path='C:\\data "q"\nnext')
+    metrics.observe("custom_seconds", 0.2, buckets=(0.25,), stage="x")
+
+    text = metrics.to_prometheus()
+    assert 'custom_total{path="C:\\\\data \\"q\\"\\nnext"} 0.5' in text
+    assert 'custom_seconds_bucket{stage="x",le="0.25"} 1' in text
+    # Metrics without a description get no HELP line
+    assert "# HELP custom_seconds" not in text
+    assert text.endswith("\n")
+
+
+def test_snapshot_and_jsonl_export(tmp_path):
+    metrics = MetricsRegistry()
+    metrics.increment("answers_total", formatter="local")
+    metrics.observe("stage_seconds", 0.02, stage="execute_sql")
+
+    path = tmp_path / "metrics.jsonl"
+    metrics.export_jsonl(str(path))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["name"], line["type"]) for line in lines] == [("answers_total", "counter"),
+                                                               ("stage_seconds", "histogram")]
+    assert lines[1]["labels"] == {"stage": "execute_sql"}
+    assert lines[1]["p50"] == 0.02 and lines[1]["buckets"]["+Inf"] == 1
+
+
+def test_timer_records_even_when_the_block_raises():
+    metrics = MetricsRegistry()
+    with pytest.raises(ValueError):
+        with metrics.timer("stage_seconds", stage="execute_sql"):
+            raise ValueError("boom")
+    assert metrics.snapshot()[0]["count"] == 1
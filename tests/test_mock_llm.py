@@ -0,0 +1,42 @@
+import socket
+
+import pytest
+
+from benchmarks.mock_llm import MockLLMServer
+from openai_client import OpenAIClient
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    server = MockLLMServer(latency=0.0).start()
+    yield server
+    server.stop()
+
+
+def test_keep_alive_connection_disables_nagle(mock, monkeypatch):
+    # Nagle's algorithm plus delayed ACK would add ~40 ms per keep-alive request, since the
+    # server writes headers and body separately; check the cause rather than timing it
+    handler = mock._server.RequestHandlerClass
+    nodelay = []
+    original_setup = handler.setup
+
+    def setup(self):
+        original_setup(self)
+        nodelay.append(self.connection.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    monkeypatch.setattr(handler, "setup", setup)
+
+    client = OpenAIClient(base_url=mock.base_url)
+    replies = [client.send_prompt("hello") for _ in range(5)]
+
+    assert mock.requests == 5
+    assert len(set(replies)) == 1
+    # One pooled connection served every request, with TCP_NODELAY set
+    assert nodelay == [1]
+
+
+def test_streamed_reply_matches_plain_reply(mock):
+    client = OpenAIClient(base_url=mock.base_url)
+    prompt = "Summarize the results"
+    assert "".join(client.stream_prompt(prompt)) == client.send_prompt(prompt)
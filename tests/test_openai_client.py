@@ -0,0 +1,226 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import openai_client
+from openai_client import OpenAIClient
+
+COMPLETION = {"choices": [{"message": {"content": "SELECT 1"}}],
+              "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}}
+
+
+class StandInServer:
+    """
+    Local stand-in for the chat completions endpoint that replays scripted responses
+
+    A status of None closes the connection without sending a response. A 200 response
+    sends stream_body as a server-sent event stream when one is given.
+    """
+
+    def __init__(self, responses, stream_body=None):
+        self.responses = list(responses)
+        self.stream_body = stream_body
+        self.requests = 0
+        self.payloads = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                server.payloads.append(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+                server.requests += 1
+                status, headers, delay = server.responses.pop(0) if server.responses else (200, {}, 0)
+                threading.Event().wait(delay)
+                if status is None:
+                    # Drop the connection after the request was read, without responding
+                    self.close_connection = True
+                    return
+                if status == 200 and server.stream_body is not None:
+                    body, content_type = server.stream_body.encode(), "text/event-stream"
+                else:
+                    body = json.dumps(COMPLETION if status == 200 else {"error": "scripted"}).encode()
+                    content_type = "application/json"
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records backoff sleeps instead of waiting"""
+    recorded = []
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(openai_client.time, "sleep", recorded.append)
+    return recorded
+
+
+def make_client(url, **kwargs):
+    kwargs.setdefault("max_retries", 3)
+    return OpenAIClient(base_url=url, connect_timeout=1.0, read_timeout=1.0, **kwargs)
+
+
+def test_retry_after_is_honored_on_429(sleeps):
+    with StandInServer([(429, {"Retry-After": "2"}, 0)]) as server:
+        client = make_client(server.url)
+        assert client.send_prompt("q") == "SELECT 1"
+
+    assert server.requests == 2
+    assert sleeps == [2.0]
+    assert client.metrics.counter_value("openai_retries_total", reason=429) == 1
+
+
+def test_server_error_then_success_backs_off_exponentially(sleeps):
+    with StandInServer([(500, {}, 0), (503, {}, 0)]) as server:
+        client = make_client(server.url, backoff_base=0.5)
+        assert client.send_prompt("q") == "SELECT 1"
+
+    assert server.requests == 3
+    # Full jitter: attempt n sleeps somewhere in [0, base * 2 ** n]
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    with StandInServer([(502, {}, 0)] * 5) as server:
+        client = make_client(server.url, max_retries=2)
+        with pytest.raises(RuntimeError, match="502"):
+            client.send_prompt("q")
+
+    assert server.requests == 3
+    assert len(sleeps) == 2
+
+
+def test_backoff_is_capped(sleeps):
+    client = make_client("http://127.0.0.1:1/v1", backoff_base=1.0, backoff_max=4.0)
+    assert all(client._backoff_delay(attempt) <= 4.0 for attempt in range(10))
+
+
+def test_read_timeout_is_not_retried_by_default(sleeps):
+    with StandInServer([(200, {}, 1.5)]) as server:
+        client = make_client(server.url)
+        with pytest.raises(RuntimeError, match="timed out"):
+            client.send_prompt("q")
+
+    assert server.requests == 1
+    assert sleeps == []
+
+
+def test_read_timeout_retry_is_opt_in(sleeps):
+    with StandInServer([(200, {}, 1.5)]) as server:
+        client = make_client(server.url, retry_read_timeouts=True)
+        assert client.send_prompt("q") == "SELECT 1"
+
+    assert server.requests == 2
+
+
+def test_connection_errors_are_retried(sleeps):
+    client = make_client("http://127.0.0.1:1/v1", max_retries=2)
+    with pytest.raises(RuntimeError, match="request failed"):
+        client.send_prompt("q")
+
+    assert len(sleeps) == 2
+    assert client.metrics.counter_value("openai_retries_total", reason="connection_error") == 2
+
+
+def test_connection_aborted_after_sending_is_not_retried_by_default(sleeps):
+    with StandInServer([(None, {}, 0)]) as server:
+        client = make_client(server.url)
+        with pytest.raises(RuntimeError, match="aborted"):
+            client.send_prompt("q")
+
+    assert server.requests == 1
+    assert sleeps == []
+    assert client.metrics.counter_value("openai_requests_total", status="connection_aborted") == 1
+
+
+def test_connection_aborted_retry_is_opt_in(sleeps):
+    with StandInServer([(None, {}, 0)]) as server:
+        client = make_client(server.url, retry_read_timeouts=True)
+        assert client.send_prompt("q") == "SELECT 1"
+
+    assert server.requests == 2
+
+
+def test_conflict_is_not_retried(sleeps):
+    with StandInServer([(409, {}, 0)]) as server:
+        client = make_client(server.url)
+        with pytest.raises(RuntimeError, match="409"):
+            client.send_prompt("q")
+
+    assert server.requests == 1
+    assert sleeps == []
+
+
+def sse(*events):
+    return "".join(f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n" for event in events)
+
+
+def delta(**fields):
+    return {"choices": [{"index": 0, "delta": fields}]}
+
+
+def test_stream_yields_content_deltas_in_order(sleeps):
+    body = (": keep-alive\n\n"
+            + sse(delta(role="assistant"), delta(content="There are "), delta(content=""))
+            + "event: message\ndata:" + json.dumps(delta(content="8 jobs")) + "\n\n"
+            + sse(delta(), "[DONE]", delta(content="after the end")))
+    with StandInServer([], stream_body=body) as server:
+        client = make_client(server.url)
+        assert list(client.stream_prompt("q")) == ["There are ", "8 jobs"]
+
+    assert server.payloads[0]["stream"] is True
+    assert server.payloads[0]["stream_options"] == {"include_usage": True}
+
+
+def test_stream_usage_chunk_is_recorded(sleeps):
+    usage = {"prompt_tokens": 11, "completion_tokens": 4, "total_tokens": 15}
+    body = sse(delta(content="8"), {"choices": [], "usage": usage}, "[DONE]")
+    with StandInServer([], stream_body=body) as server:
+        client = make_client(server.url)
+        assert list(client.stream_prompt("q", model="gpt-4.1-mini")) == ["8"]
+
+    for kind, tokens in (("prompt", 11), ("completion", 4), ("total", 15)):
+        assert client.metrics.counter_value("openai_tokens_total", model="gpt-4.1-mini", kind=kind) == tokens
+
+
+def test_stream_without_usage_records_no_tokens(sleeps):
+    with StandInServer([], stream_body=sse(delta(content="8"), "[DONE]")) as server:
+        client = make_client(server.url)
+        assert list(client.stream_prompt("q")) == ["8"]
+
+    assert client.metrics.counter_value("openai_tokens_total", model="gpt-4.1", kind="total") == 0
+
+
+def test_malformed_stream_event_raises(sleeps):
+    with StandInServer([], stream_body=sse(delta(content="8"), "{not json")) as server:
+        client = make_client(server.url)
+        stream = client.stream_prompt("q")
+        assert next(stream) == "8"
+        with pytest.raises(RuntimeError, match="stream event"):
+            next(stream)
@@ -0,0 +1,161 @@
+import sqlite3
+
+import pytest
+
+import prompt_budget
+from openai_client import OpenAIClient
+from prompt_budget import (TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, TRUNCATION_NOTE, PromptBudget, TokenCounter,
+                           drop_schema_tables, split_schema)
+from query_result import QueryResult
+from sqlite_manager import SQLiteManager
+
+PROFIT_QUESTION = "What was the total profit for Central Glass DC?"
+EXAMPLES = [
+    ("How many jobs are there?", "SELECT COUNT(*) FROM job"),
+    ("List all customers", "SELECT name FROM customer"),
+    ("Total payroll per employee", "SELECT employee_id, SUM(gross_pay) FROM payroll GROUP BY employee_id"),
+]
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    """Character-estimate counter, so token counts do not depend on tiktoken being installed"""
+    monkeypatch.setattr(prompt_budget, "_load_encoding", lambda model: None)
+    return TokenCounter()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    client = OpenAIClient(base_url="http://127.0.0.1:1/v1")
+    yield client
+    client.close()
+
+
+def sql_builder(client, question):
+    return lambda schema, examples: client.build_sql_messages(question, schema, examples)
+
+
+def test_token_estimate_without_tokenizer(counter):
+    assert not counter.exact
+    assert counter.count("") == 0
+    assert counter.count("abcd") == 1
+    assert counter.count("abcde") == 2
+    messages = [{"role": "system", "content": "abcd"}, {"role": "user", "content": "abcdefgh"}]
+    assert counter.count_messages(messages) == 2 * TOKENS_PER_MESSAGE + 3 + TOKENS_PER_REPLY
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_split_schema_finds_every_table(db_manager, compact):
+    schema = db_manager.get_schema(compact=compact)
+    other, blocks = split_schema(schema)
+    assert [name for name, _ in blocks] == list(db_manager.get_catalog()["tables"])
+    assert other.count(None) == len(blocks)
+    assert any(line and "BUSINESS RULES" in line for line in other)
+    if compact:
+        assert all(len(block) == 1 for _, block in blocks)
+    else:
+        assert all(block[0] == f"Table: {name}" for name, block in blocks)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_drop_schema_tables(db_manager, compact):
+    schema = db_manager.get_schema(compact=compact)
+    trimmed = drop_schema_tables(schema, {"payroll", "pay_period"})
+    assert SQLiteManager.schema_tables(trimmed) == SQLiteManager.schema_tables(schema) - {"payroll", "pay_period"}
+    assert "BUSINESS RULES" in trimmed
+
+
+def test_drop_schema_tables_removes_relationships(db_manager):
+    schema = db_manager.get_schema(tables=["company", "job", "invoice"])
+    trimmed = drop_schema_tables(schema, {"job"})
+    assert "- invoice.company_id -> company.company_id" in trimmed
+    assert "job" not in trimmed.split("RELATIONSHIPS:")[1].split("BUSINESS RULES")[0]
+
+
+def test_compact_schema_lists_the_same_tables(db_manager, counter):
+    verbose = db_manager.get_schema()
+    compact = db_manager.get_schema(compact=True)
+    assert SQLiteManager.schema_tables(compact) == SQLiteManager.schema_tables(verbose)
+    assert "company_id INTEGER FK>company" in compact
+    assert counter.count(compact) < counter.count(verbose)
+    assert db_manager.get_schema(compact=True) is compact
+
+
+def test_prompt_that_fits_is_unchanged(db_manager, client, counter):
+    schema = db_manager.get_schema()
+    budget = PromptBudget(100000, counter)
+    assert budget.fit_sql_prompt(sql_builder(client, PROFIT_QUESTION), PROFIT_QUESTION, schema,
+                                 EXAMPLES) == (schema, EXAMPLES)
+
+
+def test_lowest_ranked_examples_are_dropped_first(db_manager, client, counter):
+    schema = db_manager.get_schema()
+    build = sql_builder(client, PROFIT_QUESTION)
+    budget = PromptBudget(counter.count_messages(build(schema, EXAMPLES[:2])), counter)
+    assert budget.fit_sql_prompt(build, PROFIT_QUESTION, schema, EXAMPLES) == (schema, EXAMPLES[:2])
+
+
+def test_unmentioned_tables_are_dropped_from_the_end(db_manager, client, counter):
+    schema = db_manager.get_schema()
+    build = sql_builder(client, PROFIT_QUESTION)
+    without_payroll = drop_schema_tables(schema, {"payroll"})
+    budget = PromptBudget(counter.count_messages(build(without_payroll, EXAMPLES[:1])), counter)
+
+    trimmed, examples = budget.fit_sql_prompt(build, PROFIT_QUESTION, schema, EXAMPLES)
+    assert examples == EXAMPLES[:1]
+    assert trimmed == without_payroll
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_business_terms_keep_their_tables(db_manager, client, counter, compact):
+    # "profit" names no table, but is computed from payment, invoice and expense
+    schema = db_manager.get_schema(compact=compact)
+    budget = PromptBudget(400, counter)
+    trimmed, examples = budget.fit_sql_prompt(sql_builder(client, PROFIT_QUESTION), PROFIT_QUESTION, schema,
+                                              EXAMPLES)
+    tables = SQLiteManager.schema_tables(trimmed)
+    assert {"payment", "invoice", "expense", "company"} <= tables
+    assert not tables & {"payroll", "pay_period", "employee"}
+    assert examples is None
+
+
+def result_builder(text):
+    return [{"role": "user", "content": f"Results:\n{text}"}]
+
+
+@pytest.fixture
+def large_result():
+    connection = sqlite3.connect(":memory:")
+    cursor = connection.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 500) "
+                                "SELECT i, printf('customer number %d', i) AS name FROM n")
+    result = QueryResult.from_cursor(cursor)
+    connection.close()
+    return result
+
+
+def test_results_that_fit_are_rendered_in_full(large_result, counter):
+    budget = PromptBudget(100000, counter)
+    assert budget.fit_results(result_builder, large_result, max_rows=1000) == large_result.to_prompt_text(1000)
+
+
+def test_results_fall_back_to_a_summary(large_result, counter):
+    budget = PromptBudget(counter.count_messages(result_builder(large_result.to_prompt_text(0, 10))), counter)
+    text = budget.fit_results(result_builder, large_result, max_rows=1000, sample_rows=10)
+    assert text == large_result.to_prompt_text(0, 10)
+    assert text.startswith("RESULT SUMMARY: 500 rows")
+
+
+def test_results_are_truncated_as_a_last_resort(large_result, counter):
+    budget = PromptBudget(40, counter)
+    text = budget.fit_results(result_builder, large_result)
+    assert text.endswith(TRUNCATION_NOTE)
+    assert budget.fits(result_builder(text))
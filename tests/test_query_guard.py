@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+import query_guard
+from query_guard import QueryGuard, QueryRejectedError, QueryTimeoutError, table_aliases
+
+TABLES = ["customer", "orders"]
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.executescript("""
+        CREATE TABLE customer (customer_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, amount REAL);
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000)
+        INSERT INTO orders SELECT i, i % 100, i * 1.5 FROM n;
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100)
+        INSERT INTO customer SELECT i, 'customer ' || i FROM n;
+    """)
+    yield connection
+    connection.close()
+
+
+def test_indexed_lookup_passes(connection):
+    report = QueryGuard(max_scan_rows=1000).enforce(connection, "SELECT * FROM orders WHERE order_id = 5", TABLES)
+    assert report.ok
+    assert report.estimated_rows == 1
+
+
+def test_large_full_scan_is_rejected(connection):
+    with pytest.raises(QueryRejectedError) as error:
+        QueryGuard(max_scan_rows=1000).enforce(connection, "SELECT * FROM orders WHERE amount > 10", TABLES)
+    assert "Full scan of orders (~2,000 rows)" in str(error.value)
+    assert "Query plan:" in str(error.value)
+
+
+def test_cartesian_join_is_rejected(connection):
+    guard = QueryGuard(max_scan_rows=None, max_join_rows=50000)
+    with pytest.raises(QueryRejectedError, match="missing join condition"):
+        guard.enforce(connection, "SELECT * FROM customer c, orders o", TABLES)
+
+
+def test_nested_loop_multiplies_outer_rows(connection):
+    report = QueryGuard(max_scan_rows=None, max_join_rows=None).check(
+        connection, "SELECT * FROM customer c CROSS JOIN orders o", TABLES)
+    assert report.ok
+    assert report.estimated_rows == 100 + 100 * 2000
+
+
+def test_plans_from_older_sqlite_versions(connection, monkeypatch):
+    # SQLite before 3.36 names loops "SCAN TABLE x AS y" instead of "SCAN y"
+    monkeypatch.setattr(query_guard, "explain_plan", lambda connection, query, params=None: [
+        (2, 0, "SCAN TABLE customer AS c"),
+        (4, 0, "SCAN TABLE orders AS o"),
+    ])
+    report = QueryGuard(max_scan_rows=1000, max_join_rows=None).check(
+        connection, "SELECT * FROM customer c CROSS JOIN orders o", TABLES)
+    assert report.estimated_rows == 100 + 100 * 2000
+    assert report.issues == ["Full scan of orders (~2,000 rows) exceeds the 1,000-row limit; "
+                             "filter on an indexed column instead"]
+
+
+def test_plan_checks_can_be_disabled(connection):
+    guard = QueryGuard(max_scan_rows=1, check_plans=False)
+    assert guard.enforce(connection, "SELECT * FROM orders", TABLES) is None
+
+
+def test_vm_step_budget_interrupts_the_query(connection):
+    guard = QueryGuard(timeout_seconds=None, max_vm_steps=20000)
+    with pytest.raises(QueryTimeoutError, match="VM-step limit"):
+        with guard.limit(connection):
+            connection.execute("SELECT COUNT(*) FROM orders a, orders b").fetchone()
+    # The handler is removed again
+    assert connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 2000
+
+
+def test_table_aliases():
+    aliases = table_aliases("SELECT * FROM customer AS c JOIN orders o ON o.customer_id = c.customer_id "
+                            "WHERE c.name LIKE 'a%'", {"customer", "orders"})
+    assert aliases == {"c": "customer", "o": "orders"}
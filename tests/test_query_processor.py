@@ -0,0 +1,100 @@
+import pytest
+
+from metrics import MetricsRegistry
+from query_processor import QueryProcessor
+from sql_validator import SQLValidationError
+from sqlite_manager import SQLiteManager
+
+BAD_SQL = "SELECT nme FROM company"
+GOOD_SQL = "SELECT name FROM company"
+
+
+class StubClient:
+    """Stands in for OpenAIClient, replaying scripted SQL candidates per generation call"""
+
+    def __init__(self, *rounds):
+        self.rounds = list(rounds)
+        self.calls = []
+        self.metrics = MetricsRegistry()
+
+    def generate_sql_candidates(self, messages, n=1):
+        self.calls.append((messages, n))
+        return self.rounds.pop(0)[:n]
+
+    def build_repair_messages(self, messages, sql_query, error):
+        return list(messages) + [{"role": "assistant", "content": sql_query},
+                                 {"role": "user", "content": f"Fix: {error}"}]
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+def repair(db_manager, client, **kwargs):
+    processor = QueryProcessor(db_manager, client, validate_sql=True, **kwargs)
+    messages = [{"role": "user", "content": "List the companies"}]
+    return processor.repair_sql(messages, db_manager.validate_sql)
+
+
+def validations(client, result):
+    return client.metrics.counter_value("sql_validation_total", result=result)
+
+
+def test_valid_first_candidate_needs_no_repair(db_manager):
+    client = StubClient([GOOD_SQL])
+    assert repair(db_manager, client) == GOOD_SQL
+    assert len(client.calls) == 1
+    assert validations(client, "valid") == 1
+
+
+def test_invalid_candidate_is_repaired_with_the_error(db_manager):
+    client = StubClient([BAD_SQL], [GOOD_SQL])
+    assert repair(db_manager, client) == GOOD_SQL
+
+    repair_messages = client.calls[1][0]
+    assert repair_messages[-2] == {"role": "assistant", "content": BAD_SQL}
+    assert "nme" in repair_messages[-1]["content"]
+    assert validations(client, "repaired") == 1 and validations(client, "valid") == 0
+    assert client.metrics.counter_value("sql_repairs_total") == 1
+
+
+@pytest.mark.parametrize("repair_attempts", [0, 1, 3])
+def test_repair_attempts_are_respected(db_manager, repair_attempts):
+    client = StubClient(*[[BAD_SQL]] * 5)
+    with pytest.raises(SQLValidationError, match="nme"):
+        repair(db_manager, client, repair_attempts=repair_attempts)
+
+    assert len(client.calls) == repair_attempts + 1
+    assert client.metrics.counter_value("sql_repairs_total") == repair_attempts
+    assert validations(client, "invalid") == 1
+
+
+def test_first_valid_candidate_is_chosen(db_manager):
+    client = StubClient([BAD_SQL, "DELETE FROM company", GOOD_SQL, "SELECT company_id FROM company"])
+    assert repair(db_manager, client, sql_candidates=4) == GOOD_SQL
+    assert client.calls[0][1] == 4
+    assert validations(client, "valid") == 1
+
+
+def test_repair_follows_the_last_invalid_candidate(db_manager):
+    client = StubClient([BAD_SQL, "SELECT * FROM companies"], [GOOD_SQL])
+    assert repair(db_manager, client, sql_candidates=2) == GOOD_SQL
+    assert client.calls[1][0][-2]["content"] == "SELECT * FROM companies"
+
+
+def test_process_query_formats_through_format_answer(db_manager, monkeypatch, capsys):
+    client = StubClient()
+    client.format_response = lambda question, sql_query, results: f"{len(results.splitlines())} lines"
+    processor = QueryProcessor(db_manager, client)
+    result = db_manager.fetch_result(GOOD_SQL)
+    monkeypatch.setattr(processor, "_query_database", lambda question, show_debug: (GOOD_SQL, result))
+
+    assert processor.process_query("List the companies") == "4 lines"
+    assert client.metrics.counter_value("answers_total", formatter="llm") == 1
+    stages = [series for series in client.metrics.snapshot() if series["name"] == "stage_seconds"]
+    assert [(series["labels"], series["count"]) for series in stages] == [({"stage": "format_response"}, 1)]
+    assert "Formatting response... ✓" in capsys.readouterr().out
@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import query_result
+from query_result import ColumnStats, QueryResult
+
+NUMBERS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {count}) SELECT i FROM n"
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    yield connection
+    connection.close()
+
+
+def numbers(connection, count, **kwargs):
+    return QueryResult.from_cursor(connection.execute(NUMBERS.format(count=count)), **kwargs)
+
+
+def test_small_result_is_kept_whole(connection):
+    result = numbers(connection, 5, max_rows=10, batch_size=2)
+    assert result.rows == [(i,) for i in range(1, 6)]
+    assert result.total_count == 5
+    assert not result.truncated and result.count_exact
+    assert result.tail == []
+
+
+def test_rows_beyond_max_rows_are_counted_not_kept(connection):
+    result = numbers(connection, 1000, max_rows=100, batch_size=64, sample_rows=3)
+    assert len(result.rows) == 100 and result.rows[-1] == (100,)
+    assert result.total_count == 1000
+    assert result.truncated and result.count_exact
+    assert result.tail == [(998,), (999,), (1000,)]
+
+
+def test_tail_only_holds_rows_that_were_not_kept(connection):
+    result = numbers(connection, 12, max_rows=10, sample_rows=5)
+    assert result.tail == [(11,), (12,)]
+    text = result.to_prompt_text(max_rows=5, sample_rows=5)
+    assert "Last 5 rows:" in text
+    assert text.split("Last 5 rows:")[1].split()[2:7] == ["8", "9", "10", "11", "12"]
+
+
+@pytest.mark.parametrize("count, exact", [(999, True), (1000, True), (1001, False)])
+def test_scan_limit_stops_counting(connection, count, exact):
+    result = numbers(connection, count, max_rows=10, batch_size=100, scan_limit=1000)
+    assert result.total_count == min(count, 1000)
+    assert result.count_exact is exact
+
+
+def test_inexact_count_is_reported_as_a_lower_bound(connection):
+    result = numbers(connection, 50, max_rows=5, batch_size=10, scan_limit=20)
+    text = result.to_prompt_text(max_rows=5, sample_rows=2)
+    assert text.startswith("RESULT SUMMARY: more than 20 rows")
+    assert "Last" not in text
+
+
+def test_statement_without_result_set(connection):
+    result = QueryResult.from_cursor(connection.execute("CREATE TABLE t (x)"))
+    assert not result.has_result_set
+    assert result.to_prompt_text() == "Query executed successfully (no results)"
+
+
+def test_column_stats_cover_every_scanned_row(connection):
+    connection.execute("CREATE TABLE t (amount, label)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)",
+                           [(5, "b"), (None, "a"), (2.5, None), ("text", "b"), (b"\x00", "c"), (7, "a")])
+    result = QueryResult.from_cursor(connection.execute("SELECT amount, label FROM t"), max_rows=2)
+
+    amount = result.column_stats["amount"]
+    # SQLite ordering: numbers < text < blobs; NULLs are counted, not compared
+    assert (amount.min, amount.max, amount.nulls, amount.distinct_count) == (2.5, b"\x00", 1, 5)
+    label = result.column_stats["label"]
+    assert (label.min, label.max, label.nulls, label.distinct_count) == ("a", "c", 1, 3)
+    assert label.describe() == "min=a, max=c, distinct=3, nulls=1"
+
+
+def test_distinct_count_becomes_a_lower_bound(monkeypatch):
+    monkeypatch.setattr(query_result, "MAX_TRACKED_DISTINCT", 3)
+    stats = ColumnStats()
+    for value in range(5):
+        stats.add(value)
+    assert stats.distinct_overflow
+    assert stats.distinct_count == 3
+    assert "distinct=>3" in stats.describe()
+
+
+def test_round_trip_through_dict(connection):
+    connection.execute("CREATE TABLE t (id, data)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", [(i, bytes([i])) for i in range(30)])
+    result = QueryResult.from_cursor(connection.execute("SELECT id, data FROM t"), max_rows=10, sample_rows=4)
+
+    restored = QueryResult.from_dict(result.to_dict())
+    assert restored.rows == result.rows and restored.tail == result.tail
+    assert restored.total_count == 30 and restored.truncated
+    assert restored.to_prompt_text(5, 4) == result.to_prompt_text(5, 4)
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+
+from metrics import MetricsRegistry
+from query_result import QueryResult
+from result_cache import ResultCache
+from sqlite_manager import SQLiteManager
+
+COUNT_JOBS = "SELECT COUNT(*) FROM job"
+
+
+def open_manager(database, cache):
+    manager = SQLiteManager(result_cache=cache, metrics=MetricsRegistry())
+    assert manager.open_database(database)
+    return manager
+
+
+def lookups(manager, result):
+    return manager.metrics.counter_value("result_cache_requests_total", result=result)
+
+
+@pytest.fixture
+def manager(database):
+    manager = open_manager(database, ResultCache())
+    yield manager
+    manager.close_database()
+
+
+def test_repeated_query_is_served_from_memory(manager):
+    first = manager.fetch_result(COUNT_JOBS)
+    assert manager.fetch_result(" SELECT  COUNT(*) FROM job ; ") is first
+    assert lookups(manager, "hit") == 1 and lookups(manager, "miss") == 1
+
+
+def test_write_through_the_same_connection_invalidates(manager):
+    assert manager.fetch_result(COUNT_JOBS).rows == [(8,)]
+    manager.execute_query("DELETE FROM job WHERE job_id = (SELECT MAX(job_id) FROM job)")
+    assert manager.fetch_result(COUNT_JOBS).rows == [(7,)]
+    assert lookups(manager, "hit") == 0
+
+
+def test_external_write_invalidates(manager, database):
+    assert manager.fetch_result(COUNT_JOBS).rows == [(8,)]
+    other = sqlite3.connect(database)
+    other.execute("DELETE FROM job WHERE job_id = (SELECT MAX(job_id) FROM job)")
+    other.commit()
+    other.close()
+    assert manager.fetch_result(COUNT_JOBS).rows == [(7,)]
+
+
+def test_schema_change_invalidates(manager, database):
+    assert manager.fetch_result("SELECT * FROM company").columns == ["company_id", "name"]
+    other = sqlite3.connect(database)
+    other.execute("ALTER TABLE company ADD COLUMN region TEXT")
+    other.commit()
+    other.close()
+    assert manager.fetch_result("SELECT * FROM company").columns == ["company_id", "name", "region"]
+
+
+def test_disk_tier_is_reloaded_by_a_new_process(database, tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    first = open_manager(database, ResultCache(disk_path=path))
+    first.fetch_result(COUNT_JOBS)
+    first.result_cache.close()
+    first.close_database()
+
+    second = open_manager(database, ResultCache(disk_path=path))
+    try:
+        assert second.fetch_result(COUNT_JOBS).rows == [(8,)]
+        assert lookups(second, "hit") == 1
+    finally:
+        second.result_cache.close()
+        second.close_database()
+
+
+def test_disk_tier_entry_is_dropped_when_the_file_changes(database, tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    first = open_manager(database, ResultCache(disk_path=path))
+    first.fetch_result(COUNT_JOBS)
+    first.result_cache.close()
+    first.close_database()
+
+    other = sqlite3.connect(database)
+    other.execute("DELETE FROM job WHERE job_id = (SELECT MAX(job_id) FROM job)")
+    other.commit()
+    other.close()
+
+    second = open_manager(database, ResultCache(disk_path=path))
+    try:
+        assert second.fetch_result(COUNT_JOBS).rows == [(7,)]
+        assert lookups(second, "hit") == 0
+    finally:
+        second.result_cache.close()
+        second.close_database()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM job WHERE start_date >= date('now', '-30 days')",
+    "SELECT COUNT(*) FROM job WHERE start_date >= DATE('NOW')",
+    "SELECT CURRENT_DATE",
+    "SELECT CURRENT_TIMESTAMP",
+    "SELECT date()",
+    "SELECT strftime('%Y-%m')",
+    "SELECT job_id FROM job ORDER BY random() LIMIT 1",
+])
+def test_time_dependent_and_random_queries_are_not_cached(manager, sql):
+    assert not ResultCache.is_cacheable(sql)
+    manager.fetch_result(sql)
+    manager.fetch_result(sql)
+    assert lookups(manager, "uncacheable") == 2
+    assert lookups(manager, "hit") == 0
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT COUNT(*) FROM job WHERE start_date >= '2025-01-01'", None),
+    ("SELECT strftime('%Y-%m', start_date) FROM job", None),
+    ("SELECT date(start_date) FROM job WHERE status = 'now_open'", None),
+    ("SELECT COUNT(*) FROM job WHERE status = :status", {"status": "completed"}),
+])
+def test_deterministic_queries_are_cacheable(sql, params):
+    assert ResultCache.is_cacheable(sql, params)
+
+
+def test_now_bound_as_a_parameter_is_not_cacheable():
+    assert not ResultCache.is_cacheable("SELECT date(:day)", {"day": "now"})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    connection = sqlite3.connect(":memory:")
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 3"):
+        cache.put(":memory:", sql, (), (), QueryResult.from_cursor(connection.execute(sql)))
+    connection.close()
+    assert cache.get(":memory:", "SELECT 1", (), ()) is None
+    assert cache.get(":memory:", "SELECT 3", (), ()).rows == [(3,)]
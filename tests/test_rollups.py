@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+from rollups import ROLLUP_TABLE, RollupManager, trigger_names
+
+
+@pytest.fixture
+def rollups(database):
+    manager = RollupManager(database)
+    manager.create()
+    return manager
+
+
+@pytest.fixture
+def connection(database, rollups):
+    connection = sqlite3.connect(database, isolation_level=None)
+    yield connection
+    connection.close()
+
+
+def rollup_row(connection, company_id, month):
+    return connection.execute(f"SELECT revenue, expenses, payroll, profit FROM {ROLLUP_TABLE} "
+                              f"WHERE company_id = ? AND month = ?", (company_id, month)).fetchone()
+
+
+def test_created_rollup_matches_the_source_tables(database, rollups, connection):
+    assert rollups.verify() == []
+    installed = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert set(trigger_names()) <= installed
+
+
+@pytest.mark.parametrize("statements", [
+    ["INSERT INTO payment (company_id, invoice_id, payment_date, amount, method) "
+     "VALUES (1, (SELECT MIN(invoice_id) FROM invoice), '2031-05-02', 125.5, 'card')"],
+    ["UPDATE payment SET amount = amount + 10, payment_date = '2031-06-01' "
+     "WHERE payment_id = (SELECT MIN(payment_id) FROM payment)"],
+    ["DELETE FROM payment WHERE payment_id = (SELECT MAX(payment_id) FROM payment)"],
+    ["INSERT INTO expense (company_id, vendor_name, category, amount, expense_date, job_id) "
+     "VALUES (2, 'Hardware Co', 'supplies', 80, '2031-05-17', (SELECT MIN(job_id) FROM job))"],
+    ["UPDATE expense SET company_id = 3 - company_id"],
+    ["DELETE FROM expense"],
+    ["UPDATE payroll SET gross_pay = gross_pay + 100, net_pay = net_pay + 100 WHERE company_id = 1"],
+    ["DELETE FROM payroll WHERE payroll_id = (SELECT MIN(payroll_id) FROM payroll)"],
+    # Parent rows: moving an invoice moves its payments, moving a pay period end moves its payroll
+    ["UPDATE invoice SET company_id = 3 - company_id"],
+    ["UPDATE pay_period SET pay_period_end = '2031-12-31' WHERE pay_period_id = (SELECT MIN(pay_period_id) "
+     "FROM pay_period)"],
+    ["UPDATE invoice SET status = 'void'"],
+])
+def test_triggers_keep_the_rollup_current(rollups, connection, statements):
+    for statement in statements:
+        connection.execute(statement)
+    assert rollups.verify() == []
+
+
+def test_new_months_get_their_own_row(rollups, connection):
+    connection.execute("INSERT INTO expense (company_id, vendor_name, category, amount, expense_date, job_id) "
+                       "VALUES (1, 'Hardware Co', 'supplies', 80, '2031-05-17', (SELECT MIN(job_id) FROM job))")
+    assert rollup_row(connection, 1, "2031-05") == (0, 80, 0, -80)
+
+
+def test_refresh_repairs_a_drifted_rollup(rollups, connection):
+    connection.execute(f"UPDATE {ROLLUP_TABLE} SET revenue = revenue + 1")
+    assert rollups.verify()
+    rollups.refresh()
+    assert rollups.verify() == []
+
+
+def test_without_triggers_changes_wait_for_refresh(database):
+    rollups = RollupManager(database)
+    rollups.create(triggers=False)
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        connection.execute("DELETE FROM expense")
+        assert rollups.verify()
+        rollups.refresh()
+        assert rollups.verify() == []
+    finally:
+        connection.close()
+
+
+def test_drop_removes_table_and_triggers(database, rollups, connection):
+    rollups.drop()
+    names = {name for (name,) in connection.execute("SELECT name FROM sqlite_master")}
+    assert ROLLUP_TABLE not in names
+    assert not names & set(trigger_names())
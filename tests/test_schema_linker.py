@@ -0,0 +1,98 @@
+import pytest
+
+from schema_linker import SchemaLinker
+from sqlite_manager import SQLiteManager
+
+
+class StubCatalog:
+    """Stands in for SQLiteManager.get_catalog() with a hand-made foreign-key graph"""
+
+    def __init__(self, edges, schema_hash="v1"):
+        tables = {}
+        for table, ref_table in edges:
+            tables.setdefault(table, [(f"{table}_id", "INTEGER")]).append((f"{ref_table}_id", "INTEGER"))
+            tables.setdefault(ref_table, [(f"{ref_table}_id", "INTEGER")])
+        self.catalog = {
+            "tables": tables,
+            "primary_keys": {table: [f"{table}_id"] for table in tables},
+            "foreign_keys": [(table, f"{ref}_id", ref, f"{ref}_id") for table, ref in edges],
+            "schema_hash": schema_hash,
+        }
+
+    def get_catalog(self):
+        return self.catalog
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+def connect(edges, seeds, scores=None):
+    linker = SchemaLinker()
+    linker._build_index(StubCatalog(edges).get_catalog())
+    return linker._connect(seeds, scores)
+
+
+def test_adjacent_seeds_need_no_extra_tables():
+    assert connect([("orders", "client"), ("orders", "item")], ["orders", "client"]) == {"orders", "client"}
+
+
+def test_join_path_tables_are_added():
+    edges = [("visit", "clinic"), ("visit", "patient"), ("bill", "visit"), ("receipt", "bill")]
+    assert connect(edges, ["receipt", "patient"]) == {"receipt", "bill", "visit", "patient"}
+
+
+def test_shortest_join_path_is_chosen():
+    # receipt reaches patient in two hops through bill, or in four through ledger, batch and visit
+    edges = [("bill", "patient"), ("receipt", "bill"),
+             ("ledger", "receipt"), ("ledger", "batch"), ("visit", "batch"), ("visit", "patient")]
+    assert connect(edges, ["receipt", "patient"]) == {"receipt", "bill", "patient"}
+
+
+@pytest.mark.parametrize("scores, middle", [
+    (None, "bill"),
+    ({"receipt": 5.0, "patient": 4.0, "ledger": 1.0}, "ledger"),
+])
+def test_ties_go_to_higher_scoring_tables_then_names(scores, middle):
+    edges = [("receipt", "bill"), ("bill", "patient"), ("receipt", "ledger"), ("ledger", "patient")]
+    assert connect(edges, ["receipt", "patient"], scores) == {"receipt", middle, "patient"}
+
+
+def test_later_seeds_join_the_nearest_selected_table():
+    edges = [("visit", "clinic"), ("visit", "patient"), ("bill", "visit"), ("receipt", "bill")]
+    # bill is already next to the selection, so clinic is reached through visit only
+    assert connect(edges, ["receipt", "visit", "clinic"]) == {"receipt", "bill", "visit", "clinic"}
+
+
+def test_unreachable_seed_is_included_on_its_own():
+    edges = [("visit", "patient"), ("audit", "audit_user")]
+    assert connect(edges, ["visit", "audit"]) == {"visit", "audit"}
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many jobs did Central Glass DC complete?", ["company", "job"]),
+    # payment and customer are joined through invoice and job
+    ("Total payments per customer", ["customer", "job", "invoice", "payment"]),
+])
+def test_questions_link_to_their_tables_and_join_path(db_manager, question, expected):
+    assert SchemaLinker().link(question, db_manager) == expected
+
+
+def test_unmatched_question_falls_back_to_the_full_schema(db_manager):
+    assert SchemaLinker().link("What is the weather like?", db_manager) is None
+
+
+def test_broad_selection_falls_back_to_the_full_schema(db_manager):
+    question = "Total payments per customer"
+    assert SchemaLinker(max_fraction=0.3).link(question, db_manager) is None
+
+
+def test_index_is_rebuilt_when_the_schema_changes():
+    linker = SchemaLinker(max_fraction=1.0)
+    question = "Which patient had a visit?"
+    assert linker.link(question, StubCatalog([("visit", "patient")], "v1")) == ["visit", "patient"]
+    assert linker.link(question, StubCatalog([("visit", "clinic")], "v2")) == ["visit"]
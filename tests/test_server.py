@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+from http import HTTPStatus
+
+import pytest
+
+from metrics import MetricsRegistry
+from openai_client import OpenAIError
+from query_guard import QueryTimeoutError
+from query_result import QueryResult
+from server import ChatServer
+from sql_validator import SQLValidationError
+from sqlite_manager import QueryExecutionError
+
+
+class Processor:
+    metrics = MetricsRegistry()
+
+
+def route(error):
+    server = ChatServer(Processor())
+
+    async def answer(question):
+        raise error
+
+    server.answer = answer
+    try:
+        return asyncio.run(server._route("POST", "/query", json.dumps({"question": "q"}).encode()))
+    finally:
+        server.llm_executor.shutdown()
+        server.db_executor.shutdown()
+
+
+@pytest.mark.parametrize("error, status", [
+    (SQLValidationError("SELEC 1", "syntax error"), HTTPStatus.UNPROCESSABLE_ENTITY),
+    (QueryExecutionError("SQL query failed: no such column: x"), HTTPStatus.UNPROCESSABLE_ENTITY),
+    (QueryTimeoutError("interrupted"), HTTPStatus.UNPROCESSABLE_ENTITY),
+    (OpenAIError("OpenAI API request failed: 503"), HTTPStatus.BAD_GATEWAY),
+    (RuntimeError("Database is not open"), HTTPStatus.INTERNAL_SERVER_ERROR),
+    (KeyError("columns"), HTTPStatus.INTERNAL_SERVER_ERROR),
+])
+def test_failures_map_to_status_codes(error, status, capsys):
+    code, payload, _ = route(error)
+    assert code == status
+    assert payload["question"] == "q"
+
+
+def test_internal_errors_are_not_leaked(capsys):
+    _, payload, _ = route(RuntimeError("/srv/secret.sqlite is corrupt"))
+    assert payload["error"] == "Internal server error"
+    assert "secret" in capsys.readouterr().err
+
+
+class StubProcessor:
+    """Stands in for QueryProcessor; SQL generation blocks until release is set"""
+
+    def __init__(self):
+        self.metrics = MetricsRegistry()
+        self.release = threading.Event()
+        self.generated = []
+
+    def prompt_schema(self, question):
+        return "schema", "hash"
+
+    def match_intent(self, question):
+        return None
+
+    def generate_sql(self, question, schema, schema_hash, validate=None):
+        self.generated.append(question)
+        self.release.wait(5)
+        return f"SELECT {len(self.generated)}", False
+
+    def execute_sql(self, question, sql_query, schema_hash, db_manager=None, params=None):
+        return QueryResult(columns=["n"], rows=[(1,)], total_count=1)
+
+    def format_answer(self, question, sql_query, result):
+        return f"Answer to {question}"
+
+
+@pytest.fixture
+def stub_server():
+    processor = StubProcessor()
+    server = ChatServer(processor, max_concurrency=2, max_pending=2)
+    yield server, processor
+    processor.release.set()
+    server.llm_executor.shutdown()
+    server.db_executor.shutdown()
+
+
+def query(server, question):
+    return asyncio.ensure_future(server._route("POST", "/query", json.dumps({"question": question}).encode()))
+
+
+async def started(processor, count):
+    """Waits until count pipelines have reached SQL generation"""
+    while len(processor.generated) < count:
+        await asyncio.sleep(0.005)
+
+
+def test_identical_in_flight_questions_share_one_run(stub_server):
+    server, processor = stub_server
+
+    async def scenario():
+        server._semaphore = asyncio.Semaphore(server.max_concurrency)
+        requests = [query(server, "How many jobs?")]
+        await started(processor, 1)
+        requests += [query(server, "  how many JOBS "), query(server, "How many jobs?")]
+        await asyncio.sleep(0)
+        health = await server._route("GET", "/health", b"")
+        processor.release.set()
+        return health, await asyncio.gather(*requests)
+
+    health, responses = asyncio.run(scenario())
+    assert health[1] == {"status": "ok", "in_flight": 1, "pending": 1}
+    assert processor.generated == ["How many jobs?"]
+    assert [status for status, _, _ in responses] == [HTTPStatus.OK] * 3
+    assert {payload["sql"] for _, payload, _ in responses} == {"SELECT 1"}
+    assert server._in_flight == {}
+
+
+def test_requests_beyond_max_pending_get_503(stub_server):
+    server, processor = stub_server
+
+    async def scenario():
+        server._semaphore = asyncio.Semaphore(server.max_concurrency)
+        requests = [query(server, "How many jobs?"), query(server, "How many customers?")]
+        await started(processor, 2)
+        busy = await server._route("POST", "/query", json.dumps({"question": "How many invoices?"}).encode())
+        # A question already in flight is still admitted: it adds no upstream work
+        requests.append(query(server, "How many customers?"))
+        await asyncio.sleep(0)
+        processor.release.set()
+        return busy, await asyncio.gather(*requests)
+
+    busy, responses = asyncio.run(scenario())
+    status, payload, headers = busy
+    assert status == HTTPStatus.SERVICE_UNAVAILABLE
+    assert headers == {"Retry-After": "1"}
+    assert [status for status, _, _ in responses] == [HTTPStatus.OK] * 3
+    assert sorted(processor.generated) == ["How many customers?", "How many jobs?"]
+
+
+def test_health_and_metrics_endpoints(stub_server):
+    server, processor = stub_server
+    processor.metrics.increment("answers_total", formatter="local")
+
+    async def scenario():
+        return [await server._route(method, path, b"") for method, path in [
+            ("GET", "/health"), ("GET", "/metrics"), ("POST", "/metrics"), ("POST", "/health"), ("GET", "/nope"),
+        ]]
+
+    health, metrics, post_metrics, post_health, unknown = asyncio.run(scenario())
+    assert health == (HTTPStatus.OK, {"status": "ok", "in_flight": 0, "pending": 0}, {})
+    assert metrics[0] == HTTPStatus.OK
+    assert 'answers_total{formatter="local"} 1' in metrics[1].splitlines()
+    assert post_metrics[0] == post_health[0] == HTTPStatus.METHOD_NOT_ALLOWED
+    assert post_metrics[2] == {"Allow": "GET"}
+    assert unknown[0] == HTTPStatus.NOT_FOUND
@@ -0,0 +1,192 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from entity_index import EntityIndex
+from few_shot_examples import FEW_SHOT_EXAMPLES
+from intent_templates import IntentTemplates
+from shard_manager import ShardedSQLiteManager, ShardMergeError, plan_query
+from sqlite_manager import SQLiteManager
+
+# Tables holding one company's rows; customer, employee and pay_period are shared by both companies
+COMPANY_TABLES = ("company", "employee_company", "job", "invoice", "payment", "expense", "payroll")
+SHARED_TABLES = ("customer", "employee", "pay_period")
+
+
+@pytest.fixture
+def shards(database, tmp_path):
+    """The bundled database split into one shard per company"""
+    paths = []
+    for company_id in (1, 2):
+        path = str(tmp_path / f"company_{company_id}.sqlite")
+        shutil.copyfile(database, path)
+        connection = sqlite3.connect(path)
+        for table in COMPANY_TABLES:
+            connection.execute(f"DELETE FROM {table} WHERE company_id != ?", (company_id,))
+        connection.commit()
+        connection.close()
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def managers(database, shards):
+    single = SQLiteManager()
+    sharded = ShardedSQLiteManager(workers=2)
+    assert single.open_database(database)
+    assert sharded.open_shards(shards)
+    yield single, sharded
+    sharded.close_database()
+    single.close_database()
+
+
+@pytest.fixture
+def replicated(database, shards):
+    single = SQLiteManager()
+    sharded = ShardedSQLiteManager(workers=2, replicated_tables=SHARED_TABLES)
+    assert single.open_database(database)
+    assert sharded.open_shards(shards)
+    yield single, sharded
+    sharded.close_database()
+    single.close_database()
+
+
+def rows(manager, sql, ordered=False):
+    result = manager.fetch_result(sql)
+    return result.rows if ordered else sorted(result.rows, key=repr)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*), SUM(total_amount), AVG(total_amount), MIN(total_amount), MAX(total_amount) FROM invoice",
+    "SELECT status, COUNT(*) FROM job GROUP BY status",
+    "SELECT status, AVG(total_amount) FROM invoice GROUP BY status HAVING COUNT(*) > 1",
+    "SELECT job_id, status FROM job WHERE status = 'completed'",
+    "SELECT DISTINCT status FROM job",
+    "SELECT status, COUNT(*) FROM (SELECT * FROM job WHERE job_type IS NOT NULL) GROUP BY status",
+    "SELECT invoice_id FROM invoice WHERE job_id IN (SELECT job_id FROM job WHERE status = 'completed')",
+    "SELECT (SELECT SUM(total_amount) FROM invoice) - (SELECT SUM(amount) FROM expense)",
+    "SELECT status FROM job UNION SELECT status FROM invoice",
+    "SELECT c.name, COUNT(*) FROM job j JOIN company c ON c.company_id = j.company_id GROUP BY c.name",
+])
+def test_sharded_results_match_single_database(managers, sql):
+    single, sharded = managers
+    assert rows(sharded, sql) == rows(single, sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT invoice_id, total_amount FROM invoice ORDER BY total_amount DESC LIMIT 3",
+    "SELECT status, COUNT(*) AS c FROM job GROUP BY status ORDER BY c DESC, status LIMIT 2",
+])
+def test_ordered_results_match_single_database(managers, sql):
+    single, sharded = managers
+    assert rows(sharded, sql, ordered=True) == rows(single, sql, ordered=True)
+
+
+@pytest.mark.parametrize("sql", [
+    # Aggregate in a WHERE subquery: each shard would compare against its own average
+    "SELECT invoice_id, total_amount FROM invoice WHERE total_amount > (SELECT AVG(total_amount) FROM invoice)",
+    "WITH a AS (SELECT AVG(total_amount) v FROM invoice) SELECT v FROM a",
+    "SELECT status, c FROM (SELECT status, COUNT(*) c FROM job GROUP BY status) ORDER BY c DESC LIMIT 1",
+    "SELECT COUNT(*) FROM (SELECT DISTINCT status FROM job)",
+    "SELECT * FROM (SELECT job_id FROM job ORDER BY job_id LIMIT 1)",
+    "SELECT job_id FROM job WHERE customer_id IN (SELECT customer_id FROM job GROUP BY customer_id)",
+    "SELECT COUNT(DISTINCT status) FROM job",
+    "SELECT job_id, ROW_NUMBER() OVER (ORDER BY job_id) FROM job",
+    "SELECT job_id FROM (SELECT job_id, RANK() OVER (ORDER BY start_date) r FROM job) WHERE r = 1",
+    "SELECT name, (SELECT COUNT(*) FROM job j WHERE j.company_id = c.company_id) FROM company c",
+    "SELECT (SELECT MAX(total_amount) FROM invoice), (SELECT status FROM job LIMIT 1)",
+    "SELECT DISTINCT status FROM job UNION ALL SELECT status FROM invoice",
+])
+def test_unmergeable_queries_are_rejected(managers, sql):
+    _, sharded = managers
+    with pytest.raises(ShardMergeError):
+        sharded.fetch_result(sql)
+
+
+def test_reviewed_queries_single_database_results(managers):
+    # What the rejected queries above would have to return to be correct
+    single, _ = managers
+    assert len(rows(single, "SELECT invoice_id, total_amount FROM invoice "
+                            "WHERE total_amount > (SELECT AVG(total_amount) FROM invoice)")) == 2
+    assert rows(single, "WITH a AS (SELECT AVG(total_amount) v FROM invoice) SELECT v FROM a") == [(3247.0,)]
+
+
+def test_scalar_subqueries_with_nested_aggregates_are_rejected():
+    with pytest.raises(ShardMergeError):
+        plan_query("SELECT (SELECT SUM(amount) FROM payment WHERE amount > (SELECT AVG(amount) FROM payment))",
+                   ["x"])
+
+
+def test_multi_argument_min_is_a_scalar_function():
+    plan = plan_query("SELECT job_id FROM job WHERE job_id IN (SELECT MIN(job_id, 3) FROM job)", ["job_id"])
+    assert not plan.aggregate
+
+
+def test_entity_index_covers_every_shard(managers):
+    _, sharded = managers
+    index = EntityIndex()
+    try:
+        assert index.refresh(sharded)
+        assert index.rewrite_sql("SELECT * FROM company WHERE name = 'Recon Pest'")[0] == \
+            "SELECT * FROM company WHERE name = 'Recon Pest Control'"
+        assert any(match.value == "Central Glass DC" for match in index.ground("jobs for central glass"))
+    finally:
+        index.close()
+
+
+def test_intent_templates_use_values_from_every_shard(managers):
+    # The example names the company stored only in the second shard
+    _, sharded = managers
+    templates = IntentTemplates([(
+        "How many jobs does Recon Pest Control have?",
+        "SELECT COUNT(*) FROM job j JOIN company c ON c.company_id = j.company_id WHERE c.name = 'Recon Pest Control'"
+    )])
+    assert templates.refresh(sharded) and len(templates) == 1
+    match = templates.match("How many jobs does Central Glass DC have?")
+    assert match is not None and list(match.params.values()) == ["Central Glass DC"]
+
+
+def test_shared_tables_are_counted_once_per_shard_unless_replicated(managers):
+    _, sharded = managers
+    assert rows(sharded, "SELECT COUNT(*) FROM customer") == [(16,)]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM customer",
+    "SELECT first_name, last_name FROM employee WHERE active = 1",
+    "SELECT * FROM pay_period ORDER BY pay_period_end DESC LIMIT 1",
+    # Aggregates over replicated tables are the same on every shard
+    "SELECT AVG(gross_pay) FROM payroll WHERE pay_period_id = (SELECT MAX(pay_period_id) FROM pay_period)",
+    "WITH latest AS (SELECT MAX(pay_period_id) AS id FROM pay_period) "
+    "SELECT COUNT(*) FROM payroll JOIN latest ON payroll.pay_period_id = latest.id",
+    "SELECT (SELECT COUNT(*) FROM customer) - (SELECT COUNT(*) FROM job)",
+    # Sharded tables joined in, including through a comma join, still fan out
+    "SELECT COUNT(*) FROM customer c, job j WHERE c.customer_id = j.customer_id",
+    "SELECT c.name, COUNT(*) FROM customer c JOIN job j ON c.customer_id = j.customer_id GROUP BY c.name",
+])
+def test_replicated_tables_match_single_database(replicated, sql):
+    single, sharded = replicated
+    assert rows(sharded, sql) == rows(single, sql)
+
+
+def test_ctes_over_sharded_tables_are_still_checked(replicated):
+    _, sharded = replicated
+    with pytest.raises(ShardMergeError):
+        sharded.fetch_result("WITH a AS (SELECT AVG(total_amount) v FROM invoice) SELECT v FROM a")
+
+
+def test_few_shot_examples_with_replicated_tables(replicated):
+    single, sharded = replicated
+    for question, sql in FEW_SHOT_EXAMPLES:
+        if question == "How many employees work for multiple companies?":
+            # Groups employee_company rows that live in different shards
+            with pytest.raises(ShardMergeError):
+                sharded.fetch_result(sql)
+        else:
+            assert rows(sharded, sql) == rows(single, sql), question
+
+
+def test_unknown_replicated_table_fails_to_open(shards):
+    sharded = ShardedSQLiteManager(replicated_tables=["customers"])
+    assert not sharded.open_shards(shards)
@@ -0,0 +1,107 @@
+import pytest
+
+import sql_cache
+from sql_cache import SQLCache
+
+SQL = "SELECT COUNT(*) FROM job"
+
+
+class Clock:
+    """Stand-in for time.time() that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sql_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = SQLCache(str(tmp_path / "sql_cache.sqlite"), max_entries=3, ttl_seconds=60)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("variant", [
+    "How many jobs are there?",
+    "  how many   JOBS are there ",
+    "How many jobs are there?!",
+])
+def test_trivial_variants_share_an_entry(cache, variant):
+    cache.put("How many jobs are there?", "hash", "few-shot", SQL)
+    assert cache.get(variant, "hash", "few-shot") == SQL
+
+
+@pytest.mark.parametrize("question, schema_hash, strategy", [
+    ("How many jobs are open?", "hash", "few-shot"),
+    ("How many jobs are there?", "other-hash", "few-shot"),
+    ("How many jobs are there?", None, "few-shot"),
+    ("How many jobs are there?", "hash", "zero-shot"),
+])
+def test_key_covers_question_schema_and_strategy(cache, question, schema_hash, strategy):
+    cache.put("How many jobs are there?", "hash", "few-shot", SQL)
+    assert cache.get(question, schema_hash, strategy) is None
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put("How many jobs are there?", "hash", "few-shot", SQL)
+    clock.now += 59
+    assert cache.get("How many jobs are there?", "hash", "few-shot") == SQL
+    # Use does not extend the lifetime of an entry
+    clock.now += 2
+    assert cache.get("How many jobs are there?", "hash", "few-shot") is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1}
+
+
+def test_ttl_can_be_disabled(tmp_path, clock):
+    cache = SQLCache(str(tmp_path / "sql_cache.sqlite"), ttl_seconds=None)
+    try:
+        cache.put("How many jobs are there?", "hash", "few-shot", SQL)
+        clock.now += 365 * 24 * 3600
+        assert cache.get("How many jobs are there?", "hash", "few-shot") == SQL
+    finally:
+        cache.close()
+
+
+def test_least_recently_used_entry_is_evicted(cache, clock):
+    for number in range(3):
+        clock.now += 1
+        cache.put(f"question {number}", "hash", "few-shot", f"SELECT {number}")
+
+    clock.now += 1
+    assert cache.get("question 0", "hash", "few-shot") == "SELECT 0"
+    clock.now += 1
+    cache.put("question 3", "hash", "few-shot", "SELECT 3")
+
+    assert cache.get("question 1", "hash", "few-shot") is None
+    assert [cache.get(f"question {number}", "hash", "few-shot") for number in (0, 2, 3)] == \
+        ["SELECT 0", "SELECT 2", "SELECT 3"]
+    assert cache.stats()["entries"] == 3
+
+
+def test_entries_persist_across_instances(tmp_path, clock):
+    path = str(tmp_path / "sql_cache.sqlite")
+    first = SQLCache(path)
+    first.put("How many jobs are there?", "hash", "few-shot", SQL)
+    first.close()
+
+    second = SQLCache(path)
+    try:
+        assert second.get("How many jobs are there?", "hash", "few-shot") == SQL
+    finally:
+        second.close()
+
+
+def test_clear(cache):
+    cache.put("How many jobs are there?", "hash", "few-shot", SQL)
+    cache.get("How many jobs are there?", "hash", "few-shot")
+    cache.clear()
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 0}
@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+from sql_validator import SQLValidationError, extract_sql, validate_sql
+from sqlite_manager import SQLiteManager
+
+
+@pytest.fixture
+def catalog(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager.db, manager.get_catalog()["tables"]
+    manager.close_database()
+
+
+@pytest.mark.parametrize("response, expected", [
+    ("```sql\nSELECT name FROM company;\n```", "SELECT name FROM company;"),
+    ("Here is the query:\nSELECT name FROM company;\nIt lists every company.", "SELECT name FROM company;"),
+    ("SELECT 'a;b' AS text;", "SELECT 'a;b' AS text;"),
+    ("  WITH c AS (SELECT 1) SELECT * FROM c  ", "WITH c AS (SELECT 1) SELECT * FROM c"),
+    # Prose that starts like a query is skipped in favour of a line that parses
+    ("Select the data with:\nSELECT name FROM company;", "SELECT name FROM company;"),
+    ("Select the rows below.\nSELECT name FROM company", "SELECT name FROM company"),
+    ("SELECT is what you need:\n```sql\nSELECT name FROM company\n```", "SELECT name FROM company"),
+    ("The query is SELECT name FROM company;", "SELECT name FROM company;"),
+])
+def test_extract_sql(response, expected):
+    assert extract_sql(response) == expected
+
+
+def test_extract_sql_rejects_stacked_statements():
+    with pytest.raises(SQLValidationError, match="single SQL statement"):
+        extract_sql("SELECT 1; DROP TABLE company;")
+
+
+def test_valid_query_is_returned_clean(catalog):
+    connection, tables = catalog
+    assert validate_sql(connection, "```sql\nSELECT name FROM company\n```", tables) == "SELECT name FROM company"
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM company",
+    "UPDATE job SET status = 'done'",
+    "INSERT INTO company (name) VALUES ('x')",
+    "PRAGMA journal_mode = DELETE",
+])
+def test_writes_are_rejected_without_running(catalog, sql):
+    connection, tables = catalog
+    with pytest.raises(SQLValidationError, match="read-only"):
+        validate_sql(connection, sql, tables)
+    assert connection.execute("SELECT COUNT(*) FROM company").fetchone()[0] == 2
+
+
+def test_unknown_column_hints_at_the_table_columns(catalog):
+    connection, tables = catalog
+    with pytest.raises(SQLValidationError) as error:
+        validate_sql(connection, "SELECT j.stats FROM job j", tables)
+    assert "Did you mean status?" in str(error.value)
+    assert "Columns of job:" in str(error.value)
+
+
+def test_unknown_table_hints_at_close_names(catalog):
+    connection, tables = catalog
+    with pytest.raises(SQLValidationError, match="Did you mean invoice"):
+        validate_sql(connection, "SELECT * FROM invoices", tables)
+
+
+def test_unqualified_column_names_its_tables(catalog):
+    connection, tables = catalog
+    with pytest.raises(SQLValidationError, match="total_amount is a column of: invoice"):
+        validate_sql(connection, "SELECT total_amount FROM job", tables)
+
+
+def test_missing_sql_is_rejected():
+    with pytest.raises(SQLValidationError, match="does not contain"):
+        validate_sql(sqlite3.connect(":memory:"), "   ", {})
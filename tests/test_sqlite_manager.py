@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+
+import pytest
+
+from sqlite_manager import QueryExecutionError, SQLiteManager
+
+
+@pytest.fixture
+def db_manager(database):
+    manager = SQLiteManager()
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+def run_elsewhere(database, statement):
+    """Runs a statement on a separate connection, as another process would"""
+    connection = sqlite3.connect(database)
+    connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+
+def test_schema_text_is_cached(db_manager):
+    schema = db_manager.get_schema()
+    assert db_manager.get_schema() is schema
+    assert db_manager.get_schema(compact=True) is db_manager.get_schema(compact=True)
+
+
+def test_data_changes_keep_the_schema_cache(db_manager, database):
+    schema = db_manager.get_schema()
+    schema_hash = db_manager.get_schema_hash()
+    run_elsewhere(database, "DELETE FROM payment")
+    assert db_manager.get_schema() is schema
+    assert db_manager.get_schema_hash() == schema_hash
+
+
+@pytest.mark.parametrize("statement, table", [
+    ("CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY, plate TEXT)", "vehicle"),
+    ("ALTER TABLE company ADD COLUMN region TEXT", "company"),
+])
+def test_schema_changes_rebuild_the_cache(db_manager, database, statement, table):
+    schema = db_manager.get_schema()
+    compact = db_manager.get_schema(compact=True)
+    schema_hash = db_manager.get_schema_hash()
+
+    run_elsewhere(database, statement)
+
+    assert db_manager.get_schema_hash() != schema_hash
+    assert db_manager.get_schema() != schema
+    assert db_manager.get_schema(compact=True) != compact
+    assert table in db_manager.get_catalog()["tables"]
+    column = "plate" if table == "vehicle" else "region"
+    assert column in dict(db_manager.get_catalog()["tables"][table])
+
+
+def test_schema_changes_through_the_same_connection_rebuild_the_cache(db_manager):
+    schema_hash = db_manager.get_schema_hash()
+    db_manager.execute_query("CREATE INDEX idx_job_status ON job(status)")
+    db_manager.execute_query("DROP INDEX idx_job_status")
+    db_manager.execute_query("CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY)")
+    assert db_manager.get_schema_hash() != schema_hash
+    assert "Table: vehicle" in db_manager.get_schema()
+
+
+def test_invalidate_schema_cache(db_manager):
+    schema = db_manager.get_schema()
+    db_manager.invalidate_schema_cache()
+    rebuilt = db_manager.get_schema()
+    assert rebuilt is not schema and rebuilt == schema
+
+
+def test_reopening_another_database_drops_the_cache(db_manager, tmp_path):
+    other = str(tmp_path / "other.sqlite")
+    run_elsewhere(other, "CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY)")
+    assert "Table: company" in db_manager.get_schema()
+    assert db_manager.open_database(other)
+    assert SQLiteManager.schema_tables(db_manager.get_schema()) == {"vehicle"}
+
+
+@pytest.fixture
+def pooled(database):
+    manager = SQLiteManager(pooled=True)
+    assert manager.open_database(database)
+    yield manager
+    manager.close_database()
+
+
+def connection_of_new_thread(manager):
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(manager.db))
+    thread.start()
+    thread.join()
+    return connections[0]
+
+
+def test_each_thread_gets_its_own_pooled_connection(pooled):
+    own = pooled.db
+    assert pooled.db is own
+    other = connection_of_new_thread(pooled)
+    assert other is not own
+    assert len(pooled._pool) == 2
+    assert other.execute("PRAGMA query_only").fetchone()[0] == 1
+    assert other.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+
+def test_pooled_threads_read_concurrently(pooled):
+    results = []
+
+    def count_jobs():
+        results.append(pooled.fetch_result("SELECT COUNT(*) FROM job").rows)
+
+    threads = [threading.Thread(target=count_jobs) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[(8,)]] * 4
+
+
+@pytest.mark.parametrize("statement", [
+    "DELETE FROM job",
+    "INSERT INTO company (name) VALUES ('Acme Roofing')",
+    "CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY)",
+])
+def test_pooled_connections_refuse_writes(pooled, database, statement):
+    with pytest.raises(QueryExecutionError, match="readonly|read-only|attempt to write"):
+        pooled.fetch_result(statement)
+    assert {"company", "job"} <= set(pooled.get_catalog()["tables"])
+    assert "vehicle" not in pooled.get_catalog()["tables"]
+    assert pooled.fetch_result("SELECT COUNT(*) FROM job").rows == [(8,)]
+
+
+def test_close_closes_every_thread_connection(pooled):
+    own = pooled.db
+    other = connection_of_new_thread(pooled)
+    pooled.close_database()
+    for connection in (own, other):
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+    assert pooled.db is None
+
+
+def test_rollback_journal_is_reported(database, capsys):
+    manager = SQLiteManager(pooled=True)
+    assert manager.open_database(database)
+    assert not manager.is_wal
+    manager.close_database()
+    assert "journal_mode=delete" in capsys.readouterr().err
+
+
+def test_wal_database_opens_quietly(database, capsys):
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.close()
+
+    manager = SQLiteManager(pooled=True)
+    try:
+        assert manager.open_database(database)
+        assert manager.is_wal
+        assert capsys.readouterr().err == ""
+    finally:
+        manager.close_database()